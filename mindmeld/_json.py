@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the JSON serialization of server responses and stored state, which uses
+orjson when it is installed.
+"""
+import json
+from collections.abc import Mapping, Sequence
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _to_serializable(obj):
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    if isinstance(obj, Sequence):
+        return list(obj)
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+def dump_json(data):
+    """Serializes data to JSON, with orjson if it is installed.
+
+    Args:
+        data (dict): The data to serialize
+
+    Returns:
+        (bytes): The JSON document
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=_to_serializable,
+                                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # orjson is stricter than the json module, e.g. about integers beyond 64 bits
+            pass
+    return json.dumps(data, default=_to_serializable).encode('utf-8')
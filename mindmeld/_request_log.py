@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the request log of the MindMeld server, which writes the records of
+served requests from a background thread.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import socket
+import threading
+import time
+
+from .components._config import DEFAULT_REQUEST_LOG_CONFIG
+
+logger = logging.getLogger(__name__)
+
+TCP_PREFIX = 'tcp://'
+# The number of seconds to wait for the request log socket to connect or accept records
+SOCKET_TIMEOUT = 5
+
+_STOP = object()
+
+
+class RequestLog:
+    """A bounded queue of request log records, which a background thread serializes and writes
+    in batches.
+
+    Records are written to the server's request logger, to a file, or to a TCP socket,
+    depending on the ``destination`` setting. When the queue is full, new records are dropped
+    and counted instead of slowing down the requests. The writer thread is started on the
+    first record of each process, so forked server workers each get their own.
+    """
+
+    def __init__(self, config, request_logger, serializer):
+        """Initializes a request log
+
+        Args:
+            config (dict): The request log configuration. See ``DEFAULT_REQUEST_LOG_CONFIG``
+                for the settings and their defaults.
+            request_logger (logging.Logger): The logger to write records to when no destination
+                is set
+            serializer (callable): A function which serializes a record to JSON bytes
+        """
+        config = dict(DEFAULT_REQUEST_LOG_CONFIG, **config)
+        self.destination = config['destination']
+        self.queue_size = config['queue_size']
+        self.batch_size = config['batch_size']
+        self.flush_interval = config['flush_interval']
+        self.fields = frozenset(config['fields']) if config['fields'] else None
+        self.sample_rate = config['sample_rate']
+        self.redact = config['redact']
+        self._request_logger = request_logger
+        self._serializer = serializer
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'queued': 0, 'written': 0, 'dropped': 0, 'sampled_out': 0,
+                       'redacted': 0, 'errors': 0}
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    @property
+    def stats(self):
+        """dict: The number of records queued, written, dropped because the queue was full,
+        skipped by sampling or by the redaction hook, and which failed to be written"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, stat, count=1):
+        with self._stats_lock:
+            self._stats[stat] += count
+
+    def sample(self):
+        """Decides whether to log a request, according to the sample rate
+
+        Returns:
+            bool: Whether the request should be logged
+        """
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            return True
+        self._count('sampled_out')
+        return False
+
+    def log(self, record):
+        """Queues a record to be written. The record must not be modified afterwards.
+
+        Args:
+            record (dict): The record of a request
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._count('dropped')
+            return
+        self._count('queued')
+
+    def close(self, timeout=None):
+        """Writes the queued records and stops the writer thread
+
+        Args:
+            timeout (float, optional): The number of seconds to wait for the writer
+        """
+        if self._pid != os.getpid():
+            return
+        with self._start_lock:
+            atexit.unregister(self.close)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                logger.warning('The request log writer is stalled, %d queued records were '
+                               'not written', self._queue.qsize())
+            else:
+                self._thread.join(None if deadline is None
+                                  else max(deadline - time.monotonic(), 0))
+            self._pid = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.queue_size)
+            self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                            name='mindmeld-request-log', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            # write the queued records before the interpreter exits. The hook is only kept
+            # while the writer runs, so closed request logs can be garbage collected.
+            atexit.unregister(self.close)
+            atexit.register(self.close, self.flush_interval + 1)
+
+    def _run(self, records):
+        try:
+            sink = _open_sink(self.destination, self._request_logger)
+        except (OSError, IOError, ValueError):
+            logger.warning('Unable to open the request log destination %r, writing to the '
+                           'request logger instead', self.destination, exc_info=True)
+            sink = _LoggerSink(self._request_logger)
+        stopped = False
+        while not stopped:
+            record = records.get()
+            if record is _STOP:
+                break
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = records.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopped = True
+                    break
+                batch.append(record)
+            self._write(sink, batch)
+        sink.close()
+
+    def _write(self, sink, batch):
+        lines = []
+        for record in batch:
+            try:
+                if self.redact is not None:
+                    record = self.redact(record)
+                    if record is None:
+                        self._count('redacted')
+                        continue
+                if self.fields is not None:
+                    record = {key: value for key, value in record.items() if key in self.fields}
+                lines.append(self._serializer(record))
+            except Exception:  # pylint: disable=broad-except
+                self._count('errors')
+                logger.warning('Unable to serialize a request log record', exc_info=True)
+
+        if not lines:
+            return
+        try:
+            sink.write(lines)
+        except (OSError, IOError):
+            self._count('errors', len(lines))
+            logger.warning('Unable to write %d request log records to %r', len(lines),
+                           self.destination, exc_info=True)
+            return
+        self._count('written', len(lines))
+
+
+def _open_sink(destination, request_logger):
+    if not destination:
+        return _LoggerSink(request_logger)
+    if destination.startswith(TCP_PREFIX):
+        host, port = destination[len(TCP_PREFIX):].rsplit(':', 1)
+        return _SocketSink(host, int(port))
+    return _FileSink(destination)
+
+
+class _LoggerSink:
+    def __init__(self, request_logger):
+        self._request_logger = request_logger
+
+    def write(self, lines):
+        for line in lines:
+            self._request_logger.info(line.decode('utf-8'))
+
+    def close(self):
+        pass
+
+
+class _FileSink:
+    def __init__(self, file_path):
+        folder = os.path.dirname(file_path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        self._file = open(file_path, 'ab')
+
+    def write(self, lines):
+        self._file.write(b'\n'.join(lines) + b'\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _SocketSink:
+    """Writes newline delimited records to a TCP socket, reconnecting after failures"""
+
+    def __init__(self, host, port):
+        self._address = (host, port)
+        self._socket = None
+
+    def write(self, lines):
+        if self._socket is None:
+            self._socket = socket.create_connection(self._address, SOCKET_TIMEOUT)
+        try:
+            self._socket.sendall(b'\n'.join(lines) + b'\n')
+        except (OSError, IOError):
+            self.close()
+            raise
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
@@ -21,8 +21,10 @@ import sys
 from .app_manager import ApplicationManager
 from .cli import app_cli
 from .server import MindMeldServer
+from .components._config import get_request_log_config, get_session_config
 from .components.dialogue import DialogueResponder, DialogueFlow
 from .components.request import Request
+from .components.session_store import create_session_store
 
 logger = logging.getLogger(__name__)
 
@@ -40,10 +42,12 @@ class Application:
                 inherits from the DialogueResponder.
             preprocessor (Preprocessor): The application preprocessor, if any.
             async_mode (bool): ``True`` if the application is async, ``False`` otherwise.
+            session_store (SessionStore): The store of the state of conversations by session \
+                id. If omitted, the store is created from the app's session configuration.
         """
 
     def __init__(self, import_name, request_class=None, responder_class=None, preprocessor=None,
-                 async_mode=False):
+                 async_mode=False, session_store=None):
         self.import_name = import_name
         filename = getattr(sys.modules[import_name], '__file__', None)
         if filename is None:
@@ -58,6 +62,7 @@ class Application:
         self.responder_class = responder_class or DialogueResponder
         self.preprocessor = preprocessor
         self.async_mode = async_mode
+        self.session_store = session_store
 
     @property
     def question_answerer(self):
@@ -73,11 +78,14 @@ class Application:
         """
         if self.app_manager:
             return
+        if self.session_store is None:
+            self.session_store = create_session_store(get_session_config(self.app_path))
         self.app_manager = ApplicationManager(
             self.app_path, nlp, responder_class=self.responder_class,
             request_class=self.request_class, preprocessor=self.preprocessor,
-            async_mode=self.async_mode)
-        self._server = MindMeldServer(self.app_manager)
+            async_mode=self.async_mode, session_store=self.session_store)
+        self._server = MindMeldServer(self.app_manager,
+                                      request_log_config=get_request_log_config(self.app_path))
 
         # Add any pending dialogue rules
         for rule in self._dialogue_rules:
@@ -99,6 +107,14 @@ class Application:
         self.app_manager.load()
         self._server.run(**kwargs)
 
+    def run_workers(self, **kwargs):
+        """Runs the application on a pre-fork server with several worker processes, which share
+        the models loaded by this process. See :meth:`MindMeldServer.run_workers` for the
+        arguments."""
+        self.lazy_init()
+        self.app_manager.load()
+        self._server.run_workers(**kwargs)
+
     def handle(self, **kwargs):
         """A decorator that is used to register dialogue state rules"""
 
@@ -16,11 +16,15 @@ This module contains the application manager
 """
 import logging
 
+import attr
+
+from .components._history import History, Turn
 from .components.request import Request, Params, FrozenParams
 from .components import (
     NaturalLanguageProcessor, DialogueManager, QuestionAnswerer
 )
 from .components.dialogue import DialogueResponder
+from .components.session_store import Session
 from .resource_loader import ResourceLoader
 
 
@@ -64,13 +68,17 @@ class ApplicationManager:
             responder_class (DialogueResponder): Any class \
                 that inherits from the DialogueResponder
             dialogue_manager (DialogueManager): The application's dialogue manager.
+            session_store (SessionStore): The store of the state of conversations by session \
+                id, if any.
     """
     MAX_HISTORY_LEN = 100
     """The max number of turns in history."""
 
     def __init__(self, app_path, nlp=None, question_answerer=None, es_host=None,
-                 request_class=None, responder_class=None, preprocessor=None, async_mode=False):
+                 request_class=None, responder_class=None, preprocessor=None, async_mode=False,
+                 session_store=None):
         self.async_mode = async_mode
+        self.session_store = session_store
 
         self._app_path = app_path
         # If NLP or QA were passed in, use the resource loader from there
@@ -126,7 +134,8 @@ class ApplicationManager:
                                         directives=[])
         return request, response
 
-    def parse(self, text, params=None, context=None, frame=None, history=None, verbose=False):
+    def parse(self, text, params=None, context=None, frame=None, history=None, verbose=False,
+              session_id=None):
         """
         Args:
             text (str): The text of the message sent by the user
@@ -143,6 +152,9 @@ class ApplicationManager:
             history (list, optional): A list of previous and current responder objects \
                                       through interactions with MindMeld
             verbose (bool, optional): Flag to return confidence scores for domains and intents
+            session_id (str, optional): The session id of the conversation. When the app \
+                manager has a session store, the params, frame and history stored for the \
+                session are used unless they are passed, and the new state is stored for it.
 
         Returns:
             (dict): A deserialized Responder object
@@ -156,8 +168,13 @@ class ApplicationManager:
         """
         if self.async_mode:
             return self._parse_async(text, params=params, context=context, frame=frame,
-                                     history=history, verbose=verbose)
+                                     history=history, verbose=verbose, session_id=session_id)
 
+        session = self._get_session(session_id)
+        if session is not None:
+            params = session.params if params is None else params
+            frame = dict(session.frame) if frame is None else frame
+            history = session.history if history is None else history
         params = freeze_params(params)
         history = history or []
         frame = frame or {}
@@ -171,11 +188,11 @@ class ApplicationManager:
                                          frame=frame, params=params)
 
         dm_response = self.dialogue_manager.apply_handler(request, response, **dm_params)
-        response = self._post_dm(request, dm_response)
+        response = self._post_dm(request, dm_response, session_id, session)
         return response
 
     async def _parse_async(self, text, params=None, context=None, frame=None,
-                           history=None, verbose=False):
+                           history=None, verbose=False, session_id=None):
         """
         Args:
             text (str): The text of the message sent by the user
@@ -191,6 +208,9 @@ class ApplicationManager:
             history (list, optional): A list of previous and current responder objects
                                       through interactions with MindMeld
             verbose (bool, optional): Flag to return confidence scores for domains and intents
+            session_id (str, optional): The session id of the conversation. When the app
+                manager has a session store, the params, frame and history stored for the
+                session are used unless they are passed, and the new state is stored for it.
 
         Returns:
             (dict): A deserialized Responder object
@@ -202,6 +222,11 @@ class ApplicationManager:
            https://en.wikipedia.org/wiki/List_of_tz_database_time_zones
 
         """
+        session = self._get_session(session_id)
+        if session is not None:
+            params = session.params if params is None else params
+            frame = dict(session.frame) if frame is None else frame
+            history = session.history if history is None else history
         params = freeze_params(params)
         context = context or {}
         history = history or []
@@ -217,7 +242,7 @@ class ApplicationManager:
                                          frame=frame, params=params)
 
         dm_response = await self.dialogue_manager.apply_handler(request, response, **dm_params)
-        response = self._post_dm(request, dm_response)
+        response = self._post_dm(request, dm_response, session_id, session)
 
         return response
 
@@ -229,18 +254,26 @@ class ApplicationManager:
         return allowed_intents, nlp_params, params.dm_params(
             self.dialogue_manager.handler_map)
 
-    def _post_dm(self, request, dm_response):
-        # Append this item to the history, but don't recursively store history
-        prev_request = DialogueResponder.to_json(dm_response)
-        prev_request.pop('history')
+    def _get_session(self, session_id):
+        if self.session_store is None or session_id is None:
+            return None
+        return self.session_store.get(session_id) or Session()
 
-        # limit length of history
-        new_history = (prev_request,) + request.history
-        dm_response.history = new_history[:self.MAX_HISTORY_LEN]
+    def _post_dm(self, request, dm_response, session_id=None, session=None):
+        # Append this item to the history, but don't recursively store history. The new
+        # history shares the previous turns with the request's history.
+        turn = Turn.from_responder(dm_response)
+        dm_response.history = History((turn,) + tuple(request.history), self.MAX_HISTORY_LEN)
 
         # validate outgoing params
         dm_response.params.validate_param('allowed_intents')
         dm_response.params.validate_param('target_dialogue_state')
+
+        if session is not None:
+            # raises a conflict error if another request stored the session meanwhile
+            self.session_store.set(session_id, attr.evolve(
+                session, frame=dict(dm_response.frame), params=freeze_params(dm_response.params),
+                history=dm_response.history))
         return dm_response
 
     def add_middleware(self, middleware):
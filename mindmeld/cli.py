@@ -87,7 +87,10 @@ def _app_cli(ctx):
               help='starts the service with debug mode turned off')
 @click.option('-r', '--reloader', is_flag=True,
               help='starts the service with the reloader enabled')
-def run_server(ctx, port, no_debug, reloader):
+@click.option('-w', '--workers', type=int, default=0,
+              help='serves with this many pre-forked worker processes which share the loaded '
+                   'models, instead of the development server')
+def run_server(ctx, port, no_debug, reloader, workers):
     """Starts the MindMeld service."""
     app = ctx.obj.get('app')
     if app is None:
@@ -96,6 +99,10 @@ def run_server(ctx, port, no_debug, reloader):
     # make sure num parser is running
     ctx.invoke(num_parser, start=True)
 
+    if workers > 0:
+        app.run_workers(port=port, host='0.0.0.0', workers=workers)
+        return
+
     app.run(port=port, debug=not no_debug, host='0.0.0.0', threaded=True, use_reloader=reloader)
 
 
@@ -325,14 +332,15 @@ def shared_cli():
 @shared_cli.command('load-kb', context_settings=CONTEXT_SETTINGS)
 @click.pass_context
 @click.option('-n', '--es-host', required=False)
+@click.option('--clean', is_flag=True, help='Rebuilds the index from scratch')
 @click.argument('app_namespace', required=True)
 @click.argument('index_name', required=True)
 @click.argument('data_file', required=True)
-def load_index(ctx, es_host, app_namespace, index_name, data_file):
+def load_index(ctx, es_host, clean, app_namespace, index_name, data_file):
     """Loads data into a question answerer index."""
 
     try:
-        QuestionAnswerer.load_kb(app_namespace, index_name, data_file, es_host)
+        QuestionAnswerer.load_kb(app_namespace, index_name, data_file, es_host, clean=clean)
     except (KnowledgeBaseConnectionError, KnowledgeBaseError) as ex:
         logger.error(ex.message)
         ctx.exit(1)
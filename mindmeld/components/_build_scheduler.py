@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the scheduler used to fit the models of a natural language processor
+hierarchy in parallel worker processes.
+"""
+import logging
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUILD_WORKER_MEMORY_MB = 1024
+
+# The processor being built. It is set before the worker processes are forked so that each
+# worker shares the processor hierarchy and the loaded resources with the parent process.
+_build_root = None
+
+
+def _get_available_memory_mb():
+    """Returns the memory available on this machine in megabytes, or None if it is unknown"""
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_build_worker_count(config):
+    """Gets the number of worker processes to fit models with, given the processor config.
+
+    The count requested by the ``'build_workers'`` setting is capped by the number of CPUs and
+    by the number of workers which fit in the available memory, as estimated by the
+    ``'build_worker_memory_mb'`` setting.
+
+    Args:
+        config (dict): The natural language processor config
+
+    Returns:
+        int: The number of worker processes. A value less than 2 means models should be fit \
+            serially in the current process.
+    """
+    workers = config.get('build_workers') or 0
+    if workers == 'auto':
+        workers = multiprocessing.cpu_count()
+    workers = min(int(workers), multiprocessing.cpu_count())
+    if workers < 2:
+        return 0
+
+    if multiprocessing.get_start_method() != 'fork':
+        logger.info('Parallel builds require forked worker processes, fitting models serially')
+        return 0
+
+    memory_per_worker = config.get('build_worker_memory_mb', DEFAULT_BUILD_WORKER_MEMORY_MB)
+    available_memory = _get_available_memory_mb()
+    if memory_per_worker and available_memory is not None:
+        memory_workers = max(int(available_memory // memory_per_worker), 1)
+        if memory_workers < workers:
+            logger.info('Limiting build to %d worker processes with %dMB of available memory',
+                        memory_workers, available_memory)
+            workers = memory_workers
+
+    return workers if workers > 1 else 0
+
+
+def _get_processor(root, processor_path):
+    """Finds the processor at the given path below the root processor, creating any child
+    processors which were added to the parent process after this worker was forked.
+    """
+    processor = root
+    for name in processor_path:
+        if name not in processor._children:
+            processor._create_child(name)
+        processor = processor._children[name]
+    return processor
+
+
+def _fit_processor(processor_path, incremental_timestamp, label_set):
+    """Fits the model of a single processor in a worker process.
+
+    Args:
+        processor_path (tuple): The names of the processors from the root to this processor
+        incremental_timestamp (str): The incremental timestamp of the build
+        label_set (str): The label set from which to train the model
+
+    Returns:
+        bytes: The pickled state of the fitted classifier, or None if it could not be \
+            pickled, in which case the model must be fit in the parent process.
+    """
+    processor = _get_processor(_build_root, processor_path)
+    processor.incremental_timestamp = incremental_timestamp
+    processor._fit(label_set=label_set)
+
+    classifier = processor._classifier
+    if classifier is None:
+        return None
+    state = {key: value for key, value in classifier.__dict__.items()
+             if key != '_resource_loader'}
+    try:
+        return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        # Some models (e.g. those backed by a TensorFlow session) can only be dumped to disk
+        return None
+
+
+class BuildScheduler:
+    """Builds a processor hierarchy by fitting the model of each processor as an independent
+    job in a pool of worker processes.
+
+    Jobs for all the processors which exist before the build are submitted at once, since their
+    models do not depend on each other. Processors whose children depend on their fitted model
+    (the entity processors of an intent depend on the entity types found by its entity
+    recognizer) submit the jobs for their children once their own job completes. The fitted
+    models are sent back to the parent process, where the rest of the build, including
+    incremental dumps and entity resolver fits, happens as it would in a serial build.
+    """
+
+    def __init__(self, root, num_workers):
+        """Initializes a build scheduler
+
+        Args:
+            root (Processor): The processor to build
+            num_workers (int): The number of worker processes
+        """
+        self.root = root
+        self.num_workers = num_workers
+
+    def build(self, incremental=False, label_set=None):
+        """Builds the models of the root processor and all its descendants.
+
+        Args:
+            incremental (bool, optional): When ``True``, only build models whose training data
+                or configuration has changed since the last build.
+            label_set (string, optional): The label set from which to train all classifiers.
+        """
+        global _build_root  # pylint: disable=global-statement
+
+        start_time = time.time()
+        self.root._prepare_build(incremental=incremental)
+        # Load the queries and gazetteers before forking so workers don't each load them
+        self.root.resource_loader.get_labeled_queries(label_set=label_set)
+        self.root.resource_loader.get_gazetteers()
+
+        _build_root = self.root
+        try:
+            with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                jobs = {}
+                self._submit(executor, jobs, self.root, (), label_set)
+                while jobs:
+                    done, _ = wait(jobs, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        processor, processor_path = jobs.pop(future)
+                        self._complete(processor, future.result(), incremental, label_set)
+                        if not processor._has_dynamic_children:
+                            continue
+                        for name, child in processor._children.items():
+                            self._submit(executor, jobs, child, processor_path + (name,),
+                                         label_set)
+        finally:
+            _build_root = None
+
+        logger.info('Built %r with %d worker processes in %.2f seconds', self.root,
+                    self.num_workers, time.time() - start_time)
+
+    def _submit(self, executor, jobs, processor, processor_path, label_set):
+        """Submits the job to fit the model of a processor, and those of its children which
+        already exist"""
+        future = executor.submit(_fit_processor, processor_path,
+                                 processor.incremental_timestamp, label_set)
+        jobs[future] = (processor, processor_path)
+
+        if processor._has_dynamic_children:
+            return
+        for name, child in processor._children.items():
+            child.incremental_timestamp = processor.incremental_timestamp
+            self._submit(executor, jobs, child, processor_path + (name,), label_set)
+
+    @staticmethod
+    def _complete(processor, fit_state, incremental, label_set):
+        """Collects the model fit by a worker process back into the processor"""
+        if fit_state is None:
+            logger.info('Fitting the model of %r in the parent process', processor)
+            processor._fit(label_set=label_set)
+        else:
+            classifier = processor._classifier
+            classifier.__dict__.update(pickle.loads(fit_state))
+            if classifier._model is not None:
+                classifier._model.initialize_resources(classifier._resource_loader)
+
+        processor._finish_build()
+        if incremental:
+            processor._dump()
+
+        for child in processor._children.values():
+            child.incremental_timestamp = processor.incremental_timestamp
+
+        processor.ready = True
+        processor.dirty = True
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains a bounded in-memory cache used by natural language processor components.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TtlLruCache:
+    """A thread-safe, size bounded cache which evicts the least recently used entries, and
+    expires entries a fixed time after they were set.
+    """
+
+    def __init__(self, max_size=1000, ttl=None):
+        """Initializes a cache
+
+        Args:
+            max_size (int): The maximum number of entries. A value of 0 disables the cache.
+            ttl (float, optional): The number of seconds after which entries expire. If
+                ``None``, entries only expire when they are evicted.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Gets the value cached for a key
+
+        Args:
+            key (hashable): The key
+            default (optional): The value to return when the key is not cached
+
+        Returns:
+            The cached value, or the default
+        """
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and \
+                    time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = _MISSING
+
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """Caches the value for a key, evicting the least recently used entry if the cache is
+        full
+
+        Args:
+            key (hashable): The key
+            value: The value
+        """
+        if not self.max_size:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Removes the entry of a key from the cache, if there is one
+
+        Args:
+            key (hashable): The key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Removes all the entries of the cache. The hit and miss counts are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        """dict: The size of the cache, its hit and miss counts and its hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0
+        }
@@ -524,6 +524,28 @@ DEFAULT_NLP_CONFIG = {
     'system_entity_recognizer': 'duckling'
 }
 
+DEFAULT_QUESTION_ANSWERER_CONFIG = {
+    'backend': 'elasticsearch'
+}
+
+DEFAULT_REQUEST_LOG_CONFIG = {
+    'destination': None,
+    'queue_size': 10000,
+    'batch_size': 100,
+    'flush_interval': 1.0,
+    'fields': None,
+    'sample_rate': 1.0,
+    'redact': None
+}
+
+DEFAULT_SESSION_CONFIG = {
+    'store': None,
+    'path': None,
+    'url': None,
+    'max_sessions': 10000,
+    'ttl': 3600
+}
+
 
 def get_app_namespace(app_path):
     """Returns the namespace of the application at app_path"""
@@ -865,3 +887,113 @@ def get_nlp_config(app_path=None, config=None):
         pass
 
     return _get_default_nlp_config()
+
+
+def get_question_answerer_config(app_path=None, config=None):
+    """Gets the question answerer configuration for the app at the given path.
+
+    Args:
+        app_path (str, optional): The location of the MindMeld app
+        config (dict, optional): A config object to use. This will
+            override the config specified by the app's config.py file.
+
+    Returns:
+        dict: The question answerer configuration
+    """
+    if config:
+        return config
+    try:
+        module_conf = _get_config_module(app_path)
+    except (OSError, IOError):
+        logger.debug('No app configuration file found. Using default question answerer config.')
+        return copy.deepcopy(DEFAULT_QUESTION_ANSWERER_CONFIG)
+
+    # Try provider first
+    try:
+        return copy.deepcopy(module_conf.get_question_answerer_config())
+    except AttributeError:
+        pass
+
+    # Try object second
+    try:
+        return module_conf.QUESTION_ANSWERER_CONFIG
+    except AttributeError:
+        pass
+
+    return copy.deepcopy(DEFAULT_QUESTION_ANSWERER_CONFIG)
+
+
+def get_request_log_config(app_path=None, config=None):
+    """Gets the configuration of the server's request log for the app at the given path. Any
+    setting which is not specified takes its value from ``DEFAULT_REQUEST_LOG_CONFIG``.
+
+    Args:
+        app_path (str, optional): The location of the MindMeld app
+        config (dict, optional): A config object to use. This will
+            override the config specified by the app's config.py file.
+
+    Returns:
+        dict: The request log configuration
+    """
+    request_log_config = dict(DEFAULT_REQUEST_LOG_CONFIG)
+    if config:
+        request_log_config.update(config)
+        return request_log_config
+    try:
+        module_conf = _get_config_module(app_path)
+    except (OSError, IOError):
+        logger.debug('No app configuration file found. Using default request log config.')
+        return request_log_config
+
+    # Try provider first
+    try:
+        request_log_config.update(module_conf.get_request_log_config())
+        return request_log_config
+    except AttributeError:
+        pass
+
+    # Try object second
+    try:
+        request_log_config.update(module_conf.REQUEST_LOG_CONFIG)
+    except AttributeError:
+        pass
+
+    return request_log_config
+
+
+def get_session_config(app_path=None, config=None):
+    """Gets the configuration of the session store of the app at the given path. Any setting
+    which is not specified takes its value from ``DEFAULT_SESSION_CONFIG``.
+
+    Args:
+        app_path (str, optional): The location of the MindMeld app
+        config (dict, optional): A config object to use. This will
+            override the config specified by the app's config.py file.
+
+    Returns:
+        dict: The session configuration
+    """
+    session_config = dict(DEFAULT_SESSION_CONFIG)
+    if config:
+        session_config.update(config)
+        return session_config
+    try:
+        module_conf = _get_config_module(app_path)
+    except (OSError, IOError):
+        logger.debug('No app configuration file found. Using default session config.')
+        return session_config
+
+    # Try provider first
+    try:
+        session_config.update(module_conf.get_session_config())
+        return session_config
+    except AttributeError:
+        pass
+
+    # Try object second
+    try:
+        session_config.update(module_conf.SESSION_CONFIG)
+    except AttributeError:
+        pass
+
+    return session_config
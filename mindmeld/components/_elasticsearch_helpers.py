@@ -14,12 +14,17 @@
 """This module contains helper methods for consuming Elasticsearch."""
 import os
 import logging
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 
 from elasticsearch5 import (Elasticsearch, ImproperlyConfigured, ElasticsearchException,
                             ConnectionError as EsConnectionError, TransportError)
 from elasticsearch5.helpers import streaming_bulk
 from tqdm import tqdm
 
+from ._cache import TtlLruCache
 from ._config import DEFAULT_ES_INDEX_TEMPLATE, DEFAULT_ES_INDEX_TEMPLATE_NAME
 
 from ..exceptions import KnowledgeBaseConnectionError, KnowledgeBaseError
@@ -29,11 +34,116 @@ logger = logging.getLogger(__name__)
 INDEX_TYPE_SYNONYM = 'syn'
 INDEX_TYPE_KB = 'kb'
 
+DEFAULT_BULK_CHUNK_SIZE = 500
+DEFAULT_BULK_THREAD_COUNT = 4
+DEFAULT_BULK_MAX_RETRIES = 3
+BULK_RETRY_BACKOFF = 2
+
+# Index settings applied while documents are bulk loaded, which stop Elasticsearch from
+# refreshing and replicating the index for every batch
+BULK_LOAD_INDEX_SETTINGS = {'refresh_interval': '-1', 'number_of_replicas': 0}
+
+# Indexes are built into versioned physical indexes named '<scoped name>-v<version>', and the
+# scoped index name is an alias of the live version
+INDEX_VERSION_SEPARATOR = '-v'
+
+INDEX_METADATA_CACHE_SIZE = 256
+INDEX_METADATA_TTL = 300
+"""The number of seconds the field metadata of an index is cached for. Metadata is refreshed
+sooner when the index is loaded by this process."""
+
+# the types of the fields whose min and max values are used by custom sorts
+STATS_FIELD_TYPES = {'long', 'integer', 'short', 'byte', 'double', 'float', 'half_float',
+                     'scaled_float', 'date'}
+
+_index_metadata_cache = TtlLruCache(max_size=INDEX_METADATA_CACHE_SIZE, ttl=INDEX_METADATA_TTL)
+
 
 def get_scoped_index_name(app_namespace, index_name):
+    """Gets the name of an index of an app. The name is an alias which resolves to the live
+    version of the index.
+
+    Args:
+        app_namespace (str): The namespace of the app
+        index_name (str): The name of the index
+
+    Returns:
+        str: The scoped index name
+    """
     return '{}${}'.format(app_namespace, index_name)
 
 
+def _get_index_version_name(scoped_index_name):
+    return '{}{}{}'.format(scoped_index_name, INDEX_VERSION_SEPARATOR, int(time.time() * 1000))
+
+
+def _get_index_versions(es_client, scoped_index_name):
+    """Gets the versions of an index, from oldest to newest"""
+    pattern = '{}{}*'.format(scoped_index_name, INDEX_VERSION_SEPARATOR)
+    # the pattern also matches other indexes whose names start with the same prefix, such as
+    # the versions of '<scoped name>-vip' or an index named '<scoped name>-v2'. Versions are
+    # millisecond timestamps.
+    version_regex = re.compile(re.escape(scoped_index_name + INDEX_VERSION_SEPARATOR) +
+                               r'\d{13,}')
+    versions = [name for name in es_client.indices.get_settings(index=pattern,
+                                                                expand_wildcards='all')
+                if version_regex.fullmatch(name)]
+    return sorted(versions, key=lambda name: int(name.rsplit(INDEX_VERSION_SEPARATOR, 1)[1]))
+
+
+def resolve_index_alias(es_client, scoped_index_name):
+    """Gets the physical indexes a scoped index name refers to.
+
+    Args:
+        es_client (Elasticsearch): The Elasticsearch client
+        scoped_index_name (str): The scoped index name
+
+    Returns:
+        list: The names of the physical indexes. Indexes created before indexes were versioned \
+            are not aliased, in which case this is the scoped index name itself.
+    """
+    if es_client.indices.exists_alias(name=scoped_index_name):
+        return list(es_client.indices.get_alias(name=scoped_index_name))
+    if es_client.indices.exists(index=scoped_index_name):
+        return [scoped_index_name]
+    return []
+
+
+def _create_index_version(es_client, scoped_index_name, mapping):
+    """Creates a new physical version of an index, which is not live until the alias is swapped
+    to it"""
+    # checks the existence of default index template, if not then creates it.
+    if not es_client.indices.exists_template(name=DEFAULT_ES_INDEX_TEMPLATE_NAME):
+        es_client.indices.put_template(name=DEFAULT_ES_INDEX_TEMPLATE_NAME,
+                                       body=DEFAULT_ES_INDEX_TEMPLATE)
+    version_name = _get_index_version_name(scoped_index_name)
+    es_client.indices.create(version_name, body=mapping)
+    return version_name
+
+
+def _swap_index_alias(es_client, scoped_index_name, version_name):
+    """Atomically points the alias of an index to a new version, and deletes the old versions"""
+    live_indexes = resolve_index_alias(es_client, scoped_index_name)
+    if scoped_index_name in live_indexes:
+        # an index created before indexes were versioned has the name of the alias, so it has to
+        # be deleted before the alias can be added
+        logger.warning('Replacing unversioned index %r, it will be unavailable until the alias '
+                       'to the new version is added', scoped_index_name)
+        es_client.indices.delete(index=scoped_index_name)
+        live_indexes = []
+
+    actions = [{'remove': {'index': index, 'alias': scoped_index_name}}
+               for index in live_indexes]
+    actions.append({'add': {'index': version_name, 'alias': scoped_index_name}})
+    es_client.indices.update_aliases(body={'actions': actions})
+    logger.info('Swapped index %r to version %r', scoped_index_name, version_name)
+
+    for index in _get_index_versions(es_client, scoped_index_name):
+        if index != version_name:
+            logger.debug('Deleting old index version %r', index)
+            es_client.indices.delete(index=index, ignore=404)
+
+
 def create_es_client(es_host=None, es_user=None, es_pass=None):
     """Creates a new Elasticsearch client
 
@@ -88,7 +198,8 @@ def get_field_names(app_namespace, index_name, es_host=None, es_client=None, con
             raise ValueError('Elasticsearch index \'{}\' does not exist.'.format(index_name))
 
         res = es_client.indices.get(index=scoped_index_name)
-        all_field_info = res[scoped_index_name]['mappings']['document']['properties']
+        # the response is keyed by the name of the physical index the alias resolves to
+        all_field_info = next(iter(res.values()))['mappings']['document']['properties']
         return all_field_info.keys()
     except EsConnectionError as e:
         logger.debug('Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
@@ -101,6 +212,78 @@ def get_field_names(app_namespace, index_name, es_host=None, es_client=None, con
         raise KnowledgeBaseError
 
 
+def get_index_metadata(app_namespace, index_name, es_host=None, es_client=None):
+    """Gets the field metadata of an index: the type of each field, and the min and max values of
+    the number and date fields. The metadata is cached until the index is loaded again or for
+    ``INDEX_METADATA_TTL`` seconds, whichever comes first.
+
+    Args:
+        app_namespace (str): The namespace of the app
+        index_name (str): The name of the index
+        es_host (str): The Elasticsearch host server
+        es_client (Elasticsearch): The Elasticsearch client
+
+    Returns:
+        dict: The metadata, with a ``'field_types'`` dict mapping each field to its type, and a \
+            ``'field_stats'`` dict mapping number and date fields to their ``'min_value'`` and \
+            ``'max_value'``.
+    """
+    scoped_index_name = get_scoped_index_name(app_namespace, index_name)
+    metadata = _index_metadata_cache.get(scoped_index_name)
+    if metadata is not None:
+        return metadata
+
+    es_client = es_client or create_es_client(es_host)
+    try:
+        if not es_client.indices.exists(index=scoped_index_name):
+            raise ValueError('Knowledge base index \'{}\' does not exist.'.format(index_name))
+
+        res = es_client.indices.get(index=scoped_index_name)
+        # the response is keyed by the name of the physical index the alias resolves to
+        all_field_info = next(iter(res.values()))['mappings']['document']['properties']
+        field_types = {name: info.get('type') for name, info in all_field_info.items()}
+
+        # get the stats of all the fields with a single aggregation query
+        stats_fields = [name for name, field_type in field_types.items()
+                        if field_type in STATS_FIELD_TYPES]
+        field_stats = {}
+        if stats_fields:
+            stats_query = {"aggs": {}, "size": 0}
+            for field in stats_fields:
+                stats_query['aggs'][field + '_min'] = {"min": {"field": field}}
+                stats_query['aggs'][field + '_max'] = {"max": {"field": field}}
+            res = es_client.search(index=scoped_index_name, body=stats_query,
+                                   search_type="query_then_fetch")
+            for field in stats_fields:
+                field_stats[field] = {
+                    'min_value': res['aggregations'][field + '_min']['value'],
+                    'max_value': res['aggregations'][field + '_max']['value']}
+    except EsConnectionError as e:
+        logger.error('Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
+        raise KnowledgeBaseConnectionError(es_host=es_client.transport.hosts)
+    except TransportError as e:
+        logger.error('Unexpected error occurred when sending requests to Elasticsearch: %s '
+                     'Status code: %s details: %s', e.error, e.status_code, e.info)
+        raise KnowledgeBaseError
+    except ElasticsearchException:
+        raise KnowledgeBaseError
+
+    metadata = {'field_types': field_types, 'field_stats': field_stats}
+    _index_metadata_cache.set(scoped_index_name, metadata)
+    return metadata
+
+
+def clear_index_metadata(app_namespace, index_name):
+    """Removes the cached field metadata of an index, so it is fetched again when it is next
+    needed.
+
+    Args:
+        app_namespace (str): The namespace of the app
+        index_name (str): The name of the index
+    """
+    _index_metadata_cache.invalidate(get_scoped_index_name(app_namespace, index_name))
+
+
 def create_index(app_namespace, index_name, mapping, es_host=None, es_client=None,
                  connect_timeout=2):
     """Creates a new index.
@@ -119,12 +302,9 @@ def create_index(app_namespace, index_name, mapping, es_host=None, es_client=Non
 
     try:
         if not does_index_exist(app_namespace, index_name, es_host, es_client, connect_timeout):
-            # checks the existence of default index template, if not then creates it.
-            if not es_client.indices.exists_template(name=DEFAULT_ES_INDEX_TEMPLATE_NAME):
-                es_client.indices.put_template(name=DEFAULT_ES_INDEX_TEMPLATE_NAME,
-                                               body=DEFAULT_ES_INDEX_TEMPLATE)
             logger.info('Creating index %r', index_name)
-            es_client.indices.create(scoped_index_name, body=mapping)
+            version_name = _create_index_version(es_client, scoped_index_name, mapping)
+            _swap_index_alias(es_client, scoped_index_name, version_name)
         else:
             logger.error('Index %r already exists.', index_name)
     except EsConnectionError as e:
@@ -157,7 +337,11 @@ def delete_index(app_namespace, index_name, es_host=None, es_client=None, connec
     try:
         if does_index_exist(app_namespace, index_name, es_host, es_client, connect_timeout):
             logger.info('Deleting index %r', index_name)
-            es_client.indices.delete(scoped_index_name)
+            indexes = set(resolve_index_alias(es_client, scoped_index_name))
+            indexes.update(_get_index_versions(es_client, scoped_index_name))
+            for index in indexes:
+                es_client.indices.delete(index=index, ignore=404)
+            clear_index_metadata(app_namespace, index_name)
         else:
             raise ValueError('Elasticsearch index \'{}\' for application \'{}\' does not exist.'
                              .format(index_name, app_namespace))
@@ -172,55 +356,160 @@ def delete_index(app_namespace, index_name, es_host=None, es_client=None, connec
         raise KnowledgeBaseError
 
 
+def _iter_chunks(docs, chunk_size):
+    docs = iter(docs)
+    while True:
+        chunk = list(islice(docs, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _bulk_load_chunk(es_client, chunk, index, doc_type, max_retries):
+    """Loads a batch of documents with a single bulk request, retrying with an exponential
+    backoff when the request fails, or when some of its documents are rejected by an overloaded
+    cluster, in which case only those documents are sent again.
+
+    Returns:
+        (tuple): The number of documents loaded, and the errors of the documents which failed
+    """
+    count = 0
+    errors = []
+    for attempt in range(max_retries + 1):
+        rejected = []
+        try:
+            results = streaming_bulk(es_client, chunk, index=index, doc_type=doc_type,
+                                     chunk_size=len(chunk), raise_on_error=False,
+                                     raise_on_exception=True)
+            for doc, (ok, item) in zip(chunk, results):
+                if ok:
+                    count += 1
+                elif attempt < max_retries and \
+                        next(iter(item.values())).get('status') == 429:
+                    rejected.append(doc)
+                else:
+                    errors.append(item)
+        except (EsConnectionError, TransportError) as e:
+            # only retry requests rejected by an overloaded cluster or a lost connection
+            retryable = isinstance(e, EsConnectionError) or e.status_code == 429
+            if attempt == max_retries or not retryable:
+                raise
+            # the documents of the request were not loaded
+            rejected = chunk
+        if not rejected:
+            break
+
+        chunk = rejected
+        delay = BULK_RETRY_BACKOFF ** attempt
+        logger.warning('Failed to load a batch of %d documents, retrying in %d seconds',
+                       len(chunk), delay)
+        time.sleep(delay)
+    return count, errors
+
+
+def _update_index_settings(es_client, scoped_index_name, settings):
+    """Updates index settings, returning the previous values of the updated settings"""
+    current = es_client.indices.get_settings(index=scoped_index_name)
+    current = current[scoped_index_name]['settings']['index']
+    es_client.indices.put_settings(index=scoped_index_name, body={'index': settings})
+    # settings which were not set explicitly are reset to their defaults with null values
+    return {key: current.get(key) for key in settings}
+
+
 def load_index(app_namespace, index_name, docs, docs_count, mapping, doc_type, es_host=None,
-               es_client=None, connect_timeout=2):
+               es_client=None, connect_timeout=2, chunk_size=DEFAULT_BULK_CHUNK_SIZE,
+               thread_count=DEFAULT_BULK_THREAD_COUNT, max_retries=DEFAULT_BULK_MAX_RETRIES,
+               clean=False):
     """Loads documents from data into the specified index. If an index with the specified name
     doesn't exist, a new index with that name will be created.
 
+    The documents are streamed to Elasticsearch in batches of bulk requests sent from several
+    threads. New indexes, and existing ones which are rebuilt from scratch, are loaded into a new
+    version of the index which is neither refreshed nor replicated until all the documents are
+    loaded. The alias of the index is then atomically swapped to the new version, so searches
+    never see a partially loaded index.
+
     Args:
         app_namespace (str): The namespace of the app
         index_name (str): The name of the new index to be created
         docs (iterable): An iterable which contains a collection of documents in the correct format
                          which should be imported into the index
-        docs_count (int): The number of documents in doc
+        docs_count (int): The number of documents in doc, or None if it is unknown
         mapping (str): The Elasticsearch index mapping to use
         doc_type (str): The document type
         es_host (str): The Elasticsearch host server
         es_client (Elasticsearch): The Elasticsearch client
         connect_timeout (int, optional): The amount of time for a connection to the
             Elasticsearch host
+        chunk_size (int, optional): The number of documents in each bulk request
+        thread_count (int, optional): The number of threads sending bulk requests
+        max_retries (int, optional): The number of times a failed bulk request is retried
+        clean (bool, optional): If ``True``, rebuilds the index from scratch instead of loading
+            the documents into the existing index
     """
     scoped_index_name = get_scoped_index_name(app_namespace, index_name)
     es_client = es_client or create_es_client(es_host)
     try:
-        # create index if specified index does not exist
-        if does_index_exist(app_namespace, index_name, es_host, es_client, connect_timeout):
-            logger.warning('Elasticsearch index \'%s\' for application \'%s\' already exists!',
-                           index_name, app_namespace)
+        version_name = None
+        if does_index_exist(app_namespace, index_name, es_host, es_client, connect_timeout) \
+                and not clean:
             logger.info('Loading index %r', index_name)
         else:
-            create_index(app_namespace, index_name, mapping, es_host=es_host, es_client=es_client)
+            logger.info('Building index %r', index_name)
+            version_name = _create_index_version(es_client, scoped_index_name, mapping)
 
+        start_time = time.time()
         count = 0
         # create the progess bar with docs count
-        pbar = tqdm(total=docs_count)
-
-        for okay, result in streaming_bulk(es_client, docs,
-                                           index=scoped_index_name, doc_type=doc_type,
-                                           chunk_size=50, raise_on_error=False):
-
-            action, result = result.popitem()
-            doc_id = '/%s/%s/%s' % (index_name, doc_type, result['_id'])
-            # process the information from ES whether the document has been
-            # successfully indexed
-            if not okay:
-                logger.error('Failed to %s document %s: %r', action, doc_id, result)
-            else:
-                count += 1
-            pbar.update(1)
+        pbar = tqdm(total=docs_count, unit='docs')
+
+        def _process_results(futures):
+            nonlocal count
+            for future in futures:
+                loaded, errors = future.result()
+                count += loaded
+                # process the information from ES whether the document has been
+                # successfully indexed
+                for error in errors:
+                    action, result = error.popitem()
+                    doc_id = '/%s/%s/%s' % (index_name, doc_type, result.get('_id'))
+                    logger.error('Failed to %s document %s: %r', action, doc_id, result)
+                pbar.update(loaded + len(errors))
+
+        if version_name:
+            # the new version is not live yet, so it can be loaded with aggressive settings
+            original_settings = _update_index_settings(es_client, version_name,
+                                                       BULK_LOAD_INDEX_SETTINGS)
+        try:
+            with ThreadPoolExecutor(max_workers=thread_count) as pool:
+                pending = set()
+                for chunk in _iter_chunks(docs, chunk_size):
+                    # bound the number of batches in memory
+                    if len(pending) >= 2 * thread_count:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        _process_results(done)
+                    pending.add(pool.submit(_bulk_load_chunk, es_client, chunk,
+                                            version_name or scoped_index_name, doc_type,
+                                            max_retries))
+                _process_results(wait(pending).done)
+        except BaseException:
+            if version_name:
+                es_client.indices.delete(index=version_name, ignore=404)
+            raise
+
+        if version_name:
+            es_client.indices.put_settings(index=version_name, body={'index': original_settings})
+            es_client.indices.refresh(index=version_name)
+            _swap_index_alias(es_client, scoped_index_name, version_name)
+        else:
+            es_client.indices.refresh(index=scoped_index_name)
+        clear_index_metadata(app_namespace, index_name)
+
         # close the progress bar and flush all output
         pbar.close()
-        logger.info('Loaded %s document%s', count, '' if count == 1 else 's')
+        elapsed = time.time() - start_time
+        logger.info('Loaded %s document%s in %.1f seconds (%.0f docs/s)', count,
+                    '' if count == 1 else 's', elapsed, count / elapsed if elapsed else 0)
     except EsConnectionError as e:
         logger.debug('Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
         raise KnowledgeBaseConnectionError(es_host=es_client.transport.hosts)
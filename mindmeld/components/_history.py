@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the representation of the history of a conversation.
+"""
+from itertools import islice
+
+import attr
+import immutables
+
+
+def _to_json(value):
+    """Converts the attrs objects and immutable maps of a turn to plain data, like
+    ``DialogueResponder.to_json``, without the history of nested requests. Dicts and lists are
+    copied recursively, so the turn shares no mutable data with the responder."""
+    if attr.has(type(value)):
+        return {key: _to_json(item) for key, item in vars(value).items() if key != 'history'}
+    if isinstance(value, (dict, immutables.Map)):
+        return {key: _to_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_to_json(item) for item in value)
+    return value
+
+
+def _read_only(*args, **kwargs):
+    raise TypeError('Turns of a history are read-only')
+
+
+class Turn(dict):
+    """A read-only record of a dialogue turn: the dict of the responder of the turn without its
+    history. Turns are dicts, so histories can be serialized to JSON as they are. Only the keys
+    of a turn are read-only, the dicts and lists it contains should not be modified.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_responder(cls, responder):
+        """Records a dialogue turn. The mutable state of the responder is copied, so later
+        changes to the responder do not change the turn.
+
+        Args:
+            responder (DialogueResponder): The responder of the turn
+
+        Returns:
+            Turn: The turn
+        """
+        return cls((attribute, _to_json(value)) for attribute, value in vars(responder).items()
+                   if attribute != 'history')
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+    __ior__ = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+
+class History(tuple):
+    """A tuple of dialogue turns, most recent first. Turns which are not recorded by MindMeld,
+    e.g. the dicts of a history sent by a client, are converted to turns, so dialogue handlers
+    always see the same types.
+
+    Histories share their turns with each other instead of copying them.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, turns=(), max_length=None):
+        """Creates a history
+
+        Args:
+            turns (iterable): The turns, most recent first
+            max_length (int, optional): The maximum number of turns, older turns are dropped
+        """
+        turns = (turn if isinstance(turn, Turn) else Turn(turn)
+                 for turn in islice(turns, max_length))
+        return super().__new__(cls, turns)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, super().__repr__())
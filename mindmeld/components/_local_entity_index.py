@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains an in-process synonym index which resolves entities with the same text
+relevance scoring as the Elasticsearch synonym index, without a round trip to Elasticsearch.
+"""
+import logging
+import math
+import os
+import re
+import unicodedata
+
+import numpy as np
+from sklearn.externals import joblib
+
+logger = logging.getLogger(__name__)
+
+try:
+    from metaphone import doublemetaphone
+except ImportError:
+    doublemetaphone = None
+
+# BM25 parameters used by Elasticsearch
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+CHAR_NGRAM_LENGTH = 3
+MAX_SHINGLE_SIZE = 4
+MAX_PHONETIC_CODE_LENGTH = 7
+MAX_RESULTS = 20
+
+# Approximations of the character filters of the Elasticsearch analyzers
+_REMOVED_CHARS_PATTERN = re.compile(r'[,™®]')
+_LOOSE_APOSTROPHE_PATTERN = re.compile(r"(^|\s)'+|'+(\s|$)")
+_SPECIAL_EDGES_PATTERN = re.compile(r'(^|\s)[^\w\s]+|[^\w\s]+(?=\s|$)')
+
+
+def _fold(text):
+    """Lower cases and ascii folds text"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def normalize(text):
+    """Normalizes text the way the Elasticsearch analyzers of the synonym index do.
+
+    Args:
+        text (str): The text to normalize
+
+    Returns:
+        str: The normalized text
+    """
+    text = _REMOVED_CHARS_PATTERN.sub('', _fold(text))
+    text = _LOOSE_APOSTROPHE_PATTERN.sub(r'\1\2', text)
+    text = _SPECIAL_EDGES_PATTERN.sub(r'\1', text)
+    return ' '.join(text.split())
+
+
+def _analyze_keyword(text):
+    normalized = normalize(text)
+    return [normalized] if normalized else []
+
+
+def _analyze_raw(text):
+    return [text]
+
+
+def _analyze_shingles(text):
+    tokens = normalize(text).split()
+    terms = list(tokens)
+    for size in range(2, MAX_SHINGLE_SIZE + 1):
+        terms.extend(' '.join(tokens[idx:idx + size]) for idx in range(len(tokens) - size + 1))
+    return terms
+
+
+def _analyze_char_ngrams(text):
+    terms = []
+    for token in normalize(text).split():
+        terms.extend(token[idx:idx + CHAR_NGRAM_LENGTH]
+                     for idx in range(len(token) - CHAR_NGRAM_LENGTH + 1))
+    return terms
+
+
+def _analyze_phonetic(text):
+    terms = []
+    for token in normalize(text).split():
+        terms.extend(code[:MAX_PHONETIC_CODE_LENGTH] for code in doublemetaphone(token) if code)
+    return terms
+
+
+ANALYZERS = {
+    'normalized_keyword': _analyze_keyword,
+    'raw': _analyze_raw,
+    'text': _analyze_shingles,
+    'char_ngram': _analyze_char_ngrams,
+    'double_metaphone': _analyze_phonetic
+}
+
+
+class FieldIndex:
+    """An inverted index over a single analyzed field, which scores documents with BM25."""
+
+    def __init__(self, analyzer_name, texts):
+        """Builds the inverted index of a field
+
+        Args:
+            analyzer_name (str): The name of the analyzer of the field
+            texts (list): The text of the field for each document, which may also be a list of \
+                texts for fields with several values, or None for documents without the field
+        """
+        self.analyzer_name = analyzer_name
+        analyzer = ANALYZERS[analyzer_name]
+
+        term_docs = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            if text is None:
+                continue
+            values = text if isinstance(text, (list, tuple)) else [text]
+            terms = [term for value in values for term in analyzer(value)]
+            doc_lengths[doc_id] = len(terms)
+            for term in terms:
+                doc_counts = term_docs.setdefault(term, {})
+                doc_counts[doc_id] = doc_counts.get(doc_id, 0) + 1
+
+        num_docs = len(texts)
+        # like Lucene, the average length only counts the documents which have the field
+        avg_length = float(doc_lengths[doc_lengths > 0].mean()) if doc_lengths.any() else 1.0
+        length_norms = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / avg_length)
+
+        self.postings = {}
+        for term, doc_counts in term_docs.items():
+            doc_ids = np.fromiter(doc_counts.keys(), dtype=np.int32, count=len(doc_counts))
+            tfs = np.fromiter(doc_counts.values(), dtype=np.float32, count=len(doc_counts))
+            idf = math.log(1 + (num_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            # precompute the BM25 weight of the term in each document
+            weights = idf * tfs * (BM25_K1 + 1) / (tfs + length_norms[doc_ids])
+            self.postings[term] = (doc_ids, weights.astype(np.float32))
+
+    def score(self, text, boost, scores):
+        """Adds the scores of a match query for the text to the scores of the documents.
+
+        Args:
+            text (str): The query text
+            boost (float): The boost of the query
+            scores (numpy.ndarray): The scores of the documents to add to
+        """
+        for term in ANALYZERS[self.analyzer_name](text):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += boost * posting[1]
+
+
+class LocalSynonymIndex:
+    """An in-process index of the canonical names and synonym whitelists of an entity type.
+
+    The index mirrors the fields of the Elasticsearch synonym index. Canonical names are
+    indexed as keywords, raw keywords and character n-grams, and whitelisted synonyms also as
+    shingled text, each with an inverted index. Queries are scored with the same blend of
+    boosts as the Elasticsearch text relevance query: the best matching synonym of each
+    document is added to its canonical name score, followed by the ``sort_factor`` boost.
+    """
+
+    CNAME_FIELDS = ['normalized_keyword', 'raw', 'char_ngram']
+    WHITELIST_FIELDS = ['normalized_keyword', 'text', 'char_ngram']
+
+    def __init__(self, entities, use_double_metaphone=False, entity_map_hash=None):
+        """Builds the synonym index
+
+        Args:
+            entities (list of dict): The entities of the entity map, as loaded from mapping.json
+            use_double_metaphone (bool): Whether to index the double metaphone codes
+            entity_map_hash (str): The hash of the entity map the index is built from
+        """
+        if use_double_metaphone and doublemetaphone is None:
+            logger.warning("Double metaphone matching requires the 'metaphone' package, "
+                           "resolving entities without it")
+            use_double_metaphone = False
+        self.use_double_metaphone = use_double_metaphone
+        self.entity_map_hash = entity_map_hash
+
+        self.docs = []
+        synonyms = []
+        synonym_docs = []
+        synonym_offsets = [0]
+        sort_factors = []
+        for doc_id, entity in enumerate(entities):
+            doc = {'cname': entity['cname']}
+            if entity.get('id'):
+                doc['id'] = entity['id']
+            if entity.get('sort_factor'):
+                doc['sort_factor'] = entity['sort_factor']
+            self.docs.append(doc)
+            sort_factors.append(float(entity.get('sort_factor') or 0))
+
+            # the canonical name is the first synonym, as in the Elasticsearch index
+            for synonym in [entity['cname']] + entity.get('whitelist', []):
+                synonyms.append(synonym)
+                synonym_docs.append(doc_id)
+            synonym_offsets.append(len(synonyms))
+
+        self.synonyms = synonyms
+        self.synonym_docs = np.array(synonym_docs, dtype=np.int32)
+        self.synonym_offsets = np.array(synonym_offsets, dtype=np.int32)
+        # field_value_factor with a log1p modifier, which is a base 10 logarithm in Elasticsearch
+        self.sort_factor_scores = np.log10(1 + 10 * np.array(sort_factors, dtype=np.float32))
+
+        cnames = [doc['cname'] for doc in self.docs]
+        fields = list(self.CNAME_FIELDS)
+        whitelist_fields = list(self.WHITELIST_FIELDS)
+        if use_double_metaphone:
+            fields.append('double_metaphone')
+            whitelist_fields.append('double_metaphone')
+        self.cname_fields = {name: FieldIndex(name, cnames) for name in fields}
+        self.whitelist_fields = {name: FieldIndex(name, synonyms) for name in whitelist_fields}
+
+    def search(self, entities, use_double_metaphone=False):
+        """Resolves an entity, given the text of its n-best spans
+
+        Args:
+            entities (tuple of str): The text of the entity in each of the n-best transcripts
+            use_double_metaphone (bool): Whether to match the double metaphone codes
+
+        Returns:
+            (list): The top 20 resolved values, like the Elasticsearch synonym index.
+        """
+        use_double_metaphone = use_double_metaphone and self.use_double_metaphone
+        num_docs = len(self.docs)
+        scores = np.zeros(num_docs, dtype=np.float32)
+        weight_factors = [1 - float(i) / len(entities) for i in range(len(entities))]
+
+        for idx, (text, weight) in enumerate(zip(entities, weight_factors)):
+            if idx == 0:
+                self.cname_fields['normalized_keyword'].score(text, 10 * weight, scores)
+                self.cname_fields['raw'].score(text, 10 * weight, scores)
+                self.cname_fields['char_ngram'].score(text, weight, scores)
+            else:
+                self.cname_fields['normalized_keyword'].score(text, weight, scores)
+            if use_double_metaphone:
+                self.cname_fields['double_metaphone'].score(text, 2 * weight, scores)
+
+        synonym_scores = np.zeros(len(self.synonyms), dtype=np.float32)
+        self.whitelist_fields['normalized_keyword'].score(entities[0], 10, synonym_scores)
+        self.whitelist_fields['text'].score(entities[0], 1, synonym_scores)
+        self.whitelist_fields['char_ngram'].score(entities[0], 1, synonym_scores)
+        if use_double_metaphone:
+            self.whitelist_fields['double_metaphone'].score(entities[0], 3, synonym_scores)
+
+        # nested query with a max score mode
+        whitelist_scores = np.zeros(num_docs, dtype=np.float32)
+        np.maximum.at(whitelist_scores, self.synonym_docs, synonym_scores)
+
+        matched = np.flatnonzero((scores > 0) | (whitelist_scores > 0))
+        if not len(matched):
+            return []
+        total_scores = (scores + whitelist_scores + self.sort_factor_scores)[matched]
+        order = np.argsort(-total_scores, kind='mergesort')[:MAX_RESULTS]
+
+        results = []
+        for doc_id, score in zip(matched[order], total_scores[order]):
+            score = float(score)
+            if use_double_metaphone and len(entities) > 1:
+                if score < 0.5 * len(entities):
+                    continue
+
+            result = dict(self.docs[doc_id])
+            result['score'] = score
+            result['top_synonym'] = self._get_top_synonym(doc_id, synonym_scores)
+            results.append(result)
+        return results
+
+    def _get_top_synonym(self, doc_id, synonym_scores):
+        start, end = self.synonym_offsets[doc_id], self.synonym_offsets[doc_id + 1]
+        doc_synonym_scores = synonym_scores[start:end]
+        if not len(doc_synonym_scores) or doc_synonym_scores.max() <= 0:
+            return None
+        return self.synonyms[start + int(np.argmax(doc_synonym_scores))]
+
+    def dump(self, index_path):
+        """Saves the index to disk
+
+        Args:
+            index_path (str): The path to save the index to
+        """
+        folder = os.path.dirname(index_path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        joblib.dump(self, index_path)
+
+    @staticmethod
+    def load(index_path):
+        """Loads an index from disk
+
+        Args:
+            index_path (str): The path of the saved index
+
+        Returns:
+            LocalSynonymIndex: The index, or None if there is no index at the path
+        """
+        if not os.path.isfile(index_path):
+            return None
+        try:
+            return joblib.load(index_path)
+        except (OSError, IOError, EOFError, ValueError):
+            logger.warning('Unable to load the entity resolver index at %r', index_path)
+            return None
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains an in-memory knowledge base, which answers knowledge base searches with
+an approximation of the Elasticsearch queries built by the question answerer, without
+Elasticsearch.
+"""
+import copy
+import logging
+import re
+from datetime import datetime
+
+import numpy as np
+from dateutil import parser as date_parser, tz
+
+from ._local_entity_index import FieldIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+SYN_FIELD_SUFFIX = '$whitelist'
+TEXT_ANALYZERS = ['text', 'normalized_keyword', 'char_ngram']
+
+EARTH_RADIUS_KM = 6371.0088
+# the scale of the distance sort function, as in Search.SortClause
+DISTANCE_SORT_SCALE_KM = 5.0
+
+# strings which Elasticsearch's date detection maps to date fields
+_DATE_PATTERN = re.compile(r'^\d{4}[-/]\d{2}[-/]\d{2}')
+_EPOCH = datetime(1970, 1, 1, tzinfo=tz.tzutc())
+
+
+def _first_value(value):
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+
+def _parse_date(value):
+    """Converts a date string to milliseconds since the epoch, or returns None"""
+    if not isinstance(value, str) or not _DATE_PATTERN.match(value):
+        return None
+    try:
+        date = date_parser.parse(value)
+    except (ValueError, OverflowError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=tz.tzutc())
+    return (date - _EPOCH).total_seconds() * 1000
+
+
+def _parse_location(value):
+    """Converts a geo point in any of the formats Elasticsearch accepts to (lat, lon)"""
+    try:
+        if isinstance(value, dict):
+            return float(value['lat']), float(value['lon'])
+        if isinstance(value, str):
+            lat, lon = value.split(',')
+            return float(lat), float(lon)
+        if isinstance(value, (list, tuple)):
+            # GeoJSON order
+            return float(value[1]), float(value[0])
+    except (KeyError, ValueError, IndexError, TypeError):
+        pass
+    return None
+
+
+def _infer_field_type(field, values):
+    """Infers the type of a field the way the question answerer index mapping would"""
+    if field == 'id':
+        return 'keyword'
+    if field.endswith(SYN_FIELD_SUFFIX):
+        return 'nested'
+
+    value = next((_first_value(v) for v in values if _first_value(v) is not None), None)
+    if field == 'location' or isinstance(value, dict) and set(value) == {'lat', 'lon'}:
+        return 'geo_point'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, int):
+        return 'long'
+    if isinstance(value, float):
+        return 'float'
+    if isinstance(value, str):
+        return 'date' if _parse_date(value) is not None else 'text'
+    return 'object'
+
+
+class LocalKnowledgeBase:
+    """An in-memory index of the documents of a knowledge base index.
+
+    Text fields are indexed with the same analyzers as the Elasticsearch index (shingled text,
+    normalized keyword and character n-grams), number and date fields as numeric columns and
+    geo points as coordinate columns, so that query, filter and sort clauses can be evaluated
+    over all the documents at once.
+    """
+
+    def __init__(self, docs, synonyms=None):
+        """Builds the knowledge base
+
+        Args:
+            docs (list of dict): The documents of the index
+            synonyms (dict, optional): A dict mapping text fields to a dict of document ids to \
+                their synonyms, like the synonyms imported into the knowledge base by the \
+                entity resolver
+        """
+        self._sources = [{key: value for key, value in doc.items()
+                          if not key.endswith(SYN_FIELD_SUFFIX)} for doc in docs]
+        num_docs = len(self._sources)
+
+        fields = {}
+        for doc in self._sources:
+            for field in doc:
+                fields.setdefault(field, []).append(doc[field])
+        self.field_types = {field: _infer_field_type(field, values)
+                            for field, values in fields.items()}
+
+        self._doc_ids = {}
+        self._text_indexes = {}
+        self._keyword_docs = {}
+        self._columns = {}
+        self._locations = {}
+        for field, field_type in self.field_types.items():
+            values = [doc.get(field) for doc in self._sources]
+            if field_type == 'keyword':
+                for doc_idx, value in enumerate(values):
+                    self._doc_ids.setdefault(str(value), []).append(doc_idx)
+            elif field_type == 'text':
+                self._index_text(field, values)
+            elif field_type in ('long', 'float', 'date'):
+                column = np.full(num_docs, np.nan)
+                for doc_idx, value in enumerate(values):
+                    value = _first_value(value)
+                    if field_type == 'date' and value is not None:
+                        value = _parse_date(value) if isinstance(value, str) else value
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        column[doc_idx] = value
+                self._columns[field] = column
+            elif field_type == 'geo_point':
+                locations = np.full((num_docs, 2), np.nan)
+                for doc_idx, value in enumerate(values):
+                    location = _parse_location(_first_value(value)) if value else None
+                    if location:
+                        locations[doc_idx] = location
+                self._locations[field] = np.radians(locations)
+
+        self._synonym_indexes = {}
+        for field, doc_synonyms in (synonyms or {}).items():
+            self._index_synonyms(field, doc_synonyms)
+
+        self.field_stats = {}
+        for field, column in self._columns.items():
+            if not np.isnan(column).all():
+                self.field_stats[field] = {'min_value': float(np.nanmin(column)),
+                                           'max_value': float(np.nanmax(column))}
+
+    def _index_text(self, field, values):
+        values = [[str(v) for v in value] if isinstance(value, (list, tuple)) else
+                  (str(value) if value is not None else None) for value in values]
+        self._text_indexes[field] = {analyzer: FieldIndex(analyzer, values)
+                                     for analyzer in TEXT_ANALYZERS}
+        keyword_docs = {}
+        for doc_idx, value in enumerate(values):
+            for text in (value if isinstance(value, list) else [value]):
+                if text is not None:
+                    keyword_docs.setdefault(normalize(text), []).append(doc_idx)
+        self._keyword_docs[field] = {key: np.array(docs) for key, docs in keyword_docs.items()}
+
+    def _index_synonyms(self, field, doc_synonyms):
+        synonyms = []
+        synonym_docs = []
+        for doc_id, names in doc_synonyms.items():
+            for doc_idx in self._doc_ids.get(str(doc_id), []):
+                synonyms.extend(names)
+                synonym_docs.extend([doc_idx] * len(names))
+        if not synonyms:
+            return
+
+        keyword_docs = {}
+        for name, doc_idx in zip(synonyms, synonym_docs):
+            keyword_docs.setdefault(normalize(name), set()).add(doc_idx)
+        self._synonym_indexes[field] = {
+            'docs': np.array(synonym_docs),
+            'fields': {analyzer: FieldIndex(analyzer, synonyms) for analyzer in TEXT_ANALYZERS},
+            'keyword_docs': {key: np.array(sorted(docs)) for key, docs in keyword_docs.items()}
+        }
+        self.field_types[field + SYN_FIELD_SUFFIX] = 'nested'
+
+    def search(self, clauses, query_clauses_operator='or', size=10):
+        """Finds the documents which best match the clauses of a search
+
+        Args:
+            clauses (dict): The query, filter and sort clauses of a ``Search``
+            query_clauses_operator (str): 'and' if all the query clauses must match, or 'or' if \
+                any of them may match
+            size (int): The maximum number of documents to return
+
+        Returns:
+            list: The matching documents.
+        """
+        num_docs = len(self._sources)
+        scores = np.zeros(num_docs)
+        matches = np.ones(num_docs, dtype=bool)
+
+        if not clauses['query'] and not clauses['filter']:
+            # match all
+            scores += 1
+        elif clauses['query']:
+            matched_clauses = np.zeros(num_docs, dtype=int)
+            boosts = np.zeros(num_docs)
+            for clause in clauses['query']:
+                clause_scores = self._score_query_clause(clause, boosts)
+                scores += clause_scores
+                matched_clauses += clause_scores > 0
+            if query_clauses_operator == 'and':
+                matches &= matched_clauses == len(clauses['query'])
+            elif not clauses['filter']:
+                # should clauses are optional when there are filters
+                matches &= matched_clauses > 0
+            scores += boosts
+
+        for clause in clauses['filter']:
+            matches &= self._filter(clause)
+
+        for clause in clauses['sort']:
+            scores += self._score_sort_clause(clause)
+
+        candidates = np.flatnonzero(matches)
+        order = np.argsort(-scores[candidates], kind='mergesort')[:size]
+        return [copy.deepcopy(self._sources[doc_idx]) for doc_idx in candidates[order]]
+
+    def _score_query_clause(self, clause, boosts):
+        """Scores the documents for a query clause, adding the exact match boosts to boosts"""
+        num_docs = len(self._sources)
+        scores = np.zeros(num_docs)
+        value = str(clause.value)
+        normalized_value = normalize(value)
+        weight = clause.DEFAULT_EXACT_MATCH_BOOSTING_WEIGHT
+
+        for field_index in self._text_indexes.get(clause.field, {}).values():
+            field_index.score(value, 1, scores)
+        exact_docs = self._keyword_docs.get(clause.field, {}).get(normalized_value)
+        if exact_docs is not None:
+            boosts[exact_docs] += weight
+
+        synonym_index = self._synonym_indexes.get(clause.field) if clause.syn_field else None
+        if synonym_index:
+            synonym_scores = np.zeros(len(synonym_index['docs']))
+            for field_index in synonym_index['fields'].values():
+                field_index.score(value, 1, synonym_scores)
+            # nested query with a max score mode
+            doc_synonym_scores = np.zeros(num_docs)
+            np.maximum.at(doc_synonym_scores, synonym_index['docs'], synonym_scores)
+            scores += doc_synonym_scores
+            exact_docs = synonym_index['keyword_docs'].get(normalized_value)
+            if exact_docs is not None:
+                boosts[exact_docs] += weight
+
+        return scores
+
+    def _filter(self, clause):
+        """Gets the mask of the documents which pass a filter clause"""
+        num_docs = len(self._sources)
+        mask = np.zeros(num_docs, dtype=bool)
+        if clause.filter_type == 'text':
+            if clause.field == 'id':
+                mask[self._doc_ids.get(str(clause.value), [])] = True
+            else:
+                docs = self._keyword_docs.get(clause.field, {}).get(normalize(str(clause.value)))
+                if docs is not None:
+                    mask[docs] = True
+            return mask
+
+        column = self._columns.get(clause.field)
+        if column is None:
+            return mask
+        mask[:] = True
+        with np.errstate(invalid='ignore'):
+            for bound, compare in ((clause.range_gt, np.greater),
+                                   (clause.range_gte, np.greater_equal),
+                                   (clause.range_lt, np.less),
+                                   (clause.range_lte, np.less_equal)):
+                if bound:
+                    mask &= compare(column, self._to_number(clause.field, bound))
+        return mask
+
+    def _to_number(self, field, value):
+        if self.field_types.get(field) == 'date' and isinstance(value, str):
+            parsed = _parse_date(value)
+            if parsed is None:
+                raise ValueError('Invalid date {!r} for field {!r}'.format(value, field))
+            return parsed
+        return float(value)
+
+    def _score_sort_clause(self, clause):
+        """Scores the documents with the linear decay function of a sort clause. As in
+        Elasticsearch, documents without the field get the full weight."""
+        weight = clause.DEFAULT_SORT_WEIGHT
+        if clause.sort_type == clause.SORT_DISTANCE:
+            origin = _parse_location(clause.location)
+            locations = self._locations.get(clause.field)
+            if origin is None or locations is None:
+                return np.zeros(len(self._sources))
+            lat, lon = np.radians(origin)
+            # haversine distance
+            hav = np.sin((locations[:, 0] - lat) / 2) ** 2 + np.cos(lat) * \
+                np.cos(locations[:, 0]) * np.sin((locations[:, 1] - lon) / 2) ** 2
+            distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(hav))
+            # a linear decay of 0.5 at the scale reaches 0 at twice the scale
+            decay = 1 - distances / (2 * DISTANCE_SORT_SCALE_KM)
+        else:
+            stats = clause.field_stats
+            if not stats or stats.get('min_value') is None or clause.field not in self._columns:
+                # no document has a value for the field
+                return np.zeros(len(self._sources))
+            min_value, max_value = stats['min_value'], stats['max_value']
+            scale = 0.5 * (max_value - min_value) if max_value != min_value else 1
+            origin = min_value if clause.sort_type == clause.SORT_ORDER_ASC else max_value
+            decay = 1 - np.abs(self._columns[clause.field] - origin) / (2 * scale)
+
+        decay = np.where(np.isnan(decay), 1, np.maximum(decay, 0))
+        return weight * decay
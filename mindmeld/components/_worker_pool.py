@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the pools of worker processes and threads used to process the n-best
+transcripts of a query in parallel.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from ..exceptions import ProcessorError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TASK_TIMEOUT = 0.5
+
+PROCESS_MODE = 'process'
+THREAD_MODE = 'thread'
+HEALTH_CHECK_TIMEOUT = 5
+
+# The processors served by the worker pools of this process, by pool id. Worker processes
+# forked from this process inherit the loaded processor instead of loading it again.
+_pool_roots = {}
+_pool_ids = itertools.count()
+
+# Guards the worker pool of each root processor, which is its '_worker_pool' attribute
+_worker_pools_lock = threading.Lock()
+
+# The processor a worker process serves, set by the worker initializer
+_worker_root = None
+
+
+def get_worker_count():
+    """Gets the number of worker processes to process n-best transcripts with, which is set by
+    the ``MM_SUBPROCESS_COUNT`` environment variable.
+
+    Returns:
+        int: The number of worker processes. A value of 0 means n-best transcripts should be \
+            processed serially.
+    """
+    return int(os.environ.get('MM_SUBPROCESS_COUNT', multiprocessing.cpu_count() + 1))
+
+
+def _init_worker(pool_id, app_path, config, incremental_timestamp):
+    """Initializes a worker process with the processor it serves. A worker forked from the
+    process which started the pool uses the processor it inherited, any other worker loads the
+    models from disk once.
+    """
+    global _worker_root  # pylint: disable=global-statement
+
+    root = _pool_roots.get(pool_id)
+    if root is None or not root.ready:
+        from .nlp import NaturalLanguageProcessor
+        logger.info('Loading the models of %r in worker process %d', app_path, os.getpid())
+        root = NaturalLanguageProcessor(app_path, config=config)
+        root.load(incremental_timestamp=incremental_timestamp)
+    _worker_root = root
+
+
+def _find_processor(root, processor_path):
+    """Finds the processor at the given path below the root processor. Unlike during builds,
+    missing processors are not created, since they would not be loaded.
+    """
+    processor = root
+    for name in processor_path:
+        if name not in processor._children:
+            raise ProcessorError('No processor {!r} below {!r}'.format(name, processor.name))
+        processor = processor._children[name]
+    return processor
+
+
+def _call_processor(processor_path, func_name, item, args, kwargs):
+    """Calls a function of the processor at the given path in a worker process"""
+    processor = _find_processor(_worker_root, processor_path)
+    return getattr(processor, func_name)(item, *args, **kwargs)
+
+
+def _ping():
+    return os.getpid(), _worker_root is not None and _worker_root.ready
+
+
+def get_worker_pool(root):
+    """Gets the running worker pool of a root processor
+
+    Args:
+        root (NaturalLanguageProcessor): The root processor
+
+    Returns:
+        WorkerPool: The worker pool, or None if no pool was started for the processor, or if \
+            called in a worker process.
+    """
+    if _worker_root is not None:
+        return None
+    return getattr(root, '_worker_pool', None)
+
+
+class WorkerPool:
+    """A supervised pool of worker processes which serve the natural language processor of an
+    app.
+
+    Each worker is initialized once with the processor hierarchy, and tasks are dispatched to
+    the processor at a given path in the hierarchy. Workers which die are replaced by the pool.
+    A task which fails or does not complete in time is reported in the pool stats, and the
+    caller falls back to serial processing while the slow worker finishes, so the pool is never
+    torn down because of a single task.
+    """
+
+    mode = PROCESS_MODE
+
+    def __init__(self, root, num_workers, task_timeout=DEFAULT_TASK_TIMEOUT):
+        """Initializes a worker pool
+
+        Args:
+            root (NaturalLanguageProcessor): The processor served by the workers
+            num_workers (int): The number of worker processes
+            task_timeout (float): The number of seconds to wait for the tasks of a call
+        """
+        self.root = root
+        self.app_path = os.path.abspath(root._app_path)
+        self.pool_id = next(_pool_ids)
+        self.num_workers = num_workers
+        self.task_timeout = task_timeout
+        self._pool = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'calls': 0, 'tasks': 0, 'timeouts': 0, 'errors': 0}
+
+    @classmethod
+    def start(cls, root, num_workers, task_timeout=DEFAULT_TASK_TIMEOUT):
+        """Starts a worker pool for a processor, replacing the running pool of the processor
+
+        Args:
+            root (NaturalLanguageProcessor): The processor served by the workers
+            num_workers (int): The number of worker processes
+            task_timeout (float): The number of seconds to wait for the tasks of a call
+
+        Returns:
+            WorkerPool: The started pool
+        """
+        pool = cls(root, num_workers, task_timeout)
+        with _worker_pools_lock:
+            previous_pool = get_worker_pool(root)
+            if previous_pool:
+                previous_pool._terminate()
+                _pool_roots.pop(previous_pool.pool_id, None)
+
+            pool._start_workers()
+            root._worker_pool = pool
+
+        logger.info('Started %d %s workers for %r', num_workers, pool.mode, root)
+        return pool
+
+    def _start_workers(self):
+        _pool_roots[self.pool_id] = self.root
+        self._pool = multiprocessing.Pool(
+            self.num_workers, initializer=_init_worker,
+            initargs=(self.pool_id, self.app_path, self.root.config,
+                      self.root.incremental_timestamp))
+
+    def stop(self):
+        """Stops the worker processes"""
+        with _worker_pools_lock:
+            if get_worker_pool(self.root) is self:
+                self.root._worker_pool = None
+            _pool_roots.pop(self.pool_id, None)
+        self._terminate()
+
+    def _terminate(self):
+        if self._pool:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    @property
+    def stats(self):
+        """dict: The number of calls and tasks dispatched to the pool, and how many tasks
+        timed out or failed"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, stat, count=1):
+        with self._stats_lock:
+            self._stats[stat] += count
+
+    def check_health(self, timeout=HEALTH_CHECK_TIMEOUT):
+        """Checks that the workers respond and have loaded their processor
+
+        Args:
+            timeout (float): The number of seconds to wait for the workers
+
+        Returns:
+            dict: The number of workers, how many distinct workers responded and whether the \
+                pool is healthy, i.e. all the pings were answered in time by ready workers.
+        """
+        if not self._pool:
+            return {'workers': 0, 'responsive': 0, 'healthy': False}
+
+        pings = [self._pool.apply_async(_ping) for _ in range(self.num_workers)]
+        deadline = time.monotonic() + timeout
+        workers = {}
+        healthy = True
+        for ping in pings:
+            try:
+                pid, ready = ping.get(max(deadline - time.monotonic(), 0))
+            except multiprocessing.TimeoutError:
+                healthy = False
+                continue
+            workers[pid] = ready
+            healthy = healthy and ready
+        return {'workers': self.num_workers, 'responsive': len(workers), 'healthy': healthy}
+
+    def map(self, processor_path, func_name, items, *args, **kwargs):
+        """Calls a function of a processor for each item in the worker processes
+
+        Args:
+            processor_path (tuple): The names of the processors from the root to the processor
+            func_name (str): The name of the function to call
+            items (list): The items to call the function with
+
+        Returns:
+            list: The results for each item, or None if a task failed or timed out, in which \
+                case the items should be processed in the calling process.
+        """
+        if not self._pool:
+            return None
+
+        self._count('calls')
+        self._count('tasks', len(items))
+        tasks = [self._pool.apply_async(_call_processor,
+                                        (processor_path, func_name, item, args, kwargs))
+                 for item in items]
+        deadline = time.monotonic() + self.task_timeout
+        results = []
+        for task in tasks:
+            try:
+                results.append(task.get(max(deadline - time.monotonic(), 0)))
+            except multiprocessing.TimeoutError:
+                self._count('timeouts')
+                logger.warning('Worker task %r of %r timed out after %.2f seconds',
+                               func_name, processor_path, self.task_timeout)
+                return None
+            except Exception:  # pylint: disable=broad-except
+                self._count('errors')
+                logger.warning('Worker task %r of %r failed', func_name, processor_path,
+                               exc_info=True)
+                return None
+        return results
+
+
+class ThreadWorkerPool(WorkerPool):
+    """A pool of worker threads which serve the natural language processor of an app.
+
+    The threads share the models loaded in this process, so nothing is copied to process the
+    n-best transcripts of a query, and they run in parallel while the models release the GIL.
+    The calling thread processes the first item itself. Once the latency budget of a call is
+    spent, the items which the workers have not started are processed by the calling thread.
+    """
+
+    mode = THREAD_MODE
+
+    def _start_workers(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.num_workers)
+
+    def _terminate(self):
+        if self._pool:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def check_health(self, timeout=HEALTH_CHECK_TIMEOUT):
+        if not self._pool:
+            return {'workers': 0, 'responsive': 0, 'healthy': False}
+        return {'workers': self.num_workers, 'responsive': self.num_workers,
+                'healthy': self.root.ready}
+
+    def map(self, processor_path, func_name, items, *args, **kwargs):
+        """Calls a function of a processor for each item in the worker threads
+
+        Args:
+            processor_path (tuple): The names of the processors from the root to the processor
+            func_name (str): The name of the function to call
+            items (list): The items to call the function with
+
+        Returns:
+            list: The results for each item, or None if the pool was stopped.
+        """
+        pool = self._pool
+        if not pool:
+            return None
+
+        self._count('calls')
+        self._count('tasks', len(items))
+        deadline = time.monotonic() + self.task_timeout
+        func = getattr(_find_processor(self.root, processor_path), func_name)
+        futures = [pool.submit(func, item, *args, **kwargs) for item in items[1:]]
+        results = [func(items[0], *args, **kwargs)]
+
+        _, not_done = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        if not_done:
+            self._count('timeouts')
+            logger.warning('Worker tasks %r of %r exceeded the latency budget of %.2f seconds',
+                           func_name, processor_path, self.task_timeout)
+
+            # tasks which have not started are run by the calling thread, running tasks are
+            # waited for
+            for future in not_done:
+                future.cancel()
+
+        for item, future in zip(items[1:], futures):
+            if future.cancelled():
+                results.append(func(item, *args, **kwargs))
+            else:
+                results.append(future.result())
+        return results
@@ -22,6 +22,7 @@ import os
 from sklearn.externals import joblib
 
 from .. import markup
+from ..path import get_feature_cache_path
 from ..exceptions import ClassifierLoadError
 from ..core import Query
 from ..constants import DEFAULT_TRAIN_SET_REGEX, DEFAULT_TEST_SET_REGEX
@@ -199,7 +200,7 @@ class Classifier(ABC):
             label_set = model_config.train_label_set
             label_set = label_set if label_set else DEFAULT_TRAIN_SET_REGEX
 
-        new_hash = self._get_model_hash(model_config, queries, label_set)
+        new_hash, feature_hash = self._get_model_hashes(model_config, queries, label_set)
         cached_model = self._resource_loader.hash_to_model_path.get(new_hash)
 
         if incremental_timestamp and cached_model:
@@ -221,6 +222,7 @@ class Classifier(ABC):
             return
 
         model.initialize_resources(self._resource_loader, queries, classes)
+        model.register_feature_cache(self._get_feature_cache_path(feature_hash))
         model.fit(queries, classes)
         self._model = model
         self.config = ClassifierConfig.from_model_config(self._model.config)
@@ -518,12 +520,38 @@ class Classifier(ABC):
         Returns:
             str: The hash
         """
+        return self._get_model_hashes(model_config, queries, label_set)[0]
+
+    def _get_model_hashes(self, model_config, queries=None, label_set=DEFAULT_TRAIN_SET_REGEX):
+        """Returns a hash representing the inputs into the model, and a hash representing the
+        inputs into feature extraction for the model. Unlike the model hash, the feature hash
+        excludes the params and the param selection settings, so models which only differ in
+        their params share their feature matrix.
+
+        Args:
+            model_config (ModelConfig): The model configuration
+            queries (list, optional): A list of ProcessedQuery objects, to
+                train. If not specified, a label set will be loaded.
+            label_set (list, optional): A label set to load. If not specified,
+                the default training set will be loaded.
+
+        Returns:
+            (tuple): tuple containing:
+
+                * str: The model hash
+                * str: The feature hash
+        """
 
         # Hash queries
         queries_hash = self._get_queries_and_labels_hash(queries=queries, label_set=label_set)
 
         # Hash config
         config_hash = self._resource_loader.hash_string(model_config.to_json())
+        feature_config = model_config.to_dict()
+        for key in ['params', 'param_selection', 'test_label_set']:
+            feature_config.pop(key)
+        feature_config_hash = self._resource_loader.hash_string(
+            json.dumps(feature_config, sort_keys=True))
 
         # Hash resources
         rsc_strings = []
@@ -531,11 +559,21 @@ class Classifier(ABC):
             rsc_strings.append(self._resource_loader.hash_feature_resource(resource))
         rsc_hash = self._resource_loader.hash_list(rsc_strings)
 
-        return self._resource_loader.hash_list([
+        model_hash = self._resource_loader.hash_list([
             queries_hash,
             config_hash,
             rsc_hash
         ])
+        feature_hash = self._resource_loader.hash_list([
+            queries_hash,
+            feature_config_hash,
+            rsc_hash
+        ])
+        return model_hash, feature_hash
+
+    def _get_feature_cache_path(self, feature_hash):
+        """Returns the path of the cached feature matrix for the given feature hash"""
+        return get_feature_cache_path(self._resource_loader.app_path, feature_hash)
 
     def __repr__(self):
         msg = '<{} ready: {!r}, dirty: {!r}>'
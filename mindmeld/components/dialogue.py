@@ -59,6 +59,18 @@ class DirectiveTypes:
     """A view directive."""
 
 
+def get_entity_types(request):
+    """Gets the types of the entities of a request.
+
+    Args:
+        request (Request): A request object.
+
+    Returns:
+        (set): The entity types.
+    """
+    return {entity['type'] for entity in request.entities}
+
+
 class DialogueStateRule:
     """A rule that determines a dialogue state. Each rule represents a pattern that must match in
     order to invoke a particular dialogue state.
@@ -134,11 +146,13 @@ class DialogueStateRule:
             raise ValueError('For a dialogue state rule, if default is True, '
                              'domain, intent, has_entity, and targeted_only must be omitted')
 
-    def apply(self, request):
+    def apply(self, request, entity_types=None):
         """Applies the dialogue state rule to the given context.
 
         Args:
             request (Request): A request object.
+            entity_types (set, optional): The types of the entities of the request. If omitted,
+                they are computed from the request.
 
         Returns:
             (bool): Whether or not the context matches.
@@ -159,12 +173,10 @@ class DialogueStateRule:
 
         # check expected entity types are present
         if self.entity_types is not None:
-            # TODO cache entity types
-            entity_types = set()
-            for entity in request.entities:
-                entity_types.add(entity['type'])
+            if entity_types is None:
+                entity_types = get_entity_types(request)
 
-            if len(self.entity_types & entity_types) < len(self.entity_types):
+            if not self.entity_types <= entity_types:
                 return False
 
         return True
@@ -239,6 +251,12 @@ class DialogueManager:
         self.responder_class = responder_class or DialogueResponder
         self.default_rule = None
 
+        # The candidate rules for each (domain, intent) pair seen, in the order they are applied,
+        # and the middleware wrapped handler of each dialogue state. Both are cleared when rules
+        # or middleware are added.
+        self._rule_index = {}
+        self._handler_chains = {}
+
     def handle(self, **kwargs):
         """A decorator that is used to register dialogue state rules."""
 
@@ -277,6 +295,7 @@ class DialogueManager:
             raise TypeError(msg.format(middleware.__name__))
 
         self.middlewares.append(middleware)
+        self._handler_chains.clear()
 
     def add_dialogue_rule(self, name, handler, **kwargs):
         """Adds a dialogue state rule for the dialogue manager.
@@ -297,6 +316,8 @@ class DialogueManager:
         rule = DialogueStateRule(name, **kwargs)
         self.rules.append(rule)
         self.rules.sort(key=cmp_to_key(DialogueStateRule.compare), reverse=True)
+        self._rule_index.clear()
+        self._handler_chains.clear()
         if handler is not None:
             old_handler = self.handler_map.get(name)
             if old_handler is not None and old_handler != handler:
@@ -346,15 +367,39 @@ class DialogueManager:
         await handler(request, responder)
         return responder
 
+    def _get_candidate_rules(self, domain, intent):
+        """Gets the rules which may match requests for a domain and intent, most complex first.
+
+        Args:
+            domain (str): The domain of the request.
+            intent (str): The intent of the request.
+
+        Returns:
+            (tuple): The candidate rules.
+        """
+        key = (domain, intent)
+        try:
+            return self._rule_index[key]
+        except KeyError:
+            pass
+
+        candidates = tuple(rule for rule in self.rules
+                           if not rule.targeted_only and
+                           rule.domain in (None, domain) and rule.intent in (None, intent))
+        self._rule_index[key] = candidates
+        return candidates
+
     def _get_dialogue_state(self, request, target_dialogue_state=None):
         dialogue_state = None
-        for rule in self.rules:
-            if target_dialogue_state:
-                if target_dialogue_state == rule.dialogue_state:
-                    dialogue_state = rule.dialogue_state
-                    break
-            else:
-                if rule.apply(request):
+        if target_dialogue_state:
+            if any(rule.dialogue_state == target_dialogue_state for rule in self.rules):
+                dialogue_state = target_dialogue_state
+        else:
+            entity_types = None
+            for rule in self._get_candidate_rules(request.domain, request.intent):
+                if rule.entity_types is not None and entity_types is None:
+                    entity_types = get_entity_types(request)
+                if rule.apply(request, entity_types):
                     dialogue_state = rule.dialogue_state
                     break
         if dialogue_state is None:
@@ -365,11 +410,17 @@ class DialogueManager:
         return dialogue_state
 
     def _get_dialogue_handler(self, dialogue_state):
+        try:
+            return self._handler_chains[dialogue_state]
+        except KeyError:
+            pass
+
         handler = self.handler_map[dialogue_state] if dialogue_state else self._default_handler
 
         for m in reversed(self.middlewares):
             handler = partial(m, handler=handler)
 
+        self._handler_chains[dialogue_state] = handler
         return handler
 
     def _create_responder(self):
@@ -513,19 +564,6 @@ class DialogueFlow(DialogueManager):
             await res
         return {'dialogue_state': dialogue_state, 'directives': responder.directives}
 
-    def _get_dialogue_handler(self, dialogue_state):
-        handler = self.handler_map[dialogue_state] if dialogue_state else self._default_handler
-
-        try:
-            middlewares = self.middlewares
-        except AttributeError:
-            middlewares = getattr(self, 'middleware', tuple())
-
-        for m in reversed(middlewares):
-            handler = partial(m, handler=handler)
-
-        return handler
-
 
 class DialogueResponder:
     """The dialogue responder helps generate directives and fill slots in the
@@ -17,18 +17,23 @@ This module contains the entity resolver component of the MindMeld natural langu
 import copy
 import logging
 import hashlib
+import json
 import os
+from collections import OrderedDict
 
 from elasticsearch5.exceptions import ConnectionError as EsConnectionError, TransportError,\
     ElasticsearchException
 
+from .. import path
 from ..core import Entity
 from ._config import (get_app_namespace, get_classifier_config, DOC_TYPE,
                       DEFAULT_ES_SYNONYM_MAPPING, PHONETIC_ES_SYNONYM_MAPPING)
 
 from ._elasticsearch_helpers import (create_es_client, load_index, get_scoped_index_name,
-                                     delete_index, does_index_exist, get_field_names,
+                                     does_index_exist, get_field_names,
                                      INDEX_TYPE_KB, INDEX_TYPE_SYNONYM)
+from ._cache import TtlLruCache
+from ._local_entity_index import LocalSynonymIndex
 
 from ..exceptions import EntityResolverConnectionError, EntityResolverError
 
@@ -43,6 +48,12 @@ class EntityResolver:
     ES_SYNONYM_INDEX_PREFIX = "synonym"
     """The prefix of the ES index."""
 
+    LOCAL_BACKEND = 'local'
+    """The backend which resolves entities with an in-process index instead of ES."""
+
+    DEFAULT_CACHE_SIZE = 1000
+    """The default maximum number of resolved entities to cache."""
+
     def __init__(self, app_path, resource_loader, entity_type, es_host=None, es_client=None):
         """Initializes an entity resolver
 
@@ -58,9 +69,13 @@ class EntityResolver:
         self.type = entity_type
         self._is_system_entity = Entity.is_system_entity(self.type)
         self._exact_match_mapping = None
+        self._local_index = None
         self._er_config = get_classifier_config('entity_resolution', app_path=app_path)
         self._es_host = es_host
         self._es_config = {'client': es_client, 'pid': os.getpid()}
+        self._resolution_cache = TtlLruCache(
+            max_size=self._er_config.get('cache_size', EntityResolver.DEFAULT_CACHE_SIZE),
+            ttl=self._er_config.get('cache_ttl'))
 
     @property
     def _es_index_name(self):
@@ -70,10 +85,19 @@ class EntityResolver:
     def _use_text_rel(self):
         return self._er_config['model_type'] == 'text_relevance'
 
+    @property
+    def _use_local_index(self):
+        return self._er_config.get('backend') == EntityResolver.LOCAL_BACKEND
+
     @property
     def _use_double_metaphone(self):
         return 'double_metaphone' in self._er_config.get('phonetic_match_types', [])
 
+    @property
+    def cache_stats(self):
+        """dict: The size, hit and miss counts and hit rate of the cache of resolved entities"""
+        return self._resolution_cache.stats
+
     @property
     def _es_client(self):
         # Lazily connect to Elasticsearch.  Make sure each subprocess gets it's own connection
@@ -84,7 +108,7 @@ class EntityResolver:
     @classmethod
     def ingest_synonym(cls, app_namespace, index_name, index_type=INDEX_TYPE_SYNONYM,
                        field_name=None, data=None, es_host=None, es_client=None,
-                       use_double_metaphone=False):
+                       use_double_metaphone=False, clean=False):
         """Loads synonym documents from the mapping.json data into the
         specified index. If an index with the specified name doesn't exist, a
         new index with that name will be created.
@@ -106,6 +130,8 @@ class EntityResolver:
             es_host (str): The Elasticsearch host server.
             es_client (Elasticsearch): The Elasticsearch client.
             use_double_metaphone (bool): Whether to use the phonetic mapping or not.
+            clean (bool): If ``True``, rebuilds the index from scratch instead of updating the
+                existing index.
         """
         data = data or []
 
@@ -144,7 +170,7 @@ class EntityResolver:
         mapping = PHONETIC_ES_SYNONYM_MAPPING if use_double_metaphone else \
             DEFAULT_ES_SYNONYM_MAPPING
         load_index(app_namespace, index_name, _action_generator(data), len(data),
-                   mapping, DOC_TYPE, es_host, es_client)
+                   mapping, DOC_TYPE, es_host, es_client, clean=clean)
 
     def fit(self, clean=False):
         """Loads an entity mapping file to Elasticsearch for text relevance based entity resolution.
@@ -154,19 +180,22 @@ class EntityResolver:
         The synonym info is then used by Question Answerer for text relevance matches.
 
         Args:
-            clean (bool): If ``True``, deletes and recreates the index from scratch instead of
-                          updating the existing index with synonyms in the mapping.json.
+            clean (bool): If ``True``, rebuilds the index from scratch instead of updating the
+                          existing index with synonyms in the mapping.json. The rebuilt index
+                          replaces the existing one atomically once it is loaded.
         """
         if self._is_system_entity:
             return
 
+        self._resolution_cache.clear()
         if not self._use_text_rel:
             self._fit_exact_match()
             return
 
-        if clean:
-            delete_index(self._app_namespace, self._es_index_name, self._es_host,
-                         self._es_client)
+        if self._use_local_index:
+            self._fit_local_index()
+            return
+
         entity_map = self._resource_loader.get_entity_map(self.type)
 
         # list of canonical entities and their synonyms
@@ -177,7 +206,8 @@ class EntityResolver:
         EntityResolver.ingest_synonym(app_namespace=self._app_namespace,
                                       index_name=self._es_index_name, data=entities,
                                       es_host=self._es_host, es_client=self._es_client,
-                                      use_double_metaphone=self._use_double_metaphone)
+                                      use_double_metaphone=self._use_double_metaphone,
+                                      clean=clean)
 
         # It's supported to specify the KB object type and field name that the NLP entity type
         # corresponds to in the mapping.json file. In this case the synonym whitelist is also
@@ -246,6 +276,43 @@ class EntityResolver:
 
         return {'items': item_map, 'synonyms': syn_map}
 
+    def _fit_local_index(self):
+        """Builds the in-process synonym index from the entity mapping file and saves it next to
+        the models.
+        """
+        entity_map = self._resource_loader.get_entity_map(self.type)
+        if entity_map.get('kb_index_name') and entity_map.get('kb_field_name'):
+            logger.info('Synonyms of the %r entity type are not imported to the knowledge base '
+                        'with the %r entity resolver backend', self.type,
+                        EntityResolver.LOCAL_BACKEND)
+
+        logger.info("Building local synonym index for the '%s' entity type", self.type)
+        self._resolution_cache.clear()
+        self._local_index = LocalSynonymIndex(entity_map.get('entities', []),
+                                              use_double_metaphone=self._use_double_metaphone,
+                                              entity_map_hash=self._get_entity_map_hash(entity_map))
+        self._local_index.dump(self._local_index_path)
+
+    def _load_local_index(self):
+        """Loads the saved in-process synonym index, rebuilding it if the entity mapping file has
+        changed since it was built.
+        """
+        local_index = LocalSynonymIndex.load(self._local_index_path)
+        entity_map = self._resource_loader.get_entity_map(self.type)
+        if (local_index is None or
+                local_index.entity_map_hash != self._get_entity_map_hash(entity_map) or
+                local_index.use_double_metaphone != self._use_double_metaphone):
+            self._fit_local_index()
+        else:
+            self._local_index = local_index
+
+    @property
+    def _local_index_path(self):
+        return path.get_entity_resolver_index_path(self._resource_loader.app_path, self.type)
+
+    def _get_entity_map_hash(self, entity_map):
+        return self._resource_loader.hash_string(json.dumps(entity_map, sort_keys=True))
+
     def _fit_exact_match(self):
         """Fits a simple exact match entity resolution model when Elasticsearch is not available.
         """
@@ -264,12 +331,8 @@ class EntityResolver:
         Returns:
             (list): The top 20 resolved values for the provided entity.
         """
-        if isinstance(entity, (list, tuple)):
-            top_entity = entity[0]
-            entity = tuple(entity)
-        else:
-            top_entity = entity
-            entity = tuple([entity])
+        entity = self._get_nbest_entities(entity)
+        top_entity = entity[0]
 
         if self._is_system_entity:
             # system entities are already resolved
@@ -278,6 +341,114 @@ class EntityResolver:
         if not self._use_text_rel:
             return self._predict_exact_match(top_entity)
 
+        cache_key = self._get_cache_key(entity)
+        results = self._resolution_cache.get(cache_key)
+        if results is None:
+            results = self._predict_text_relevance(entity)
+            self._resolution_cache.set(cache_key, results)
+        # copy the values so callers can't modify the cached ones
+        return [dict(value) for value in results]
+
+    @staticmethod
+    def predict_batch(resolutions):
+        """Predicts the resolved value(s) for several entities, which may be of different types.
+
+        Unlike calling :meth:`predict` for each entity, the text relevance queries of all the
+        entities which are not cached are sent to Elasticsearch together, in a single multi search
+        request per Elasticsearch host.
+
+        Args:
+            resolutions (list of tuple): Pairs of the entity resolver for an entity type and an \
+                entity of that type, or a list of its n-best entity objects.
+
+        Returns:
+            (list): The top 20 resolved values for each of the provided entities.
+        """
+        results = [None] * len(resolutions)
+        # the searches to send, keyed by their cache key so repeated entities are searched once
+        searches = OrderedDict()
+        for idx, (resolver, entity) in enumerate(resolutions):
+            entity = resolver._get_nbest_entities(entity)
+            if resolver._is_system_entity or not resolver._use_text_rel or \
+                    resolver._use_local_index:
+                results[idx] = resolver.predict(entity)
+                continue
+
+            cache_key = resolver._get_cache_key(entity)
+            cached = resolver._resolution_cache.get(cache_key)
+            if cached is not None:
+                results[idx] = [dict(value) for value in cached]
+                continue
+            searches.setdefault(cache_key, (resolver, entity, []))[2].append((resolver, idx))
+
+        searches_by_host = OrderedDict()
+        for cache_key, search in searches.items():
+            searches_by_host.setdefault(search[0]._es_host, []).append((cache_key,) + search)
+
+        for host_searches in searches_by_host.values():
+            body = []
+            for _, resolver, entity, _ in host_searches:
+                body.append({'index': get_scoped_index_name(resolver._app_namespace,
+                                                            resolver._es_index_name)})
+                body.append(resolver._get_text_relevance_query(entity))
+            response = host_searches[0][1]._send_es_request('msearch', body=body)
+
+            for (cache_key, resolver, entity, targets), search_response in zip(
+                    host_searches, response['responses']):
+                if 'error' in search_response:
+                    logger.error('Unexpected error occurred when searching Elasticsearch: %s',
+                                 search_response['error'])
+                    raise EntityResolverError('Unexpected error occurred when searching '
+                                              'Elasticsearch: {}'.format(search_response['error']))
+                values = resolver._get_text_relevance_results(entity,
+                                                              search_response['hits']['hits'])
+                for target_resolver, idx in targets:
+                    target_resolver._resolution_cache.set(cache_key, values)
+                    results[idx] = [dict(value) for value in values]
+
+        return results
+
+    @staticmethod
+    def _get_nbest_entities(entity):
+        if isinstance(entity, (list, tuple)):
+            return tuple(entity)
+        return (entity,)
+
+    def _get_cache_key(self, entity):
+        return (self.type, tuple(self._normalizer(e.text) for e in entity),
+                self._use_double_metaphone)
+
+    def _predict_text_relevance(self, entity):
+        """Predicts the resolved value(s) for the given n-best entities with the text relevance
+        model.
+
+        Args:
+            entity (tuple): The n-best entity objects found in an input query
+
+        Returns:
+            (list): The top 20 resolved values for the provided entity.
+        """
+        if self._use_local_index:
+            if self._local_index is None:
+                self._load_local_index()
+            return self._local_index.search(tuple(e.text for e in entity),
+                                            use_double_metaphone=self._use_double_metaphone)
+
+        index = get_scoped_index_name(self._app_namespace, self._es_index_name)
+        response = self._send_es_request('search', index=index,
+                                         body=self._get_text_relevance_query(entity))
+        return self._get_text_relevance_results(entity, response['hits']['hits'])
+
+    def _get_text_relevance_query(self, entity):
+        """Builds the Elasticsearch text relevance query for the given n-best entities.
+
+        Args:
+            entity (tuple): The n-best entity objects found in an input query
+
+        Returns:
+            (dict): The body of the search request.
+        """
+        top_entity = entity[0]
         weight_factors = [1 - float(i) / len(entity) for i in range(len(entity))]
 
         def _construct_match_query(entity, weight=1):
@@ -423,9 +594,20 @@ class EntityResolver:
         text_relevance_query["query"]["function_score"]["query"]["bool"]["should"].append(
             whitelist_query)
 
+        return text_relevance_query
+
+    def _send_es_request(self, method, **kwargs):
+        """Sends a request to Elasticsearch, raising entity resolver errors on failure.
+
+        Args:
+            method (str): The name of the Elasticsearch client method to call
+            **kwargs: The arguments of the request
+
+        Returns:
+            (dict): The response.
+        """
         try:
-            index = get_scoped_index_name(self._app_namespace, self._es_index_name)
-            response = self._es_client.search(index=index, body=text_relevance_query)
+            return getattr(self._es_client, method)(**kwargs)
         except EsConnectionError as ex:
             logger.error(
                 'Unable to connect to Elasticsearch: %s details: %s', ex.error, ex.info)
@@ -438,33 +620,41 @@ class EntityResolver:
                                       '{}'.format(ex.error, ex.status_code, ex.info))
         except ElasticsearchException:
             raise EntityResolverError
-        else:
-            hits = response['hits']['hits']
 
-            results = []
-            for hit in hits:
-                if self._use_double_metaphone and len(entity) > 1:
-                    if hit['_score'] < 0.5 * len(entity):
-                        continue
+    def _get_text_relevance_results(self, entity, hits):
+        """Gets the resolved values from the hits of a text relevance query.
 
-                top_synonym = None
-                synonym_hits = hit['inner_hits']['whitelist']['hits']['hits']
-                if synonym_hits:
-                    top_synonym = synonym_hits[0]['_source']['name']
-                result = {
-                    'cname': hit['_source']['cname'],
-                    'score': hit['_score'],
-                    'top_synonym': top_synonym}
+        Args:
+            entity (tuple): The n-best entity objects the query was built from
+            hits (list): The hits of the response
 
-                if hit['_source'].get('id'):
-                    result['id'] = hit['_source'].get('id')
+        Returns:
+            (list): The top 20 resolved values for the provided entity.
+        """
+        results = []
+        for hit in hits:
+            if self._use_double_metaphone and len(entity) > 1:
+                if hit['_score'] < 0.5 * len(entity):
+                    continue
+
+            top_synonym = None
+            synonym_hits = hit['inner_hits']['whitelist']['hits']['hits']
+            if synonym_hits:
+                top_synonym = synonym_hits[0]['_source']['name']
+            result = {
+                'cname': hit['_source']['cname'],
+                'score': hit['_score'],
+                'top_synonym': top_synonym}
 
-                if hit['_source'].get('sort_factor'):
-                    result['sort_factor'] = hit['_source'].get('sort_factor')
+            if hit['_source'].get('id'):
+                result['id'] = hit['_source'].get('id')
 
-                results.append(result)
+            if hit['_source'].get('sort_factor'):
+                result['sort_factor'] = hit['_source'].get('sort_factor')
 
-            return results[0:20]
+            results.append(result)
+
+        return results[0:20]
 
     def _predict_exact_match(self, entity):
         """Predicts the resolved value(s) for the given entity using the loaded entity map.
@@ -494,6 +684,10 @@ class EntityResolver:
 
     def load(self):
         """Loads the trained entity resolution model from disk."""
+        if self._use_text_rel and self._use_local_index:
+            self._load_local_index()
+            return
+
         try:
             if self._use_text_rel:
                 scoped_index_name = get_scoped_index_name(self._app_namespace, self._es_index_name)
@@ -14,10 +14,6 @@
 """
 This module contains the natural language processor.
 """
-import os
-import sys
-from multiprocessing import cpu_count
-from concurrent.futures import ProcessPoolExecutor, wait
 from abc import ABC, abstractmethod
 from copy import deepcopy
 import logging
@@ -40,47 +36,16 @@ from ..path import get_app
 from ..exceptions import AllowedNlpClassesKeyError, MindMeldImportError
 from ..markup import process_markup, TIME_FORMAT
 from ..query_factory import QueryFactory
+from ._build_scheduler import BuildScheduler, get_build_worker_count
+from ._worker_pool import (WorkerPool, ThreadWorkerPool, get_worker_count, get_worker_pool,
+                           DEFAULT_TASK_TIMEOUT, THREAD_MODE)
 from ._config import get_nlp_config
 from ..system_entity_recognizer import SystemEntityRecognizer
 
 # ignore sklearn DeprecationWarning, https://github.com/scikit-learn/scikit-learn/issues/10449
 warnings.filterwarnings(action='ignore', category=DeprecationWarning)
 
-SUBPROCESS_WAIT_TIME = 0.5
-default_num_workers = 0
-if sys.version_info > (3, 0):
-    default_num_workers = cpu_count()+1
-
 logger = logging.getLogger(__name__)
-num_workers = int(os.environ.get('MM_SUBPROCESS_COUNT', default_num_workers))
-executor = ProcessPoolExecutor(max_workers=num_workers) if num_workers > 0 else None
-
-
-def restart_subprocesses():
-    """Restarts the process pool executor"""
-    global executor  # pylint: disable=global-statement
-    executor.shutdown(wait=False)
-    executor = ProcessPoolExecutor(max_workers=num_workers)
-
-
-def subproc_call_instance_function(instance_id, func_name, *args, **kwargs):
-    """
-    A module function used as a trampoline to call an instance function
-    from within a long running child process.
-
-    Args:
-        instance_id (number): id(inst) of the Processor instance that needs called
-
-    Returns:
-        The result of the called function
-    """
-    try:
-        instance = Processor.instance_map[instance_id]
-        return getattr(instance, func_name)(*args, **kwargs)
-    except Exception:  # pylint: disable=broad-except
-        # This subprocess does not have the requested instance.  Shut down and
-        # it will be recreated by the parent process with updated instances.
-        sys.exit(1)
 
 
 class Processor(ABC):
@@ -95,8 +60,22 @@ class Processor(ABC):
             messages.
     """
 
-    instance_map = {}
-    """The map of identity to instance."""
+    _processor_path = ()
+    """The names of the processors from the root processor to this processor."""
+
+    _has_dynamic_children = False
+    """Whether the children of this processor are created from its fitted model."""
+
+    _parent = None
+    """The processor this processor is a child of."""
+
+    @property
+    def _root(self):
+        """The root processor of the hierarchy this processor belongs to."""
+        processor = self
+        while processor._parent is not None:
+            processor = processor._parent
+        return processor
 
     def __init__(self, app_path, resource_loader=None, config=None):
         """Initializes a processor
@@ -115,7 +94,6 @@ class Processor(ABC):
         self.name = None
         self._incremental_timestamp = None
         self.config = get_nlp_config(app_path, config)
-        Processor.instance_map[id(self)] = self
 
     def build(self, incremental=False, label_set=None):
         """Builds all the natural language processing models for this processor and its children.
@@ -125,6 +103,12 @@ class Processor(ABC):
                 configuration has changed since the last build. Defaults to ``False``.
             label_set (string, optional): The label set from which to train all classifiers.
         """
+        num_workers = get_build_worker_count(self.config)
+        if num_workers:
+            BuildScheduler(self, num_workers).build(incremental=incremental, label_set=label_set)
+            self.resource_loader.query_cache.dump()
+            return
+
         self._build(incremental=incremental, label_set=label_set)
         # Dumping the model when incremental builds are turned on
         # allows for other models with identical data and configs
@@ -152,8 +136,30 @@ class Processor(ABC):
     def incremental_timestamp(self, ts):
         self._incremental_timestamp = ts
 
-    @abstractmethod
     def _build(self, incremental=False, label_set=None):
+        self._prepare_build(incremental=incremental)
+        self._fit(label_set=label_set)
+        self._finish_build()
+
+    def _prepare_build(self, incremental=False):
+        """Prepares this processor to be built, before any models are fit."""
+        pass
+
+    @abstractmethod
+    def _fit(self, label_set=None):
+        """Fits the model of this processor, but not those of its children."""
+        raise NotImplementedError
+
+    def _finish_build(self):
+        """Finishes building this processor once its model is fit."""
+        pass
+
+    @property
+    def _classifier(self):
+        """The classifier fit by this processor (Classifier)."""
+        return None
+
+    def _create_child(self, name):
         raise NotImplementedError
 
     def dump(self):
@@ -267,7 +273,7 @@ class Processor(ABC):
         raise NotImplementedError
 
     def _process_list(self, items, func, *args, **kwargs):
-        """Processes a list of items in parallel if possible using the executor.
+        """Processes a list of items in parallel if possible using the app's worker pool.
         Args:
             items (list): Items to process.
             func (str): Function name to call for processing.
@@ -275,26 +281,11 @@ class Processor(ABC):
         Returns:
             (tuple): Results of the processing.
         """
-        if executor:
-            try:
-                results = list(items)
-                future_to_idx_map = {}
-                for idx, item in enumerate(items):
-                    future = executor.submit(
-                        subproc_call_instance_function, id(self),
-                        func, item, *args, **kwargs)
-                    future_to_idx_map[future] = idx
-                tasks = wait(future_to_idx_map, timeout=SUBPROCESS_WAIT_TIME)
-                if tasks.not_done:
-                    raise Exception()
-                for future in tasks.done:
-                    item = future.result()
-                    item_idx = future_to_idx_map[future]
-                    results[item_idx] = item
+        worker_pool = get_worker_pool(self._root) if len(items) > 1 else None
+        if worker_pool:
+            results = worker_pool.map(self._processor_path, func, items, *args, **kwargs)
+            if results is not None:
                 return tuple(results)
-            except (Exception, SystemExit):  # pylint: disable=broad-except
-                # process pool is broken, restart it and process current request in series
-                restart_subprocesses()
         # process the list in series
         return tuple([getattr(self, func)(itm, *args, **kwargs) for itm in items])
 
@@ -356,6 +347,7 @@ class NaturalLanguageProcessor(Processor):
 
         for domain in path.get_domains(self._app_path):
             self._children[domain] = DomainProcessor(app_path, domain, self.resource_loader)
+            self._children[domain]._parent = self
 
         nbest_transcripts_nlp_classes = self.config.get(
             'resolve_entities_using_nbest_transcripts', {})
@@ -367,6 +359,57 @@ class NaturalLanguageProcessor(Processor):
                 for intent in nbest_transcripts_nlp_classes[domain]:
                     self.domains[domain].intents[intent].nbest_transcripts_enabled = True
 
+    def build(self, incremental=False, label_set=None):
+        """Builds all the natural language processing models for this application, and starts
+        the worker processes which serve them.
+
+        Args:
+            incremental (bool, optional): When ``True``, only build models whose training data or
+                configuration has changed since the last build. Defaults to ``False``.
+            label_set (string, optional): The label set from which to train all classifiers.
+        """
+        super().build(incremental=incremental, label_set=label_set)
+        self.start_worker_pool()
+
+    def load(self, incremental_timestamp=None):
+        """Loads all the natural language processing models for this application from disk, and
+        starts the worker processes which serve them.
+
+        Args:
+            incremental_timestamp (str, optional): The incremental timestamp value.
+        """
+        super().load(incremental_timestamp=incremental_timestamp)
+        if incremental_timestamp:
+            self.incremental_timestamp = incremental_timestamp
+        self.start_worker_pool()
+
+    def start_worker_pool(self):
+        """Starts the worker processes or threads, depending on the ``'nbest_execution_mode'``
+        setting, which process n-best transcripts in parallel when n-best processing is enabled
+        for some intents of the app. A running pool of the app is replaced."""
+        if not self.config.get('resolve_entities_using_nbest_transcripts'):
+            return
+        num_workers = get_worker_count()
+        if num_workers <= 0:
+            return
+        pool_class = ThreadWorkerPool \
+            if self.config.get('nbest_execution_mode') == THREAD_MODE else WorkerPool
+        pool_class.start(self, num_workers,
+                         self.config.get('nbest_latency_budget', DEFAULT_TASK_TIMEOUT))
+
+    def stop_worker_pool(self):
+        """Stops the workers which process the n-best transcripts of queries for this app, if
+        any. N-best transcripts are then processed serially until the pool is started again."""
+        worker_pool = self.worker_pool
+        if worker_pool:
+            worker_pool.stop()
+
+    @property
+    def worker_pool(self):
+        """The pool of workers which process the n-best transcripts of queries for this app, or
+        None if n-best transcripts are processed serially (WorkerPool)."""
+        return get_worker_pool(self)
+
     def _load_custom_features(self):
         # Load __init__.py so nlp object recognizes custom features in python console
         try:
@@ -379,12 +422,17 @@ class NaturalLanguageProcessor(Processor):
         """The domains supported by this application."""
         return self._children
 
-    def _build(self, incremental=False, label_set=None):
+    @property
+    def _classifier(self):
+        return self.domain_classifier
+
+    def _prepare_build(self, incremental=False):
         if incremental:
             # During an incremental build, we set the incremental_timestamp for caching
             current_ts = datetime.datetime.fromtimestamp(int(time.time())).strftime(TIME_FORMAT)
             self.incremental_timestamp = current_ts
 
+    def _fit(self, label_set=None):
         if len(self.domains) == 1:
             return
 
@@ -632,12 +680,18 @@ class DomainProcessor(Processor):
         """
         super().__init__(app_path, resource_loader)
         self.name = domain
+        self._processor_path = (domain,)
         self.intent_classifier = IntentClassifier(self.resource_loader, domain)
         for intent in path.get_intents(app_path, domain):
             self._children[intent] = IntentProcessor(app_path, domain, intent,
                                                      self.resource_loader)
+            self._children[intent]._parent = self
 
-    def _build(self, incremental=False, label_set=None):
+    @property
+    def _classifier(self):
+        return self.intent_classifier
+
+    def _fit(self, label_set=None):
         if len(self.intents) == 1:
             return
         # train intent model
@@ -803,6 +857,8 @@ class IntentProcessor(Processor):
         entity_recognizer (EntityRecognizer): The entity recognizer for this intent.
     """
 
+    _has_dynamic_children = True
+
     def __init__(self, app_path, domain, intent, resource_loader=None):
         """Initializes an intent processor object
 
@@ -815,6 +871,7 @@ class IntentProcessor(Processor):
         super().__init__(app_path, resource_loader)
         self.domain = domain
         self.name = intent
+        self._processor_path = (domain, intent)
 
         self.entity_recognizer = EntityRecognizer(self.resource_loader, domain, intent)
         try:
@@ -839,20 +896,27 @@ class IntentProcessor(Processor):
     def nbest_transcripts_enabled(self, value):
         self._nbest_transcripts_enabled = value
 
-    def _build(self, incremental=False, label_set=None):
-        """Builds the models for this intent"""
+    @property
+    def _classifier(self):
+        return self.entity_recognizer
 
-        # train entity recognizer
+    def _fit(self, label_set=None):
+        """Fits the entity recognizer for this intent"""
         self.entity_recognizer.fit(
             label_set=label_set,
             incremental_timestamp=self.incremental_timestamp)
 
-        # Create the entity processors
-        entity_types = self.entity_recognizer.entity_types
-        for entity_type in entity_types:
-            processor = EntityProcessor(self._app_path, self.domain, self.name, entity_type,
-                                        self.resource_loader)
-            self._children[entity_type] = processor
+    def _finish_build(self):
+        self._create_entity_processors()
+
+    def _create_entity_processors(self):
+        for entity_type in self.entity_recognizer.entity_types:
+            self._create_child(entity_type)
+
+    def _create_child(self, name):
+        self._children[name] = EntityProcessor(self._app_path, self.domain, self.name, name,
+                                               self.resource_loader)
+        self._children[name]._parent = self
 
     def _dump(self):
         model_path, incremental_model_path = path.get_entity_model_paths(
@@ -864,13 +928,7 @@ class IntentProcessor(Processor):
         model_path, incremental_model_path = path.get_entity_model_paths(
             self._app_path, self.domain, self.name, timestamp=incremental_timestamp)
         self.entity_recognizer.load(incremental_model_path if incremental_timestamp else model_path)
-
-        # Create the entity processors
-        entity_types = self.entity_recognizer.entity_types
-        for entity_type in entity_types:
-            processor = EntityProcessor(self._app_path, self.domain, self.name, entity_type,
-                                        self.resource_loader)
-            self._children[entity_type] = processor
+        self._create_entity_processors()
 
     def _evaluate(self, print_stats, label_set="test"):
         if len(self.entity_recognizer.entity_types) > 1:
@@ -985,16 +1043,32 @@ class IntentProcessor(Processor):
                             break
         return aligned_entities
 
-    def _classify_and_resolve_entities(self, idx, query, processed_entities, aligned_entities,
-                                       verbose=False):
+    def _classify_entity(self, idx, query, processed_entities, verbose=False):
         entity = processed_entities[idx]
         # Run the role classification
         entity, role_confidence = self.entities[entity.entity.type].process_entity(
             query, processed_entities, idx, verbose)
-        # Run the entity resolution
-        entity = self.entities[entity.entity.type].resolve_entity(entity, aligned_entities[idx])
         return [entity, role_confidence]
 
+    def _resolve_entities(self, processed_entities, aligned_entities):
+        """Resolves the given entities together, so their text relevance queries are sent to
+        Elasticsearch in a single request.
+
+        Args:
+            processed_entities (list of QueryEntity): The entities to resolve
+            aligned_entities (list of lists of QueryEntity): For each entity, the group of n-best
+                spans that represent the same canonical entity
+        """
+        resolutions = []
+        for entity, aligned_entity_spans in zip(processed_entities, aligned_entities):
+            entity_processor = self.entities[entity.entity.type]
+            entity_processor._check_ready()
+            resolutions.append((entity_processor.entity_resolver,
+                                entity_processor.get_entity_spans(entity, aligned_entity_spans)))
+
+        for entity, value in zip(processed_entities, EntityResolver.predict_batch(resolutions)):
+            entity.entity.value = value
+
     def _process_entities(self, query, entities, aligned_entities, verbose=False):
         """
 
@@ -1014,14 +1088,15 @@ class IntentProcessor(Processor):
 
         processed_entities = [deepcopy(e) for e in entities[0]]
         processed_entities_conf = self._process_list([i for i in range(len(processed_entities))],
-                                                     '_classify_and_resolve_entities',
-                                                     *[query, processed_entities, aligned_entities,
-                                                       verbose])
+                                                     '_classify_entity',
+                                                     *[query, processed_entities, verbose])
         if processed_entities_conf:
             processed_entities, role_confidence = [list(tup)
                                                    for tup in zip(*processed_entities_conf)]
         else:
             role_confidence = []
+        # Run the entity resolution
+        self._resolve_entities(processed_entities, aligned_entities)
         # Run the entity parsing
         processed_entities = self.parser.parse_entities(query, processed_entities) \
             if self.parser else processed_entities
@@ -1110,15 +1185,22 @@ class EntityProcessor(Processor):
         self.intent = intent
         self.type = entity_type
         self.name = self.type
+        self._processor_path = (domain, intent, entity_type)
 
         self.role_classifier = RoleClassifier(self.resource_loader, domain, intent, entity_type)
         self.entity_resolver = EntityResolver(app_path, self.resource_loader, entity_type)
 
-    def _build(self, incremental=False, label_set=None):
-        """Builds the models for this entity type"""
+    @property
+    def _classifier(self):
+        return self.role_classifier
+
+    def _fit(self, label_set=None):
+        """Fits the role classifier for this entity type"""
         self.role_classifier.fit(
             label_set=label_set,
             incremental_timestamp=self.incremental_timestamp)
+
+    def _finish_build(self):
         self.entity_resolver.fit()
 
     def _dump(self):
@@ -1191,13 +1273,26 @@ class EntityProcessor(Processor):
             (Entity): The entity populated with the resolved values.
         """
         self._check_ready()
-        if aligned_entity_spans:
-            entity_list = [e.entity for e in aligned_entity_spans]
-        else:
-            entity_list = [entity.entity]
-        entity.entity.value = self.entity_resolver.predict(entity_list)
+        entity.entity.value = self.entity_resolver.predict(
+            self.get_entity_spans(entity, aligned_entity_spans))
         return entity
 
+    @staticmethod
+    def get_entity_spans(entity, aligned_entity_spans=None):
+        """Gets the entities to resolve an entity from: the aligned n-best entity spans if there
+        are any, or otherwise the entity itself.
+
+        Args:
+            entity (QueryEntity): The entity to process.
+            aligned_entity_spans (list[QueryEntity]): The list of aligned n-best entity spans.
+
+        Returns:
+            (list of Entity): The entities to resolve.
+        """
+        if aligned_entity_spans:
+            return [e.entity for e in aligned_entity_spans]
+        return [entity.entity]
+
     def process_query(self, query, allowed_nlp_classes=None, dynamic_resource=None, verbose=False):
         """Not implemented"""
         del self
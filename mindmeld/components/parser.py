@@ -14,30 +14,29 @@
 """
 This module contains the language parser component of the MindMeld natural language processor
 """
-from collections import defaultdict, namedtuple, OrderedDict
+from collections import defaultdict, namedtuple
 import logging
 import time
 
-from nltk import FeatureChartParser
-from nltk.grammar import FeatureGrammar
-from nltk.featstruct import Feature
-
 from ._config import get_parser_config
 
 from ..core import Span
 from ..exceptions import ParserTimeout
-from .. import path
 
 logger = logging.getLogger(__name__)
 
-START_SYMBOL = 'S'
-HEAD_SYMBOL = 'H'
+UNKNOWN_ENTITY_TYPE = 'unk'
 
-TYPE_FEATURE = Feature('type', display='prefix')
+MAX_PARSE_TIME = 2.0
 
-START_SYMBOLS = frozenset({START_SYMBOL, HEAD_SYMBOL})
+# The cost of a grouping, compared lexicographically: the number of top level groups, the total
+# distance from dependents to their heads, and the number of dependents attached against their
+# preferred direction
+_NO_COST = (0, 0, 0)
 
-MAX_PARSE_TIME = 2.0
+
+def _add_costs(cost, other_cost):
+    return cost[0] + other_cost[0], cost[1] + other_cost[1], cost[2] + other_cost[2]
 
 
 class Parser:
@@ -45,9 +44,11 @@ class Parser:
     A language parser which is used to extract relations between entities in a
     given query and group related entities together.
 
-    The parser uses a context free grammar based on a configuration to generate
-    candidate entity groupings. Heuristics are then used to rank and select a
-    grouping.
+    The parser uses a configuration of head entities and the dependent entities which may be
+    grouped with them to find candidate entity groupings. Heuristics are then used to select
+    a grouping: the fewest groups, then the shortest distances from dependents to their heads.
+    The parser finds the best grouping with dynamic programming over the spans of the query's
+    entities, so the parse time is polynomial in the number of entities.
 
     This rule based parser will be helpful in many situations, but if you have
     a sufficiently sophisticated entity hierarchy, you may benefit from using a
@@ -66,14 +67,12 @@ class Parser:
                 resources for the parser.
             config (dict, optional): The configuration for the parser. If none
                 is provided the app config will be loaded.
+            allow_relaxed (bool, optional): Whether dependents which cannot be grouped with a
+                head may be left ungrouped when no strict grouping exists.
         """
         if not resource_loader and not config:
             raise ValueError('Parser requires either a configuration or a resource loader')
         app_path = resource_loader.app_path if resource_loader else None
-        try:
-            entity_types = path.get_entity_types(app_path) + ['unk']
-        except TypeError:
-            entity_types = {'unk'}
         self._resource_loader = resource_loader
         self.config = get_parser_config(app_path, config, domain, intent) or {}
         configured_entities = set()
@@ -82,16 +81,14 @@ class Parser:
             configured_entities.update(entity_config.keys())
 
         self._configured_entities = configured_entities
-        rules = generate_grammar(self.config, entity_types)
-        self._grammar = FeatureGrammar.fromstring(rules)
-        self._parser = FeatureChartParser(self._grammar)
-        if allow_relaxed:
-            relaxed_rules = generate_grammar(self.config, entity_types, relaxed=True)
-            self._relaxed_grammar = FeatureGrammar.fromstring(relaxed_rules)
-            self._relaxed_parser = FeatureChartParser(self._relaxed_grammar)
-        else:
-            self._relaxed_grammar = None
-            self._relaxed_parser = None
+        self._allow_relaxed = allow_relaxed
+
+        # the dependent types whose number of instances per group is limited, by head type
+        self._limited_dependents = {
+            head_type: tuple((dep_type, dep_config['max_instances'])
+                             for dep_type, dep_config in head_config.items()
+                             if dep_config.get('max_instances') is not None)
+            for head_type, head_config in self.config.items()}
 
     def parse_entities(self, query, entities, all_candidates=False, handle_timeout=True,
                        timeout=MAX_PARSE_TIME):
@@ -100,7 +97,8 @@ class Parser:
         Args:
             query (Query): The query being parsed.
             entities (list[QueryEntity]): The entities to find groupings for.
-            all_candidates (bool, optional): Whether to return all the entity candidates.
+            all_candidates (bool, optional): Whether to return the candidate groupings instead
+                of the grouped entities.
             handle_timeout (bool, optional): False if an exception should be raised in the event of
                 a parsing times out. Defaults to True.
             timeout (float, optional): The amount of time to wait for the parsing to complete.
@@ -126,7 +124,8 @@ class Parser:
     def _parse(self, query, entities, all_candidates, timeout):
         entity_type_count = defaultdict(int)
         entity_dict = {}
-        tokens = []  # tokens to be parsed
+        tokens = []  # the ids of the entities to be parsed
+        token_types = []
 
         # generate sentential form (assumes entities are sorted)
         for entity in entities:
@@ -138,87 +137,46 @@ class Parser:
                 if entity_with_role_type in self._configured_entities:
                     entity_type = entity_with_role_type
             if entity_type not in self._configured_entities:
-                entity_type = 'unk'
+                entity_type = UNKNOWN_ENTITY_TYPE
             entity_id = '{}{}'.format(entity_type, entity_type_count[entity_type])
             entity_type_count[entity_type] += 1
             entity_dict[entity_id] = entity
             tokens.append(entity_id)
+            token_types.append(entity_type)
 
         logger.debug('Parsing sentential form: %r', ' '.join(tokens))
-        start_time = time.time()
-        parses = []
-        for parse in self._parser.parse(tokens):
-            parses.append(parse)
-            if timeout is not None and (time.time() - start_time) > timeout:
-                raise ParserTimeout('Parsing took too long')
-
-        if not parses and self._relaxed_parser:
-            for parse in self._relaxed_parser.parse(tokens):
-                parses.append(parse)
-                if timeout is not None and (time.time() - start_time) > MAX_PARSE_TIME:
-                    raise ParserTimeout('Parsing took too long')
-
-        if not parses:
+        deadline = time.time() + timeout if timeout is not None else None
+        grouper = _EntityGrouper(self, query, entity_dict, tokens, token_types, deadline)
+        parse = grouper.parse()
+        if parse is None and self._allow_relaxed:
+            parse = grouper.parse(relaxed=True)
+
+        if parse is None:
             if all_candidates:
                 return []
             return entities
 
-        ranked_parses = self._rank_parses(query, entity_dict, parses, timeout, start_time)
         if all_candidates:
-            return ranked_parses
+            return [parse]
 
-        # if we still have more than one, choose the first
-        entities = self._get_flat_entities(ranked_parses[0], entities, entity_dict)
+        entities = self._get_flat_entities(parse, entities, entity_dict)
         return tuple(sorted(entities, key=lambda e: e.span.start))
 
-    def _rank_parses(self, query, entity_dict, parses, timeout, start_time=None):
-        start_time = start_time or time.time()
-        resolved = OrderedDict()
-
-        for parse in parses:
-            if timeout is not None and time.time() - start_time > timeout:
-                raise ParserTimeout('Parsing took too long')
-            resolved[self._resolve_parse(parse)] = None
-        filtered = (p for p in resolved.keys())
-
-        # Prefer parses with fewer groups
-        parses = list(sorted(filtered, key=len))
-        filtered = (p for p in parses if len(p) <= len(parses[0]))
-
-        # Prefer parses with minimal distance from dependents to heads
-        parses = list(sorted(filtered, key=lambda p: self._parse_distance(p, query, entity_dict)))
-        min_parse_dist = self._parse_distance(parses[0], query, entity_dict)
-        filtered = (p for p in parses
-                    if self._parse_distance(p, query, entity_dict) <= min_parse_dist)
-
-        # TODO: apply precedence
-
-        return list(filtered)
-
-    def _parse_distance(self, parse, query, entity_dict):
-        total_link_distance = 0
-        stack = list(parse)
-        while stack:
-            node = stack.pop()
-            head = entity_dict[node.id]
-            for dep in node.dependents or set():
-                if dep.dependents:
-                    stack.append(dep)
-                    continue
-                child = entity_dict[dep.id]
-                if child.token_span.start > head.token_span.start:
-                    intra_entity_span = Span(head.token_span.end, child.token_span.start)
-                else:
-                    intra_entity_span = Span(child.token_span.end, head.token_span.start)
-                link_distance = 0
-                for token in intra_entity_span.slice(query.text.split(' ')):
-                    if token in self.config[node.type][dep.type]['linking_words']:
-                        link_distance -= 0.5
-                    else:
-                        link_distance += 1
-                total_link_distance += link_distance
-
-        return total_link_distance
+    def _link_distance(self, query_tokens, head_type, head, dep_type, dependent):
+        """Gets the distance from a dependent entity to its head, which is the number of tokens
+        between them, less half of the number of linking words between them"""
+        if dependent.token_span.start > head.token_span.start:
+            intra_entity_span = Span(head.token_span.end, dependent.token_span.start)
+        else:
+            intra_entity_span = Span(dependent.token_span.end, head.token_span.start)
+        linking_words = self.config[head_type][dep_type]['linking_words']
+        link_distance = 0
+        for token in intra_entity_span.slice(query_tokens):
+            if token in linking_words:
+                link_distance -= 0.5
+            else:
+                link_distance += 1
+        return link_distance
 
     @staticmethod
     def _get_flat_entities(parse, entities, entity_dict):
@@ -233,42 +191,181 @@ class Parser:
 
         return [new_dict.get((e.entity.type, e.span.start), e) for e in entities]
 
-    @classmethod
-    def _resolve_parse(cls, node):
-        groups = set()
-        for child in node:
-            child_symbol = child.label()[TYPE_FEATURE]
-            if child_symbol in START_SYMBOLS:
-                groups.update(cls._resolve_parse(child))
-            else:
-                group = cls._resolve_group(child).freeze()
-                groups.add(group)
-        return frozenset(groups)
-
-    @classmethod
-    def _resolve_group(cls, node):
-        symbol = node.label()[TYPE_FEATURE]
-        if not symbol[0].isupper():
-            # this node is a generic entity of type {symbol}, its child is the terminal
-            return _EntityNode(symbol, node[0], None)
-
-        # if first char is capitalized, this is a group!
-        group_type = symbol.lower()
-        dependents = set()
-        for child in node:
-            child_symbol = child.label()[TYPE_FEATURE]
-            if child_symbol == symbol:
-                # this is the ancestor of this group
-                group = cls._resolve_group(child)
-            elif child_symbol == group_type:
-                # this is the root ancestor of this group
-                group = cls._resolve_group(child)
-                group = _EntityNode(group.type, group.id, set())
+
+class _EntityGrouper:
+    """Finds the best grouping of the entities of a query for a parser config.
+
+    A group is a contiguous span of entities made of a head entity and the dependents attached
+    to its left and right, each of which is either a single entity or, if the dependent type is
+    itself a head type, a nested group. The best group of each head type is found for every span,
+    from the shortest spans to the longest, and the best sequence of top level groups covering
+    all the entities is then found from the best groups of each span.
+    """
+
+    def __init__(self, parser, query, entity_dict, tokens, token_types, deadline):
+        self._config = parser.config
+        self._limited_dependents = parser._limited_dependents
+        self._link_distance = parser._link_distance
+        self._query_tokens = query.text.split(' ')
+        self._entity_dict = entity_dict
+        self._tokens = tokens
+        self._token_types = token_types
+        self._deadline = deadline
+
+        head_types = set(self._config)
+        dependent_types = set(t for head_config in self._config.values() for t in head_config)
+        self._head_types = head_types
+        # the types of the entities which may be top level groups on their own
+        self._standalone_types = {UNKNOWN_ENTITY_TYPE}
+        self._relaxed_standalone_types = dependent_types - head_types
+
+        self._groups = {}
+        self._sides = {}
+
+    def parse(self, relaxed=False):
+        """Finds the best grouping of all the entities
+
+        Args:
+            relaxed (bool): Whether dependent entities may be top level groups on their own
+
+        Returns:
+            frozenset: The top level groups of the best grouping, or None if the entities \
+                cannot be grouped.
+        """
+        num_tokens = len(self._tokens)
+        if not num_tokens:
+            return None
+
+        # the best grouping of the first idx tokens
+        best = [(_NO_COST, ())] + [None] * num_tokens
+        for end in range(num_tokens):
+            for start in range(end + 1):
+                if best[start] is None:
+                    continue
+                for cost, node in self._get_top_level_groups(start, end, relaxed):
+                    cost = _add_costs(_add_costs(best[start][0], cost), (1, 0, 0))
+                    if best[end + 1] is None or cost < best[end + 1][0]:
+                        best[end + 1] = (cost, best[start][1] + (node,))
+
+        if best[num_tokens] is None:
+            return None
+        return frozenset(best[num_tokens][1])
+
+    def _get_top_level_groups(self, start, end, relaxed):
+        if start == end:
+            token_type = self._token_types[start]
+            if token_type in self._standalone_types or \
+                    relaxed and token_type in self._relaxed_standalone_types:
+                yield _NO_COST, _EntityNode(token_type, self._tokens[start], None)
+        for cost, node in self._get_groups(start, end).values():
+            yield cost, node
+
+    def _check_timeout(self):
+        if self._deadline is not None and time.time() >= self._deadline:
+            raise ParserTimeout('Parsing took too long')
+
+    def _get_groups(self, start, end):
+        """Gets the best group of each head type spanning the entities from start to end"""
+        key = (start, end)
+        if key in self._groups:
+            return self._groups[key]
+
+        self._check_timeout()
+        groups = {}
+        for head in range(start, end + 1):
+            head_type = self._token_types[head]
+            if head_type not in self._head_types:
+                continue
+            limits = self._limited_dependents[head_type]
+            left = self._get_dependents(head, start, -1)
+            right = self._get_dependents(head, end, 1)
+            for left_counts, (left_cost, left_deps) in left.items():
+                for right_counts, (right_cost, right_deps) in right.items():
+                    if any(left_count + right_count > limit for left_count, right_count, (_, limit)
+                           in zip(left_counts, right_counts, limits)):
+                        continue
+                    cost = _add_costs(left_cost, right_cost)
+                    if head_type not in groups or cost < groups[head_type][0]:
+                        node = _EntityNode(head_type, self._tokens[head],
+                                           frozenset(left_deps + right_deps))
+                        groups[head_type] = (cost, node)
+
+        self._groups[key] = groups
+        return groups
+
+    def _get_dependents(self, head, bound, direction):
+        """Gets the best ways to attach dependents to a head entity on one side, covering the
+        entities from the head to the bound.
+
+        Args:
+            head (int): The index of the head entity
+            bound (int): The index of the furthest entity from the head to cover
+            direction (int): -1 to attach dependents to the left of the head, 1 to the right
+
+        Returns:
+            dict: The lowest cost and the dependents for each count of the instances of the \
+                dependent types whose number of instances is limited
+        """
+        key = (head, bound, direction)
+        if key in self._sides:
+            return self._sides[key]
+
+        head_type = self._token_types[head]
+        limits = self._limited_dependents[head_type]
+        if bound == head:
+            return {(0,) * len(limits): (_NO_COST, ())}
+
+        side = 'left' if direction < 0 else 'right'
+        options = {}
+        # the dependent nearest to the bound covers the entities from the bound to split
+        for split in range(bound, head, -direction):
+            start, end = min(bound, split), max(bound, split)
+            rest = self._get_dependents(head, split - direction, direction)
+            if not rest:
+                continue
+            for dep_type, cost, node in self._get_attachments(head, start, end, side):
+                limit_index = next((idx for idx, (limited_type, _) in enumerate(limits)
+                                    if limited_type == dep_type), None)
+                for counts, (rest_cost, rest_deps) in rest.items():
+                    if limit_index is not None:
+                        if counts[limit_index] >= limits[limit_index][1]:
+                            continue
+                        counts = counts[:limit_index] + (counts[limit_index] + 1,) + \
+                            counts[limit_index + 1:]
+                    total_cost = _add_costs(cost, rest_cost)
+                    if counts not in options or total_cost < options[counts][0]:
+                        options[counts] = (total_cost, rest_deps + (node,))
+
+        self._sides[key] = options
+        return options
+
+    def _get_attachments(self, head, start, end, side):
+        """Gets the dependents of a head entity which may span the entities from start to end,
+        with the cost of attaching them to the head on the given side"""
+        head_type = self._token_types[head]
+        head_entity = self._entity_dict[self._tokens[head]]
+        for dep_type, dep_config in self._config[head_type].items():
+            if not dep_config.get(side):
+                continue
+            # the preferred direction is the side of the dependent the head should be on
+            against_precedence = int(dep_config.get('precedence', 'left') == side)
+            if dep_type in self._head_types:
+                group = self._get_groups(start, end).get(dep_type)
+                if not group:
+                    continue
+                cost, node = group
+            elif start == end and self._token_types[start] == dep_type:
+                cost, node = _NO_COST, _EntityNode(dep_type, self._tokens[start], None)
             else:
-                dependents.add(cls._resolve_group(child).freeze())
+                continue
 
-        group.dependents.update(dependents)
-        return group
+            # like the original chart parser ranking, only the distance to dependents which
+            # have no dependents of their own counts
+            if start == end:
+                distance = self._link_distance(self._query_tokens, head_type, head_entity,
+                                               dep_type, self._entity_dict[node.id])
+                cost = _add_costs(cost, (0, distance, 0))
+            yield dep_type, _add_costs(cost, (0, 0, against_precedence)), node
 
 
 class _EntityNode(namedtuple('EntityNode', ('type', 'id', 'dependents'))):
@@ -312,125 +409,3 @@ class _EntityNode(namedtuple('EntityNode', ('type', 'id', 'dependents'))):
             return head
         dependents = tuple((c.to_query_entity(entity_dict, is_root=False) for c in self.dependents))
         return head.with_children(dependents)
-
-
-def _build_symbol_template(group, features):
-    """Builds a template for a symbol in a feature CFG.
-
-    Args:
-        group (str): The group the template is for
-        features (iterable): The names of features which should be included in
-            the template
-
-    Example:
-    >>> _build_symbol_template('Group', {'feat1', 'feat2'})
-    "Group[feat1={feat1}, feat2={feat2}]"
-
-    """
-    symbol_template = group
-    for feature in features:
-        if symbol_template is group:
-            symbol_template += '['
-        else:
-            symbol_template += ', '
-        symbol_template += '{0}={{{0}}}'.format(feature)
-    if symbol_template is not group:
-        symbol_template += ']'
-    return symbol_template
-
-
-def _generate_dependent_rules(dep_type, config, symbol_template, features, head_types):
-    """Generates the rules for a dependent entity
-
-    Args:
-        config (dict): A dictionary containing the configuration for this dependent
-        symbol_template (str): A symbol template
-        features (iterable): A list of features for this symbol
-        head_types (set): All symbols which have dependents
-
-    Yields:
-        str: A rule for the dependent
-    """
-    # If dependent is a group, its symbol should be capitalized
-    dep_symbol = dep_type.capitalize() if dep_type in head_types else dep_type
-
-    max_instances = config.get('max_instances')
-    if max_instances is None:
-        # pass through features unchanged
-        lhs = symbol_template.format(**{f: '?' + chr(ord('a') + i)
-                                        for i, f in enumerate(features)})
-        rhs = lhs
-        if config.get('left'):
-            yield '{lhs} -> {dep} {rhs}'.format(lhs=lhs, rhs=rhs, dep=dep_symbol)
-        if config.get('right'):
-            yield '{lhs} -> {rhs} {dep}'.format(lhs=lhs, rhs=rhs, dep=dep_symbol)
-    else:
-        for dep_count in range(max_instances):
-            feature_dict = {f: '?' + chr(ord('a') + i) for i, f in enumerate(features)
-                            if f is not dep_type}
-            feature_dict[dep_type] = dep_count
-            rhs = symbol_template.format(**feature_dict)
-            feature_dict[dep_type] = dep_count + 1
-            lhs = symbol_template.format(**feature_dict)
-
-            if config.get('left'):
-                yield '{lhs} -> {dep} {rhs}'.format(lhs=lhs, rhs=rhs, dep=dep_symbol)
-            if config.get('right'):
-                yield '{lhs} -> {rhs} {dep}'.format(lhs=lhs, rhs=rhs, dep=dep_symbol)
-
-
-def generate_grammar(config, entity_types=None, relaxed=False, unique_entities=20):
-    """Generates a feature context free grammar from the provided parser config.
-
-    Args:
-        config (dict): The parser configuration
-        unique_entities (int, optional): The number of entities of the same type that should be
-            permitted in the same query
-
-    Returns:
-        str: a string containing the grammar with rules separated by line
-    """
-    entity_types = set(entity_types or ())
-    # start rules
-    rules = ['{} -> {}'.format(START_SYMBOL, HEAD_SYMBOL),  # The start rule
-             '{0} -> {0} {0}'.format(HEAD_SYMBOL)]  # Allow multiple heads
-
-    # the set of all heads
-    head_types = set(config.keys())
-
-    # the set of all dependents
-    dependent_types = set((t for g in config.values() for t in g))
-
-    all_types = head_types.union(dependent_types).union(entity_types)
-
-    for entity in all_types:
-        if entity not in head_types and entity not in dependent_types:
-            # Add entities which are not mentioned in config as standalones
-            rules.append('H -> {}'.format(entity))
-        elif relaxed and entity not in head_types and entity in dependent_types:
-            # Add dependent entities as standalones in relaxed mode
-            rules.append('H -> {}'.format(entity))
-
-    # create rules for each group
-    for entity in head_types:
-        # the symbol for a group is the capitalized version of the string
-        group = entity.capitalize()
-        rules.append('H -> {}'.format(group))
-
-        dep_configs = config[entity]
-        # If a dependent has a max number of instances, we will track it as a feature
-        features = [t for t, d in dep_configs.items() if d.get('max_instances') is not None]
-
-        symbol_template = _build_symbol_template(group, features)
-
-        # basic rule with features initialized to 0
-        rules.append('{} -> {}'.format(symbol_template.format(**{f: 0 for f in features}), entity))
-
-        for dep_type, dep_config in dep_configs.items():
-            rules.extend(_generate_dependent_rules(dep_type, dep_config, symbol_template,
-                                                   features, head_types))
-    for entity in all_types:
-        for idx in range(unique_entities):
-            rules.append("{0} -> '{0}{1}'".format(entity, idx))
-
-    return '\n'.join(rules)
@@ -16,39 +16,151 @@ This module contains the question answerer component of MindMeld.
 """
 from abc import ABC, abstractmethod
 
+import copy
 import json
 import logging
-import copy
+import os
+import re
+import threading
+import time
 from elasticsearch5 import TransportError, ElasticsearchException,\
     ConnectionError as EsConnectionError
 
-from ._config import get_app_namespace, DOC_TYPE, DEFAULT_ES_QA_MAPPING, DEFAULT_RANKING_CONFIG
+from ._config import (get_app_namespace, get_question_answerer_config, DOC_TYPE,
+                      DEFAULT_ES_QA_MAPPING, DEFAULT_RANKING_CONFIG)
 from ._elasticsearch_helpers import (create_es_client, load_index, get_scoped_index_name,
-                                     does_index_exist)
+                                     get_index_metadata, DEFAULT_BULK_CHUNK_SIZE,
+                                     DEFAULT_BULK_THREAD_COUNT)
+from ._local_kb import LocalKnowledgeBase
 
+from .. import path
 from ..resource_loader import ResourceLoader
 from ..exceptions import KnowledgeBaseError, KnowledgeBaseConnectionError
 
 logger = logging.getLogger(__name__)
 
+JSON_READ_SIZE = 1 << 16
+_JSON_SEPARATOR_PATTERN = re.compile(r'[\s,]*')
+_JSON_NUMBER_CHARS = frozenset('0123456789.eE+-')
+KB_DATA_FILE_EXTENSIONS = ['.json', '.jsonl']
+
+# The number of seconds during which an in-memory knowledge base is searched without checking
+# whether its data file or entity maps changed
+LOCAL_KB_CHECK_INTERVAL = 10
+
+# The in-memory knowledge bases built by the question answerers of this process, by data file
+_local_knowledge_bases = {}
+_local_knowledge_bases_lock = threading.Lock()
+
+
+def _iter_json_array(data_fp, read_size=JSON_READ_SIZE):
+    """Incrementally parses the elements of a JSON array from a file, so that the whole file
+    never has to be loaded into memory.
+
+    Args:
+        data_fp (file): The file containing the JSON array
+        read_size (int): The minimum number of characters to read from the file at a time
+
+    Yields:
+        The elements of the array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        pos = _JSON_SEPARATOR_PATTERN.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise ValueError('Unexpected end of the JSON array in {!r}'.format(data_fp.name))
+            buffer = data_fp.read(read_size)
+            pos = 0
+            eof = not buffer
+            continue
+
+        if not started:
+            if buffer[pos] != '[':
+                raise ValueError('Expected a JSON array in {!r}'.format(data_fp.name))
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == ']':
+            return
+
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                raise
+            element, end = None, None
+        # a number at the end of the buffer may continue in the rest of the file, e.g. '12' of
+        # '12345', so it is only complete if something else follows it
+        if end is None or (not eof and (end == len(buffer) or
+                                        buffer[end] in _JSON_NUMBER_CHARS)):
+            # the element continues past the end of the buffer, so read more of it. The read size
+            # grows with the buffer to avoid parsing large elements many times over.
+            chunk = data_fp.read(max(read_size, len(buffer) - pos))
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        pos = end
+        yield element
+
+
+def _iter_json_docs(data_file):
+    """Streams the documents of a knowledge base data file, which may be a json or a jsonl file.
+
+    Args:
+        data_file (str): The path to the data file
+
+    Yields:
+        dict: The documents of the file
+    """
+    with open(data_file) as data_fp:
+        first_char = ''
+        while not first_char.strip():
+            first_char = data_fp.read(1)
+            if not first_char:
+                return
+        data_fp.seek(0)
+
+        if first_char == '[':
+            logger.debug('Loading data from a json file.')
+            yield from _iter_json_array(data_fp)
+        else:
+            logger.debug('Loading data from a jsonl file.')
+            for line in data_fp:
+                if line.strip():
+                    yield json.loads(line)
+
 
 class QuestionAnswerer:
     """The question answerer is primarily an information retrieval system that provides all the
     necessary functionality for interacting with the application's knowledge base.
     """
-    def __init__(self, app_path, resource_loader=None, es_host=None):
+    LOCAL_BACKEND = 'local'
+
+    def __init__(self, app_path, resource_loader=None, es_host=None, config=None):
         """Initializes a question answerer
 
         Args:
             app_path (str): The path to the directory containing the app's data
             resource_loader (ResourceLoader): An object which can load resources for the answerer
             es_host (str): The Elasticsearch host server
+            config (dict): The question answerer config, which overrides the one in the app's
+                config.py file
         """
         self._resource_loader = resource_loader or ResourceLoader.create_resource_loader(app_path)
         self._es_host = es_host
         self.__es_client = None
+        self._app_path = app_path
         self._app_namespace = get_app_namespace(app_path)
         self._es_field_info = {}
+        self._local_kbs = {}
+        self._qa_config = get_question_answerer_config(app_path, config)
+        self._use_local_backend = self._qa_config.get('backend') == self.LOCAL_BACKEND
 
     @property
     def _es_client(self):
@@ -143,49 +255,114 @@ class QuestionAnswerer:
         Returns:
             Search: a Search object for filtered search.
         """
+        if self._use_local_backend:
+            knowledge_base, metadata = self._get_local_kb(index)
+            return LocalSearch(knowledge_base,
+                               index=index,
+                               ranking_config=ranking_config,
+                               field_info=self._get_field_info(index, metadata),
+                               field_stats=metadata['field_stats'])
 
-        if not does_index_exist(app_namespace=self._app_namespace, index_name=index):
-            raise ValueError('Knowledge base index \'{}\' does not exist.'.format(index))
+        # the metadata is cached, so the index is only looked up when it is first searched
+        metadata = get_index_metadata(self._app_namespace, index, self._es_host, self._es_client)
 
         # get index name with app scope
         index = get_scoped_index_name(self._app_namespace, index)
 
-        # load knowledge base field information for the specified index.
-        self._load_field_info(index)
-
         return Search(client=self._es_client,
                       index=index,
                       ranking_config=ranking_config,
-                      field_info=self._es_field_info[index])
+                      field_info=self._get_field_info(index, metadata),
+                      field_stats=metadata['field_stats'])
 
-    def _load_field_info(self, index):
-        """load knowledge base field metadata information for the specified index.
+    def _get_field_info(self, index, metadata):
+        """Gets the knowledge base field metadata objects for the specified index.
 
         Args:
             index (str): index name.
+            metadata (dict): the cached field metadata of the index.
+
+        Returns:
+            dict: dictionary of FieldInfo objects for each field.
         """
+        # reuse the field info objects until the cached metadata is refreshed
+        cached_metadata, field_info = self._es_field_info.get(index, (None, None))
+        if cached_metadata is not metadata:
+            field_info = {field_name: FieldInfo(field_name, field_type)
+                          for field_name, field_type in metadata['field_types'].items()}
+            self._es_field_info[index] = (metadata, field_info)
+        return field_info
+
+    def _get_local_kb(self, index):
+        """Gets the in-memory knowledge base of an index. The knowledge base is built from the
+        data file of the index when it is first searched, and rebuilt when the data file or the
+        entity maps whose synonyms are imported into the index change. To keep file system
+        access off the path of searches, changes are checked at most every
+        ``LOCAL_KB_CHECK_INTERVAL`` seconds.
+
+        Args:
+            index (str): index name.
+
+        Returns:
+            tuple: The knowledge base and its field metadata.
+        """
+        now = time.monotonic()
+        checked, knowledge_base, metadata = self._local_kbs.get(index, (None, None, None))
+        if checked is None or now - checked >= LOCAL_KB_CHECK_INTERVAL:
+            knowledge_base, metadata = self._load_local_kb(index)
+            self._local_kbs[index] = (now, knowledge_base, metadata)
+        return knowledge_base, metadata
+
+    def _load_local_kb(self, index):
+        """Loads the in-memory knowledge base of an index, which is shared by the question
+        answerers of this process until its data file or entity maps change.
+        """
+        data_file = self._get_kb_data_file(index)
+        entity_types = [entity_type for entity_type in path.get_entity_types(self._app_path)
+                        if os.path.isfile(path.get_entity_map_path(self._app_path, entity_type))]
+        signature = tuple(os.path.getmtime(file_path) for file_path in [data_file] + [
+            path.get_entity_map_path(self._app_path, entity_type) for entity_type in entity_types])
+
+        with _local_knowledge_bases_lock:
+            cached = _local_knowledge_bases.get(data_file)
+            if cached and cached[0] == signature:
+                return cached[1], cached[2]
+
+            logger.info("Building in-memory knowledge base for index '%s' from %r",
+                        index, data_file)
+            synonyms = {}
+            for entity_type in entity_types:
+                entity_map = self._resource_loader.get_entity_map(entity_type)
+                if entity_map.get('kb_index_name') != index or not entity_map.get('kb_field_name'):
+                    continue
+                # the canonical name is the first synonym, as when importing synonyms into the
+                # Elasticsearch index
+                synonyms[entity_map['kb_field_name']] = {
+                    entity['id']: [entity['cname']] + entity.get('whitelist', [])
+                    for entity in entity_map.get('entities', []) if entity.get('id')}
+
+            knowledge_base = LocalKnowledgeBase(list(_iter_json_docs(data_file)), synonyms)
+            metadata = {'field_types': knowledge_base.field_types,
+                        'field_stats': knowledge_base.field_stats}
+            _local_knowledge_bases[data_file] = (signature, knowledge_base, metadata)
+            return knowledge_base, metadata
+
+    def _get_kb_data_file(self, index):
+        """Gets the path of the data file of an index, which is either set in the
+        ``'data_files'`` setting of the question answerer config, or found in the app's data
+        folder by its index name.
+        """
+        data_files = self._qa_config.get('data_files', {})
+        if index in data_files:
+            candidates = [os.path.join(self._app_path, data_files[index])]
+        else:
+            candidates = [os.path.join(self._app_path, 'data', index + extension)
+                          for extension in KB_DATA_FILE_EXTENSIONS]
 
-        # load field info from local cache
-        index_info = self._es_field_info.get(index, {})
-
-        if not index_info:
-            try:
-                # TODO: move the ES API call logic to ES helper
-                self._es_field_info[index] = {}
-                res = self._es_client.indices.get(index=index)
-                all_field_info = res[index]['mappings']['document']['properties']
-                for field_name in all_field_info:
-                    field_type = all_field_info[field_name].get('type')
-                    self._es_field_info[index][field_name] = FieldInfo(field_name, field_type)
-            except EsConnectionError as e:
-                logger.error('Unable to connect to Elasticsearch: %s details: %s', e.error, e.info)
-                raise KnowledgeBaseConnectionError(es_host=self._es_client.transport.hosts)
-            except TransportError as e:
-                logger.error('Unexpected error occurred when sending requests to Elasticsearch: %s '
-                             'Status code: %s details: %s', e.error, e.status_code, e.info)
-                raise KnowledgeBaseError
-            except ElasticsearchException:
-                raise KnowledgeBaseError
+        for data_file in candidates:
+            if os.path.isfile(data_file):
+                return os.path.abspath(data_file)
+        raise ValueError('Knowledge base index \'{}\' does not exist.'.format(index))
 
     def config(self, config):
         """Summary
@@ -197,7 +374,8 @@ class QuestionAnswerer:
 
     @classmethod
     def load_kb(cls, app_namespace, index_name, data_file, es_host=None, es_client=None,
-                connect_timeout=2):
+                connect_timeout=2, chunk_size=DEFAULT_BULK_CHUNK_SIZE,
+                thread_count=DEFAULT_BULK_THREAD_COUNT, clean=False):
         """Loads documents from disk into the specified index in the knowledge
         base. If an index with the specified name doesn't exist, a new index
         with that name will be created in the knowledge base.
@@ -214,44 +392,26 @@ class QuestionAnswerer:
             es_client (Elasticsearch): The Elasticsearch client.
             connect_timeout (int, optional): The amount of time for a
                 connection to the Elasticsearch host.
+            chunk_size (int, optional): The number of documents to send in
+                each bulk request.
+            thread_count (int, optional): The number of threads sending bulk
+                requests.
+            clean (bool, optional): If ``True``, rebuilds the index from
+                scratch instead of importing the documents into the existing
+                index. The rebuilt index replaces the existing one atomically
+                once it is loaded.
         """
-        def _doc_count(data_file):
-            with open(data_file) as data_fp:
-                line = data_fp.readline()
-                data_fp.seek(0)
-                if line.strip() == '[':
-                    docs = json.load(data_fp)
-                    return len(docs)
-                else:
-                    count = 0
-                    for _ in data_fp:
-                        count += 1
-                    return count
-
         def _doc_generator(data_file):
-            def transform(doc):
+            for doc in _iter_json_docs(data_file):
                 base = {'_id': doc['id']}
                 base.update(doc)
-                return base
-
-            with open(data_file) as data_fp:
-                line = data_fp.readline()
-                data_fp.seek(0)
-                if line.strip() == '[':
-                    logging.debug('Loading data from a json file.')
-                    docs = json.load(data_fp)
-                    for doc in docs:
-                        yield transform(doc)
-                else:
-                    logging.debug('Loading data from a jsonl file.')
-                    for line in data_fp:
-                        doc = json.loads(line)
-                        yield transform(doc)
+                yield base
 
-        docs = _doc_generator(data_file)
-        docs_count = _doc_count(data_file)
-        load_index(app_namespace, index_name, docs, docs_count, DEFAULT_ES_QA_MAPPING,
-                   DOC_TYPE, es_host, es_client, connect_timeout=connect_timeout)
+        # the documents are streamed, so their number is not known in advance
+        load_index(app_namespace, index_name, _doc_generator(data_file), None,
+                   DEFAULT_ES_QA_MAPPING, DOC_TYPE, es_host, es_client,
+                   connect_timeout=connect_timeout, chunk_size=chunk_size,
+                   thread_count=thread_count, clean=clean)
 
 
 class FieldInfo:
@@ -305,7 +465,7 @@ class Search:
     """
     SYN_FIELD_SUFFIX = "$whitelist"
 
-    def __init__(self, client, index, ranking_config=None, field_info=None):
+    def __init__(self, client, index, ranking_config=None, field_info=None, field_stats=None):
         """Initialize a Search object.
 
         Args:
@@ -313,21 +473,24 @@ class Search:
             index (str): index name of knowledge base object.
             ranking_config (dict): overriding ranking configuration parameters for current search.
             field_info (dict): dictionary contains knowledge base matadata objects.
+            field_stats (dict): dictionary contains the min and max values of number and date
+                fields, which are fetched from the knowledge base when not provided.
         """
         self.index = index
         self.client = client
 
+        # Search objects are immutable: clauses are never modified once built, so the clause
+        # tuples are shared between a search and the searches derived from it, and the ranking
+        # config and the field metadata, which are only read, are shared by reference.
         self._clauses = {
-            "query": [],
-            "filter": [],
-            "sort": []
+            "query": (),
+            "filter": (),
+            "sort": ()
         }
 
-        self._ranking_config = ranking_config
-        if not ranking_config:
-            self._ranking_config = copy.deepcopy(DEFAULT_RANKING_CONFIG)
-
+        self._ranking_config = ranking_config or DEFAULT_RANKING_CONFIG
         self._kb_field_info = field_info
+        self._kb_field_stats = field_stats or {}
 
     def _clone(self):
         """Clone a Search object.
@@ -335,13 +498,15 @@ class Search:
         Returns:
             Search: cloned copy of the Search object.
         """
-        s = Search(client=self.client, index=self.index)
-        s._clauses = copy.deepcopy(self._clauses)
-        s._ranking_config = copy.deepcopy(self._ranking_config)
-        s._kb_field_info = copy.deepcopy(self._kb_field_info)
+        s = copy.copy(self)
+        s._clauses = dict(self._clauses)
 
         return s
 
+    def _add_clause(self, clause):
+        clause_type = clause.get_type()
+        self._clauses[clause_type] = self._clauses[clause_type] + (clause,)
+
     def _build_query_clause(self, **kwargs):
         field, value = next(iter(kwargs.items()))
         field_info = self._kb_field_info.get(field)
@@ -354,7 +519,7 @@ class Search:
             if self._kb_field_info.get(field + self.SYN_FIELD_SUFFIX) else None
         clause = Search.QueryClause(field, field_info, value, synonym_field)
         clause.validate()
-        self._clauses[clause.get_type()].append(clause)
+        self._add_clause(clause)
 
     def _build_filter_clause(self, **kwargs):
         # set the filter type to be 'range' if any range operator is specified.
@@ -381,7 +546,7 @@ class Search:
                 raise ValueError('Invalid knowledge base field \'{}\''.format(key))
             clause = Search.FilterClause(field=key, value=value)
         clause.validate()
-        self._clauses[clause.get_type()].append(clause)
+        self._add_clause(clause)
 
     def _build_sort_clause(self, **kwargs):
         sort_field = kwargs.get('field')
@@ -403,7 +568,7 @@ class Search:
                                    field_stats,
                                    sort_location)
         clause.validate()
-        self._clauses[clause.get_type()].append(clause)
+        self._add_clause(clause)
 
     def _build_clause(self, clause_type, **kwargs):
         """Helper method to build query, filter and sort clauses.
@@ -511,6 +676,8 @@ class Search:
         Returns:
             dict: dictionary that contains knowledge base field statistics.
         """
+        if field in self._kb_field_stats:
+            return self._kb_field_stats[field]
 
         stats_query = {"aggs": {}, "size": 0}
         stats_query['aggs'][field + '_min'] = {"min": {"field": field}}
@@ -926,3 +1093,41 @@ class Search:
                     self.field_info.is_location_field()):
                 raise ValueError('Custom sort criteria can only be defined for'
                                  + ' \'number\', \'date\' or \'location\' fields.')
+
+
+class LocalSearch(Search):
+    """A search over an in-memory knowledge base, which is used by the question answerer's local
+    backend instead of an Elasticsearch index.
+    """
+
+    def __init__(self, knowledge_base, index, ranking_config=None, field_info=None,
+                 field_stats=None):
+        """Initialize a LocalSearch object.
+
+        Args:
+            knowledge_base (LocalKnowledgeBase): the in-memory knowledge base to search.
+            index (str): index name of knowledge base object.
+            ranking_config (dict): overriding ranking configuration parameters for current search.
+            field_info (dict): dictionary contains knowledge base matadata objects.
+            field_stats (dict): dictionary contains the min and max values of number and date
+                fields.
+        """
+        super().__init__(client=None, index=index, ranking_config=ranking_config,
+                         field_info=field_info, field_stats=field_stats)
+        self._knowledge_base = knowledge_base
+
+    def _get_field_stats(self, field):
+        return self._kb_field_stats.get(field)
+
+    def execute(self, size=10):
+        """Executes the knowledge base search with provided criteria and returns matching documents.
+
+        Args:
+            size (int): The maximum number of records to fetch, default to 10.
+
+        Returns:
+            a list of matching documents.
+        """
+        return self._knowledge_base.search(self._clauses,
+                                           self._ranking_config['query_clauses_operator'],
+                                           size=size)
@@ -16,6 +16,8 @@ import immutables
 from pytz import timezone
 from pytz.exceptions import UnknownTimeZoneError
 
+from ._history import History
+
 logger = logging.getLogger(__name__)
 
 
@@ -41,6 +43,13 @@ def _validate_time_zone(param=None):
     return param
 
 
+def _freeze_history(history):
+    """Converts a history to a tuple of read-only turns, keeping histories as they are"""
+    if isinstance(history, History):
+        return history
+    return History(history)
+
+
 def _validate_generic(name, ptype):
     def validator(param):
         if not isinstance(param, ptype):
@@ -185,7 +194,7 @@ class Request:
     entities = attr.ib(default=attr.Factory(tuple),
                        converter=tuple)
     history = attr.ib(default=attr.Factory(tuple),
-                      converter=tuple)
+                      converter=_freeze_history)
     text = attr.ib(default=None)
     frame = attr.ib(default=immutables.Map(),
                     converter=immutables.Map)
@@ -91,7 +91,7 @@ class RoleClassifier(Classifier):
             label_set = model_config.train_label_set
             label_set = label_set if label_set else DEFAULT_TRAIN_SET_REGEX
 
-        new_hash = self._get_model_hash(model_config, queries, label_set)
+        new_hash, feature_hash = self._get_model_hashes(model_config, queries, label_set)
         cached_model = self._resource_loader.hash_to_model_path.get(new_hash)
 
         if incremental_timestamp and cached_model:
@@ -109,6 +109,7 @@ class RoleClassifier(Classifier):
                 self.roles.add(label)
 
             model.initialize_resources(self._resource_loader, queries, labels)
+            model.register_feature_cache(self._get_feature_cache_path(feature_hash))
             model.fit(examples, labels)
             self._model = model
             self.config = ClassifierConfig.from_model_config(self._model.config)
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the stores which keep the state of conversations on the server, so
+clients can refer to a conversation by its session id instead of sending its frame, params
+and history with every request.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import attr
+
+from ..exceptions import MindMeldImportError, SessionConflictError
+from .._json import dump_json
+from ._cache import TtlLruCache
+from ._history import History
+from .request import FrozenParams
+
+logger = logging.getLogger(__name__)
+
+MEMORY_STORE = 'memory'
+SQLITE_STORE = 'sqlite'
+REDIS_STORE = 'redis'
+
+
+@attr.s(frozen=True, kw_only=True)
+class Session:
+    """The state of a conversation between two turns.
+
+    Attributes:
+        frame (dict): The frame returned by the most recent turn
+        params (FrozenParams): The params returned by the most recent turn
+        history (History): The history of the conversation, most recent turn first
+        version (int): The number of times the session was stored. A session which was never
+            stored has version 0.
+    """
+    frame = attr.ib(default=attr.Factory(dict))
+    params = attr.ib(default=FrozenParams())
+    history = attr.ib(default=attr.Factory(tuple))
+    version = attr.ib(default=0)
+
+
+def _dump_session(session):
+    """Serializes the frame, params and history of a session to JSON"""
+    return dump_json({'frame': session.frame,
+                      'params': attr.asdict(session.params, recurse=False),
+                      'history': session.history})
+
+
+def _load_session(data, version):
+    """Deserializes a session stored by ``_dump_session``"""
+    data = json.loads(data)
+    return Session(frame=data['frame'], params=FrozenParams(**data['params']),
+                   history=History(data['history']), version=version)
+
+
+def _conflict(session_id, version):
+    return SessionConflictError('Session {!r} was updated by another request since version '
+                                '{}'.format(session_id, version))
+
+
+class SessionStore:
+    """The base class of session stores, which keep the state of conversations by session id.
+
+    Stores use optimistic concurrency: a session is stored only if the stored version is still
+    the one it was loaded from, so concurrent requests of a conversation can not silently
+    overwrite each other's turns. A session which expired or was evicted since it was loaded
+    is stored again.
+    """
+
+    def get(self, session_id):
+        """Gets the state of a conversation
+
+        Args:
+            session_id (str): The session id of the conversation
+
+        Returns:
+            Session: The session, or None if the session is unknown or has expired
+        """
+        raise NotImplementedError
+
+    def set(self, session_id, session):
+        """Stores the state of a conversation
+
+        Args:
+            session_id (str): The session id of the conversation
+            session (Session): The session, whose version is the version it was loaded from
+
+        Returns:
+            Session: The stored session, with its new version
+
+        Raises:
+            SessionConflictError: If another version of the session was stored by another \
+                request since it was loaded
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """Deletes the state of a conversation
+
+        Args:
+            session_id (str): The session id of the conversation
+        """
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """A session store in the memory of this process, which keeps the most recently used
+    sessions. The stored histories share their turns with each other and with the responses.
+    """
+
+    def __init__(self, max_sessions=10000, ttl=None):
+        """Initializes an in-memory session store
+
+        Args:
+            max_sessions (int): The maximum number of sessions
+            ttl (float, optional): The number of seconds after which an idle session expires
+        """
+        self._sessions = TtlLruCache(max_sessions, ttl)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def set(self, session_id, session):
+        with self._lock:
+            stored = self._sessions.get(session_id)
+            if stored is not None and stored.version != session.version:
+                raise _conflict(session_id, session.version)
+            session = attr.evolve(session, version=session.version + 1)
+            self._sessions.set(session_id, session)
+        return session
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.invalidate(session_id)
+
+
+class SqliteSessionStore(SessionStore):
+    """A session store in a local SQLite database, which can be shared by the worker processes
+    of a server. Sessions are stored as JSON.
+    """
+
+    def __init__(self, path, ttl=None):
+        """Initializes a SQLite session store
+
+        Args:
+            path (str): The path of the database file
+            ttl (float, optional): The number of seconds after which an idle session expires
+        """
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._purged = time.time()
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with self._connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, '
+                               'version INTEGER NOT NULL, expires REAL, data BLOB NOT NULL)')
+
+    def _connect(self):
+        # connections can not be shared by threads or forked processes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, session_id):
+        row = self._connect().execute(
+            'SELECT version, data FROM sessions WHERE id = ? AND '
+            '(expires IS NULL OR expires > ?)', (session_id, time.time())).fetchone()
+        if row is None:
+            return None
+        return _load_session(row[1], row[0])
+
+    def set(self, session_id, session):
+        now = time.time()
+        version = session.version + 1
+        data = _dump_session(session)
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT version FROM sessions WHERE id = ? AND (expires IS NULL OR expires > ?)',
+                (session_id, now)).fetchone()
+            if row is not None and row[0] != session.version:
+                raise _conflict(session_id, session.version)
+            connection.execute(
+                'INSERT OR REPLACE INTO sessions (id, version, expires, data) '
+                'VALUES (?, ?, ?, ?)',
+                (session_id, version, now + self.ttl if self.ttl else None, data))
+            if self.ttl and now - self._purged > self.ttl:
+                self._purged = now
+                connection.execute('DELETE FROM sessions WHERE expires <= ?', (now,))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return attr.evolve(session, version=version)
+
+    def delete(self, session_id):
+        self._connect().execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+
+class RedisSessionStore(SessionStore):
+    """A session store in a Redis compatible server, which can be shared by several servers.
+    Sessions are stored as JSON.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', ttl=None, prefix='mindmeld:session:',
+                 client=None):
+        """Initializes a Redis session store
+
+        Args:
+            url (str): The URL of the Redis server
+            ttl (float, optional): The number of seconds after which an idle session expires
+            prefix (str): The prefix of the keys of the sessions
+            client (redis.Redis, optional): A client to use instead of connecting to the URL
+        """
+        try:
+            import redis
+        except ImportError:
+            raise MindMeldImportError("The Redis session store requires the redis library. "
+                                      "Please install it with 'pip install mindmeld[redis]'.")
+        self.ttl = ttl
+        self.prefix = prefix
+        self._client = client or redis.Redis.from_url(url)
+        self._watch_error = redis.WatchError
+
+    def get(self, session_id):
+        version, data = self._client.hmget(self.prefix + session_id, 'version', 'data')
+        if data is None:
+            return None
+        return _load_session(data, int(version))
+
+    def set(self, session_id, session):
+        key = self.prefix + session_id
+        version = session.version + 1
+        data = _dump_session(session)
+        with self._client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                stored_version = pipe.hget(key, 'version')
+                if stored_version is not None and int(stored_version) != session.version:
+                    raise _conflict(session_id, session.version)
+                pipe.multi()
+                pipe.hset(key, mapping={'version': version, 'data': data})
+                if self.ttl:
+                    pipe.pexpire(key, int(self.ttl * 1000))
+                pipe.execute()
+            except self._watch_error:
+                raise _conflict(session_id, session.version)
+        return attr.evolve(session, version=version)
+
+    def delete(self, session_id):
+        self._client.delete(self.prefix + session_id)
+
+
+def create_session_store(config):
+    """Creates the session store described by a session configuration
+
+    Args:
+        config (dict): The session configuration. See ``DEFAULT_SESSION_CONFIG`` for the \
+            settings and their defaults.
+
+    Returns:
+        SessionStore: The session store, or None if no store is configured
+    """
+    store = config.get('store')
+    ttl = config.get('ttl')
+    if not store:
+        return None
+    if store == MEMORY_STORE:
+        return MemorySessionStore(config.get('max_sessions', 10000), ttl)
+    if store == SQLITE_STORE:
+        return SqliteSessionStore(config['path'], ttl)
+    if store == REDIS_STORE:
+        return RedisSessionStore(config.get('url') or 'redis://localhost:6379/0', ttl)
+    raise ValueError('Unknown session store {!r}. Should be one of {!r}.'.format(
+        store, (MEMORY_STORE, SQLITE_STORE, REDIS_STORE)))
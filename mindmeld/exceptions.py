@@ -41,6 +41,11 @@ class BadMindMeldRequestError(MindMeldError):
         return obj
 
 
+class SessionConflictError(BadMindMeldRequestError):
+    """An exception for when a session was updated by another request since it was loaded"""
+    status_code = 409
+
+
 class EmbeddingDownloadError(MindMeldError):
     pass
 
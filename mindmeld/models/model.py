@@ -17,9 +17,12 @@ import logging
 import json
 import math
 import copy
+import os
+import time
 
 from inspect import signature
 import numpy as np
+from sklearn.externals import joblib
 
 from sklearn.model_selection import (KFold, GroupShuffleSplit, GroupKFold, GridSearchCV,
                                      ShuffleSplit, StratifiedKFold, StratifiedShuffleSplit)
@@ -29,6 +32,7 @@ from sklearn.metrics import (f1_score, precision_recall_fscore_support as score,
 from .helpers import (get_feature_extractor, get_label_encoder, register_label, ENTITIES_LABEL_TYPE,
                       entity_seqs_equal, CHAR_NGRAM_FREQ_RSC, WORD_NGRAM_FREQ_RSC, ENABLE_STEMMING,
                       ingest_dynamic_gazetteer)
+from .param_search import create_param_search
 from .taggers.taggers import (get_tags_from_entities, get_entities_from_tags, get_boundary_counts,
                               BoundaryCounts)
 from .._version import _get_mm_version
@@ -39,6 +43,46 @@ LIKELIHOOD_SCORING = 'log_loss'
 
 _NEG_INF = -1e10
 
+FEATURE_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+"""The number of seconds after which a cached feature matrix which was not used is deleted"""
+
+FEATURE_CACHE_MAX_SIZE = 2 ** 30
+"""The maximum total size in bytes of the cached feature matrices of an app. The least
+recently used matrices are deleted beyond this size."""
+
+
+def _prune_feature_cache(folder, max_age=FEATURE_CACHE_MAX_AGE, max_size=FEATURE_CACHE_MAX_SIZE):
+    """Deletes the cached feature matrices which were not used for longer than the maximum age,
+    then the least recently used ones until the folder is within the maximum size.
+
+    Args:
+        folder (str): The folder of the cached feature matrices
+        max_age (float): The maximum number of seconds since a matrix was last used
+        max_size (int): The maximum total size of the matrices in bytes
+    """
+    entries = []
+    for name in os.listdir(folder):
+        cache_path = os.path.join(folder, name)
+        try:
+            stat = os.stat(cache_path)
+        except OSError:
+            # deleted by a concurrent build
+            continue
+        entries.append((stat.st_mtime, stat.st_size, cache_path))
+
+    now = time.time()
+    total_size = sum(size for _, size, _ in entries)
+    for mtime, size, cache_path in sorted(entries):
+        if now - mtime <= max_age and (total_size <= max_size or cache_path.endswith('.tmp')):
+            # matrices being written by concurrent builds are only deleted once abandoned
+            continue
+        logger.debug('Deleting the cached feature matrix %r', cache_path)
+        try:
+            os.remove(cache_path)
+        except OSError:
+            continue
+        total_size -= size
+
 
 class ModelConfig:
     """A value object representing a model configuration.
@@ -699,6 +743,7 @@ class Model:
         self._current_params = None
         self._resources = {}
         self._clf = None
+        self._feature_cache_path = None
         self.cv_loss_ = None
 
     def _fit(self, examples, labels, params=None):
@@ -741,11 +786,15 @@ class Model:
         param_grid = self._convert_params(selection_settings['grid'], labels)
         model_class = self._get_model_constructor()
         estimator, param_grid = self._get_cv_estimator_and_params(model_class, param_grid)
-        # set GridSearchCV's return_train_score attribute to False improves cross-validation
-        # runtime perf as it doesn't have to compute training scores and which we don't consume
-        grid_cv = GridSearchCV(estimator=estimator, scoring=scoring, param_grid=param_grid,
-                               cv=cv_iterator, n_jobs=n_jobs, return_train_score=False)
-        model = grid_cv.fit(examples, labels, groups)
+        search_cv = create_param_search(estimator, param_grid, scoring, cv_iterator, n_jobs,
+                                        selection_settings)
+        if search_cv is None:
+            # set GridSearchCV's return_train_score attribute to False improves cross-validation
+            # runtime perf as it doesn't have to compute training scores and which we don't
+            # consume
+            search_cv = GridSearchCV(estimator=estimator, scoring=scoring, param_grid=param_grid,
+                                     cv=cv_iterator, n_jobs=n_jobs, return_train_score=False)
+        model = search_cv.fit(examples, labels, groups)
 
         for idx, params in enumerate(model.cv_results_['params']):
             logger.debug('Candidate parameters: %s', params)
@@ -899,6 +948,52 @@ class Model:
     def get_feature_matrix(self, examples, y=None, fit=False):
         raise NotImplementedError
 
+    def register_feature_cache(self, cache_path):
+        """Registers the location on disk where the feature matrix extracted from the training
+        examples is cached. The path should be unique to the training examples and the feature
+        configuration of the model, but not to its params, so that models which only differ in
+        their params can be trained without extracting features again.
+
+        Args:
+            cache_path (str): The path of the cached feature matrix
+        """
+        self._feature_cache_path = cache_path
+
+    def _load_feature_cache(self):
+        """Loads the cached feature matrix for the training examples, if there is one.
+
+        Returns:
+            dict: The cached feature matrix and fitted feature transformers, or None
+        """
+        if not self._feature_cache_path or not os.path.isfile(self._feature_cache_path):
+            return None
+        try:
+            payload = joblib.load(self._feature_cache_path)
+            # mark the matrix as recently used, so it is pruned last
+            os.utime(self._feature_cache_path)
+            return payload
+        except (OSError, IOError, EOFError, ValueError):
+            logger.warning('Unable to load the cached feature matrix at %r',
+                           self._feature_cache_path)
+            return None
+
+    def _dump_feature_cache(self, payload):
+        """Caches the feature matrix extracted for the training examples.
+
+        Args:
+            payload (dict): The feature matrix and fitted feature transformers
+        """
+        if not self._feature_cache_path:
+            return
+        folder = os.path.dirname(self._feature_cache_path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        # write to a temporary file first so concurrent builds never read a partial cache
+        tmp_path = '{}.{}.tmp'.format(self._feature_cache_path, os.getpid())
+        joblib.dump(payload, tmp_path)
+        os.replace(tmp_path, self._feature_cache_path)
+        _prune_feature_cache(folder)
+
     def _extract_features(self, example, dynamic_resource=None, tokenizer=None):
         """Gets all features from an example.
 
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains hyperparameter search strategies which are cheaper than an exhaustive grid
+search, for use when selecting the params of a model through cross-validation.
+"""
+import logging
+import math
+import time
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.externals.joblib import Parallel, delayed
+from sklearn.metrics.scorer import check_scoring
+from sklearn.model_selection import ParameterGrid, ParameterSampler
+from sklearn.utils import safe_indexing
+
+from ..exceptions import MindMeldImportError
+
+logger = logging.getLogger(__name__)
+
+GRID_SEARCH = 'grid'
+HALVING_SEARCH = 'halving'
+RANDOM_SEARCH = 'random'
+BAYES_SEARCH = 'bayes'
+
+DEFAULT_HALVING_FACTOR = 3
+DEFAULT_SEARCH_ITERATIONS = 10
+
+# Params which can be swept in increasing order while warm starting the estimator, reusing the
+# solution for the previous value (e.g. the coefficients along the regularization path)
+WARM_START_PATH_PARAMS = ['C', 'n_estimators']
+
+# Solvers which ignore the warm_start param. 'warn' is the default of logistic regression in
+# some scikit-learn versions, and resolves to 'liblinear'.
+WARM_START_UNSUPPORTED_SOLVERS = {'liblinear', 'warn'}
+
+
+def _get_warm_start_paths(estimator, candidates):
+    """Orders the candidates into paths which can be fit by warm starting a single estimator.
+
+    Args:
+        estimator: The estimator to search the params of
+        candidates (list of dict): The candidate params
+
+    Returns:
+        list of list of int: The indices of the candidates in each path
+    """
+    estimator_params = estimator.get_params()
+    path_params = [param for param in WARM_START_PATH_PARAMS
+                   if all(param in candidate for candidate in candidates)]
+    if ('warm_start' not in estimator_params or not path_params or
+            any('warm_start' in candidate for candidate in candidates)):
+        return [[idx] for idx in range(len(candidates))]
+    solver = estimator_params.get('solver')
+    if any(candidate.get('solver', solver) in WARM_START_UNSUPPORTED_SOLVERS
+           for candidate in candidates):
+        return [[idx] for idx in range(len(candidates))]
+
+    path_param = path_params[0]
+    paths = {}
+    for idx, candidate in enumerate(candidates):
+        other_params = tuple(sorted((key, repr(value)) for key, value in candidate.items()
+                                    if key != path_param))
+        paths.setdefault(other_params, []).append(idx)
+
+    return [sorted(path, key=lambda idx: candidates[idx][path_param]) for path in paths.values()]
+
+
+def _clone_path_estimator(estimator, path):
+    path_estimator = clone(estimator)
+    if len(path) > 1:
+        path_estimator.set_params(warm_start=True)
+    return path_estimator
+
+
+def _fit_and_score_paths(estimator, scorer, X, y, train, test, candidates, paths):
+    """Fits and scores the candidates on a single cross-validation split
+
+    Returns:
+        (tuple): The score of each candidate and the total time spent fitting
+    """
+    X_train, y_train = safe_indexing(X, train), safe_indexing(y, train)
+    X_test, y_test = safe_indexing(X, test), safe_indexing(y, test)
+
+    scores = np.empty(len(candidates))
+    fit_time = 0.0
+    for path in paths:
+        path_estimator = _clone_path_estimator(estimator, path)
+        for idx in path:
+            start_time = time.time()
+            try:
+                path_estimator.set_params(**candidates[idx])
+                path_estimator.fit(X_train, y_train)
+                scores[idx] = scorer(path_estimator, X_test, y_test)
+            except ValueError as exc:
+                # e.g. a subsample of the training data is missing some of the classes
+                logger.debug('Failed to fit candidate %s: %s', candidates[idx], exc)
+                scores[idx] = -np.inf
+                path_estimator = _clone_path_estimator(estimator, path)
+            fit_time += time.time() - start_time
+    return scores, fit_time
+
+
+def _subsample(train, y, fraction, random_state):
+    """Subsamples the training indices of a split, keeping the proportion of each class"""
+    if fraction >= 1:
+        return train
+    y_train = safe_indexing(y, train)
+    if len(y_train) and isinstance(y_train[0], (list, tuple, np.ndarray)):
+        # sequence labels cannot be stratified
+        keep = int(math.ceil(fraction * len(train)))
+        return np.sort(random_state.permutation(train)[:keep])
+
+    y_train = np.asarray(y_train)
+
+    samples = []
+    for label in np.unique(y_train):
+        label_train = train[y_train == label]
+        keep = int(math.ceil(fraction * len(label_train)))
+        samples.append(random_state.permutation(label_train)[:keep])
+    return np.sort(np.concatenate(samples))
+
+
+class WarmStartSearchCV:
+    """A base class for hyperparameter searches which evaluate candidates through
+    cross-validation, warm starting the estimator along the path of a param where the
+    estimator supports it. The fitted search exposes the same attributes as scikit-learn's
+    ``GridSearchCV`` which are used to select the params of a model.
+    """
+
+    def __init__(self, estimator, param_grid, scoring=None, cv=None, n_jobs=1,
+                 random_state=None):
+        """Initializes a hyperparameter search
+
+        Args:
+            estimator: The estimator to search the params of
+            param_grid (dict): Lists of param values, keyed by param name
+            scoring (str or callable): The scoring method
+            cv: The cross-validation iterator
+            n_jobs (int): The number of jobs to evaluate the cross-validation splits in parallel
+            random_state (int): The seed used to sample candidates and training data
+        """
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.n_candidates_ = None
+        self.search_time_ = None
+        self.search_time_saved_ = None
+        self._fit_time = 0.0
+        self._full_fit_times = []
+
+    def _evaluate(self, candidates, X, y, splits, fraction=1.0):
+        """Evaluates the candidates on the cross-validation splits, using a fraction of the
+        training data of each split.
+
+        Returns:
+            (tuple): The mean and standard deviation of the test score of each candidate
+        """
+        random_state = np.random.RandomState(self.random_state)
+        paths = _get_warm_start_paths(self.estimator, candidates)
+        scorer = check_scoring(self.estimator, scoring=self.scoring)
+        results = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_and_score_paths)(self.estimator, scorer, X, y,
+                                          _subsample(train, y, fraction, random_state), test,
+                                          candidates, paths)
+            for train, test in splits)
+
+        scores = np.array([split_scores for split_scores, _ in results])
+        fit_time = sum(split_time for _, split_time in results)
+        self._fit_time += fit_time
+        if fraction >= 1:
+            self._full_fit_times.append(fit_time / (len(candidates) * len(splits)))
+        return scores.mean(axis=0), scores.std(axis=0)
+
+    def _get_candidates(self):
+        raise NotImplementedError
+
+    def _search(self, candidates, X, y, splits):
+        """Evaluates the candidates
+
+        Returns:
+            (tuple): tuple containing:
+
+                * (numpy.array): The mean test score of each candidate
+                * (numpy.array): The standard deviation of the test score of each candidate
+                * (list of int): The candidates eligible to be selected as the best
+        """
+        raise NotImplementedError
+
+    def fit(self, X, y, groups=None):
+        """Searches for the best params and refits the estimator with them on all the data
+
+        Args:
+            X: The training examples
+            y: The training labels
+            groups (list, optional): The group of each example used to split the data
+
+        Returns:
+            WarmStartSearchCV: self
+        """
+        start_time = time.time()
+        candidates = self._get_candidates()
+        splits = list(self.cv.split(X, y, groups))
+        self.n_splits_ = len(splits)
+        self.n_candidates_ = len(ParameterGrid(self.param_grid))
+
+        mean_scores, std_scores, finalists = self._search(candidates, X, y, splits)
+        self.cv_results_ = {
+            'params': candidates,
+            'mean_test_score': mean_scores,
+            'std_test_score': std_scores
+        }
+        best_index = max(finalists, key=lambda idx: mean_scores[idx])
+        self.best_index_ = best_index
+        self.best_params_ = candidates[best_index]
+        self.best_score_ = mean_scores[best_index]
+        self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        self.search_time_ = time.time() - start_time
+
+        if self._full_fit_times:
+            _log_time_saved(self, len(candidates), self._fit_time, np.mean(self._full_fit_times))
+        return self
+
+
+class HalvingSearchCV(WarmStartSearchCV):
+    """A successive halving search. All candidates are first evaluated with a small fraction of
+    the training data of each split. Only the best scoring ``1 / factor`` of the candidates are
+    kept for the next round, which uses ``factor`` times as much training data, until the last
+    round evaluates the remaining candidates with all of the training data.
+    """
+
+    def __init__(self, estimator, param_grid, scoring=None, cv=None, n_jobs=1,
+                 random_state=None, factor=DEFAULT_HALVING_FACTOR):
+        super().__init__(estimator, param_grid, scoring, cv, n_jobs, random_state)
+        self.factor = factor
+
+    def _get_candidates(self):
+        return list(ParameterGrid(self.param_grid))
+
+    def _search(self, candidates, X, y, splits):
+        num_rounds = max(int(math.ceil(math.log(len(candidates), self.factor))), 1)
+        mean_scores = np.full(len(candidates), -np.inf)
+        std_scores = np.zeros(len(candidates))
+
+        remaining = list(range(len(candidates)))
+        for search_round in range(num_rounds):
+            if search_round:
+                # keep the best scoring candidates of the previous round
+                num_kept = int(math.ceil(len(remaining) / float(self.factor)))
+                remaining = sorted(remaining, key=lambda idx: -mean_scores[idx])[:num_kept]
+
+            fraction = float(self.factor) ** (search_round - num_rounds + 1)
+            round_mean, round_std = self._evaluate([candidates[idx] for idx in remaining],
+                                                   X, y, splits, fraction)
+            logger.debug('Evaluated %d candidates with %.1f%% of the training data',
+                         len(remaining), 100 * fraction)
+            # Eliminated candidates keep the score of the last round they were evaluated in
+            mean_scores[remaining] = round_mean
+            std_scores[remaining] = round_std
+
+        return mean_scores, std_scores, remaining
+
+
+class RandomSearchCV(WarmStartSearchCV):
+    """A randomized search, which evaluates a random sample of ``n_iter`` candidates from the
+    grid with all of the training data of each split.
+    """
+
+    def __init__(self, estimator, param_grid, scoring=None, cv=None, n_jobs=1,
+                 random_state=None, n_iter=DEFAULT_SEARCH_ITERATIONS):
+        super().__init__(estimator, param_grid, scoring, cv, n_jobs, random_state)
+        self.n_iter = n_iter
+
+    def _get_candidates(self):
+        n_iter = min(self.n_iter, len(ParameterGrid(self.param_grid)))
+        return list(ParameterSampler(self.param_grid, n_iter, random_state=self.random_state))
+
+    def _search(self, candidates, X, y, splits):
+        mean_scores, std_scores = self._evaluate(candidates, X, y, splits)
+        return mean_scores, std_scores, list(range(len(candidates)))
+
+
+class BayesianSearchCV:
+    """A Bayesian optimization search, which evaluates ``n_iter`` candidates chosen by
+    scikit-optimize's ``BayesSearchCV``. The fitted search exposes the same attributes as the
+    other searches.
+    """
+
+    def __init__(self, estimator, param_grid, scoring=None, cv=None, n_jobs=1,
+                 random_state=None, n_iter=DEFAULT_SEARCH_ITERATIONS):
+        try:
+            from skopt import BayesSearchCV  # pylint: disable=import-error
+        except ImportError:
+            raise MindMeldImportError("The 'bayes' param search requires the scikit-optimize "
+                                      "package. Please install it with "
+                                      "'pip install mindmeld[bayes]'.")
+        self.param_grid = param_grid
+        self.n_candidates_ = None
+        self.search_time_ = None
+        self.search_time_saved_ = None
+        self._search = BayesSearchCV(estimator, param_grid, scoring=scoring, cv=cv,
+                                     n_jobs=n_jobs, n_iter=n_iter, random_state=random_state)
+
+    def fit(self, X, y, groups=None):
+        """Searches for the best params and refits the estimator with them on all the data
+
+        Args:
+            X: The training examples
+            y: The training labels
+            groups (list, optional): The group of each example used to split the data
+
+        Returns:
+            BayesianSearchCV: self
+        """
+        start_time = time.time()
+        self._search.fit(X, y, groups=groups)
+        for attribute in ('cv_results_', 'n_splits_', 'best_index_', 'best_params_',
+                          'best_score_', 'best_estimator_'):
+            setattr(self, attribute, getattr(self._search, attribute))
+        self.n_candidates_ = len(ParameterGrid(self.param_grid))
+        self.search_time_ = time.time() - start_time
+
+        fit_times = self.cv_results_['mean_fit_time']
+        _log_time_saved(self, len(fit_times), np.sum(fit_times) * self.n_splits_,
+                        np.mean(fit_times))
+        return self
+
+
+def _log_time_saved(search, num_evaluated, fit_time, mean_fit_time):
+    """Estimates the time a fitted search saved compared to a full grid search, from the mean
+    time it took to fit a candidate on a split with all of the training data
+
+    Args:
+        search: The fitted search
+        num_evaluated (int): The number of candidates the search evaluated
+        fit_time (float): The total time the search spent fitting candidates
+        mean_fit_time (float): The mean time to fit a candidate on a split
+    """
+    full_grid_time = mean_fit_time * search.n_candidates_ * search.n_splits_
+    search.search_time_saved_ = max(full_grid_time - fit_time, 0.0)
+    logger.info('Searched %s of %s candidates in %.2fs, an estimated %.2fs faster than a full '
+                'grid search', num_evaluated, search.n_candidates_, search.search_time_,
+                search.search_time_saved_)
+
+
+def create_param_search(estimator, param_grid, scoring, cv, n_jobs, selection_settings):
+    """Creates the hyperparameter search selected by the ``'search'`` key of the param
+    selection settings.
+
+    Args:
+        estimator: The estimator to search the params of
+        param_grid (dict): Lists of param values, keyed by param name
+        scoring (str or callable): The scoring method
+        cv: The cross-validation iterator
+        n_jobs (int): The number of parallel jobs
+        selection_settings (dict): The param selection settings
+
+    Returns:
+        The search, or None if an exhaustive grid search was selected
+    """
+    search = selection_settings.get('search', GRID_SEARCH)
+    random_state = selection_settings.get('random_state')
+    if search == GRID_SEARCH:
+        return None
+    elif search == HALVING_SEARCH:
+        return HalvingSearchCV(estimator, param_grid, scoring=scoring, cv=cv, n_jobs=n_jobs,
+                               random_state=random_state,
+                               factor=selection_settings.get('factor', DEFAULT_HALVING_FACTOR))
+    elif search == RANDOM_SEARCH:
+        return RandomSearchCV(estimator, param_grid, scoring=scoring, cv=cv, n_jobs=n_jobs,
+                              random_state=random_state,
+                              n_iter=selection_settings.get('n_iter', DEFAULT_SEARCH_ITERATIONS))
+    elif search == BAYES_SEARCH:
+        return BayesianSearchCV(estimator, param_grid, scoring=scoring, cv=cv, n_jobs=n_jobs,
+                                random_state=random_state,
+                                n_iter=selection_settings.get('n_iter', DEFAULT_SEARCH_ITERATIONS))
+    raise ValueError('Unknown param search: {!r}'.format(search))
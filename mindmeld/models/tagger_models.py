@@ -22,7 +22,7 @@ from .helpers import (register_model, get_label_encoder, get_seq_accuracy_scorer
 from .model import EvaluatedExample, ModelConfig, EntityModelEvaluation, Model
 from .taggers.crf import ConditionalRandomFields
 from .taggers.memm import MemmModel
-from .taggers.lstm import LstmModel
+from .taggers.lstm_numpy import NumpyLstmModel
 from ..exceptions import MindMeldError
 from ..tokenizer import Tokenizer
 
@@ -33,6 +33,9 @@ CRF_TYPE = 'crf'
 MEMM_TYPE = 'memm'
 LSTM_TYPE = 'lstm'
 
+# LSTM runtimes
+NUMPY_RUNTIME = 'numpy'
+
 # for default model scoring types
 ACCURACY_SCORING = 'accuracy'
 SEQ_ACCURACY_SCORING = 'seq_accuracy'
@@ -129,6 +132,12 @@ class TaggerModel(Model):
         examples = [examples[i] for i in indices]
         labels = [labels[i] for i in indices]
 
+        # Inference only runtimes are replaced by the trainable model
+        model_constructor = self._get_model_constructor(for_training=True)
+        if self._clf.__class__ != model_constructor:
+            self._clf = model_constructor()
+            self._clf.setup_model(self.config)
+
         types = [entity.entity.type for label in labels for entity in label]
         self.types = types
         if len(set(types)) == 0:
@@ -151,7 +160,7 @@ class TaggerModel(Model):
             self._current_params = params
         else:
             # run cross validation to select params
-            if self._clf.__class__ == LstmModel:
+            if self.config.model_settings['classifier_type'] == LSTM_TYPE:
                 raise MindMeldError("The LSTM model does not support cross-validation")
 
             _, best_params = self._fit_cv(X, y, groups)
@@ -303,14 +312,26 @@ class TaggerModel(Model):
         model_eval = EntityModelEvaluation(config, evaluations)
         return model_eval
 
-    def _get_model_constructor(self):
-        """Returns the python class of the actual underlying model"""
+    def _get_model_constructor(self, for_training=False):
+        """Returns the python class of the actual underlying model
+
+        Args:
+            for_training (bool): Whether the model is going to be trained, in which case
+                inference only runtimes are not used
+        """
         classifier_type = self.config.model_settings['classifier_type']
+        if classifier_type == LSTM_TYPE:
+            if self.config.model_settings.get('lstm_runtime') == NUMPY_RUNTIME \
+                    and not for_training:
+                return NumpyLstmModel
+            # TensorFlow is only imported when the TensorFlow LSTM model is used
+            from .taggers.lstm import LstmModel
+            return LstmModel
+
         try:
             return {
                 MEMM_TYPE: MemmModel,
                 CRF_TYPE: ConditionalRandomFields,
-                LSTM_TYPE: LstmModel,
             }[classifier_type]
         except KeyError:
             msg = '{}: Classifier type {!r} not recognized'
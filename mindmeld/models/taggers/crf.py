@@ -15,6 +15,8 @@
 This module contains the CRF entity recognizer.
 """
 import logging
+import threading
+
 import numpy as np
 from sklearn_crfsuite import CRF
 
@@ -45,13 +47,26 @@ class ConditionalRandomFields(Tagger):
     def set_params(self, **parameters):
         self._clf = CRF()
         self._clf.set_params(**parameters)
+        # the crfsuite tagger holds the sequence it tags, so it can only tag from one thread at
+        # a time
+        self._tagger_lock = threading.Lock()
         return self
 
+    def __getstate__(self):
+        attributes = super().__getstate__()
+        attributes.pop('_tagger_lock', None)
+        return attributes
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._tagger_lock = threading.Lock()
+
     def get_params(self, deep=True):
         return self._clf.get_params()
 
     def predict(self, X, dynamic_resource=None):
-        return self._clf.predict(X)
+        with self._tagger_lock:
+            return self._clf.predict(X)
 
     def predict_proba(self, examples, config, resources):
         """
@@ -66,8 +81,9 @@ class ConditionalRandomFields(Tagger):
              with confidence scores
         """
         X, _, _ = self.extract_features(examples, config, resources)
-        seq = self._clf.predict(X)
-        marginals_dict = self._clf.predict_marginals(X)
+        with self._tagger_lock:
+            seq = self._clf.predict(X)
+            marginals_dict = self._clf.predict_marginals(X)
         marginal_tuples = []
         for query_index, query_seq in enumerate(seq):
             query_marginal_tuples = []
@@ -14,6 +14,10 @@ import os
 import zipfile
 import logging
 import pickle
+import hashlib
+import tempfile
+import threading
+from collections.abc import Mapping
 from urllib.request import urlretrieve
 import numpy as np
 
@@ -21,14 +25,19 @@ from tqdm import tqdm
 
 from ...path import EMBEDDINGS_FILE_PATH, \
     EMBEDDINGS_FOLDER_PATH, PREVIOUSLY_USED_WORD_EMBEDDINGS_FILE_PATH, \
-    PREVIOUSLY_USED_CHAR_EMBEDDINGS_FILE_PATH
+    PREVIOUSLY_USED_CHAR_EMBEDDINGS_FILE_PATH, EMBEDDINGS_STORE_VOCAB_PATH, \
+    EMBEDDINGS_STORE_MATRIX_PATH
 from ...exceptions import EmbeddingDownloadError
 
 logger = logging.getLogger(__name__)
 
 GLOVE_DOWNLOAD_LINK = 'http://nlp.stanford.edu/data/glove.6B.zip'
 EMBEDDING_FILE_PATH_TEMPLATE = 'glove.6B.{}d.txt'
+EMBEDDING_STORE_NAME_TEMPLATE = 'glove.6B.{}d'
 ALLOWED_WORD_EMBEDDING_DIMENSIONS = [50, 100, 200, 300]
+EMBEDDING_STORE_DTYPE = np.float32
+INITIAL_VOCABULARY_CAPACITY = 1024
+PADDING_TOKEN_ID = 0
 
 
 class TqdmUpTo(tqdm):
@@ -47,9 +56,91 @@ class TqdmUpTo(tqdm):
         self.update(b * bsize - self.n)  # will also set self.n = b * bsize
 
 
+class MemoryMappedEmbeddings(Mapping):
+    """A read-only mapping from tokens to pretrained embeddings, backed by a vocabulary index
+    and a float32 embedding matrix which is memory-mapped from disk. Processes which open the
+    same store share the pages of the matrix.
+    """
+
+    def __init__(self, vocab_path, matrix_path, dimension):
+        """Opens an embedding store
+
+        Args:
+            vocab_path (str): The path of the pickled token to row index mapping
+            matrix_path (str): The path of the raw float32 embedding matrix
+            dimension (int): The dimension of the embeddings
+        """
+        with open(vocab_path, 'rb') as vocab_file:
+            self.token_to_index = pickle.load(vocab_file)
+        self.dimension = dimension
+        self.matrix = np.memmap(matrix_path, dtype=EMBEDDING_STORE_DTYPE, mode='r',
+                                shape=(len(self.token_to_index), dimension))
+
+    def __getitem__(self, token):
+        return np.array(self.matrix[self.token_to_index[token]])
+
+    def __contains__(self, token):
+        return token in self.token_to_index
+
+    def __iter__(self):
+        return iter(self.token_to_index)
+
+    def __len__(self):
+        return len(self.token_to_index)
+
+    @staticmethod
+    def exists(vocab_path, matrix_path, source_path=None):
+        """Checks whether an embedding store exists and is up to date with its source file
+
+        Args:
+            vocab_path (str): The path of the vocabulary index
+            matrix_path (str): The path of the embedding matrix
+            source_path (str, optional): The path of the text file the store was built from
+
+        Returns:
+            (bool): Whether the store can be opened
+        """
+        if not (os.path.isfile(vocab_path) and os.path.isfile(matrix_path)):
+            return False
+        if source_path and os.path.getmtime(source_path) > os.path.getmtime(vocab_path):
+            return False
+        return True
+
+    @staticmethod
+    def convert(embedding_file, vocab_path, matrix_path, dimension):
+        """Converts a GloVe formatted text file into an embedding store. The files are written
+        to temporary paths and moved into place, so concurrent conversions do not corrupt
+        the store.
+
+        Args:
+            embedding_file (file): An open GloVe formatted file
+            vocab_path (str): The path to write the vocabulary index to
+            matrix_path (str): The path to write the embedding matrix to
+            dimension (int): The dimension of the embeddings
+        """
+        folder = os.path.dirname(matrix_path)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        token_to_index = {}
+        with tempfile.NamedTemporaryFile(dir=folder, delete=False) as matrix_file:
+            for line in embedding_file:
+                values = line.split()
+                if len(values) != dimension + 1 or values[0] in token_to_index:
+                    continue
+                token_to_index[values[0]] = len(token_to_index)
+                matrix_file.write(np.asarray(values[1:], dtype=EMBEDDING_STORE_DTYPE).tobytes())
+        os.replace(matrix_file.name, matrix_path)
+
+        with tempfile.NamedTemporaryFile(dir=folder, delete=False) as vocab_file:
+            pickle.dump(token_to_index, vocab_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(vocab_file.name, vocab_path)
+
+
 class GloVeEmbeddingsContainer:
     """This class is responsible for the downloading, extraction and storing of
-    word embeddings based on the GloVe format."""
+    word embeddings based on the GloVe format. The embeddings are converted once into a
+    memory-mapped binary store, which is reused by subsequent runs."""
 
     def __init__(self, token_dimension=300, token_pretrained_embedding_filepath=None):
 
@@ -69,13 +160,31 @@ class GloVeEmbeddingsContainer:
         self._extract_embeddings()
 
     def get_pretrained_word_to_embeddings_dict(self):
-        """Returns the word to embedding dict.
+        """Returns the word to embedding mapping.
 
         Returns:
-            (dict): word to embedding mapping.
+            (MemoryMappedEmbeddings): read-only word to embedding mapping.
         """
         return self.word_to_embedding
 
+    def _get_store_paths(self, file_location=None):
+        """Returns the paths of the binary embedding store built from an embedding file
+
+        Args:
+            file_location (str, optional): The provided embedding file, defaults to the GloVe
+                embeddings of the selected dimension
+
+        Returns:
+            (tuple): The vocabulary index and embedding matrix paths
+        """
+        if file_location:
+            path_hash = hashlib.md5(os.path.abspath(file_location).encode('utf8')).hexdigest()
+            name = '{}.{}'.format(os.path.basename(file_location), path_hash[:8])
+        else:
+            name = EMBEDDING_STORE_NAME_TEMPLATE.format(self.token_dimension)
+        return (EMBEDDINGS_STORE_VOCAB_PATH.format(name=name),
+                EMBEDDINGS_STORE_MATRIX_PATH.format(name=name))
+
     def _download_embeddings_and_return_zip_handle(self):
 
         logger.info("Downloading embedding from %s", GLOVE_DOWNLOAD_LINK)
@@ -106,25 +215,38 @@ class GloVeEmbeddingsContainer:
 
             return zip_file_object
 
-    def _extract_and_map(self, glove_file):
-        for line in glove_file:
-            values = line.split()
-            word = values[0]
-            coefs = np.asarray(values[1:], dtype='float32')
-            self.word_to_embedding[word] = coefs
+    def _extract_and_map(self, glove_file, file_location=None):
+        vocab_path, matrix_path = self._get_store_paths(file_location)
+        logger.info("Converting embeddings to the binary store %s.", matrix_path)
+        MemoryMappedEmbeddings.convert(glove_file, vocab_path, matrix_path, self.token_dimension)
+        self._open_store(file_location)
+
+    def _open_store(self, file_location=None):
+        vocab_path, matrix_path = self._get_store_paths(file_location)
+        self.word_to_embedding = MemoryMappedEmbeddings(vocab_path, matrix_path,
+                                                        self.token_dimension)
 
     def _extract_embeddings(self):
         file_location = self.token_pretrained_embedding_filepath
 
         if file_location and os.path.isfile(file_location):
+            if MemoryMappedEmbeddings.exists(*self._get_store_paths(file_location),
+                                             source_path=file_location):
+                self._open_store(file_location)
+                return
+
             logger.info("Extracting embeddings from provided "
                         "file location %s.", str(file_location))
             with open(file_location, 'r') as embedding_file:
-                self._extract_and_map(embedding_file)
+                self._extract_and_map(embedding_file, file_location)
             return
 
         logger.info("Provided file location %s does not exist.", str(file_location))
 
+        if MemoryMappedEmbeddings.exists(*self._get_store_paths()):
+            self._open_store()
+            return
+
         file_name = EMBEDDING_FILE_PATH_TEMPLATE.format(self.token_dimension)
 
         if os.path.isfile(EMBEDDINGS_FILE_PATH):
@@ -158,6 +280,98 @@ class GloVeEmbeddingsContainer:
         return
 
 
+class EmbeddingVocabulary:
+    """A stable mapping from tokens to ids, backed by a growable embedding matrix in which
+    the row of each token is its id. The id 0 is reserved for padding and maps to the zero
+    vector, so a padded matrix of token ids can be encoded with a single gather.
+    """
+
+    def __init__(self, dimension, initial_capacity=INITIAL_VOCABULARY_CAPACITY):
+        """Initializes the vocabulary
+
+        Args:
+            dimension (int): The dimension of the embeddings
+            initial_capacity (int): The number of rows initially allocated
+        """
+        self.dimension = dimension
+        self.token_to_id = {}
+        self.embeddings = np.zeros((max(initial_capacity, 2), dimension))
+        self._size = PADDING_TOKEN_ID + 1
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        attributes = self.__dict__.copy()
+        attributes['embeddings'] = self.embeddings[:self._size]
+        del attributes['_lock']
+        return attributes
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __contains__(self, token):
+        return token in self.token_to_id
+
+    def __len__(self):
+        return len(self.token_to_id)
+
+    def add(self, token, embedding):
+        """Adds a token to the vocabulary, or replaces its embedding if it is already in it
+
+        Args:
+            token (str): The token
+            embedding (ndarray): The embedding of the token
+
+        Returns:
+            (int): The id of the token
+        """
+        with self._lock:
+            token_id = self.token_to_id.get(token)
+            if token_id is None:
+                if self._size == len(self.embeddings):
+                    embeddings = np.zeros((2 * len(self.embeddings), self.dimension))
+                    embeddings[:self._size] = self.embeddings[:self._size]
+                    self.embeddings = embeddings
+                token_id = self._size
+                self._size += 1
+            self.embeddings[token_id] = embedding
+            self.token_to_id[token] = token_id
+        return token_id
+
+    def get_ids(self, tokens, new_embedding):
+        """Returns the ids of a sequence of tokens, adding unseen tokens to the vocabulary
+
+        Args:
+            tokens (list): A sequence of tokens
+            new_embedding (function): Returns the embedding of an unseen token
+
+        Returns:
+            (list of int): The token ids
+        """
+        token_ids = []
+        for token in tokens:
+            token_id = self.token_to_id.get(token)
+            if token_id is None:
+                token_id = self.add(token, new_embedding(token))
+            token_ids.append(token_id)
+        return token_ids
+
+    def get_embedding(self, token):
+        """Returns the embedding of a token in the vocabulary"""
+        return self.embeddings[self.token_to_id[token]]
+
+    def gather(self, token_ids):
+        """Encodes an array of token ids into an embedding tensor
+
+        Args:
+            token_ids (ndarray): An integer array of token ids of any shape
+
+        Returns:
+            (ndarray): The embeddings, with an additional trailing embedding dimension
+        """
+        return self.embeddings[token_ids]
+
+
 class WordSequenceEmbedding:
     """WordSequenceEmbedding encodes a sequence of words into a sequence of fixed
     dimension real-numbered vectors by mapping each word as a vector.
@@ -179,12 +393,31 @@ class WordSequenceEmbedding:
         self.token_embedding_dimension = token_embedding_dimension
         self.sequence_padding_length = sequence_padding_length
 
-        self.token_to_embedding_mapping = GloVeEmbeddingsContainer(
+        self.pretrained_embeddings = GloVeEmbeddingsContainer(
             token_embedding_dimension,
             token_pretrained_embedding_filepath).get_pretrained_word_to_embeddings_dict()
 
+        self.vocabulary = EmbeddingVocabulary(self.token_embedding_dimension)
         self._add_historic_embeddings()
 
+    def encode_sequences_of_tokens(self, token_sequences):
+        """Encodes a batch of token sequences into real value vectors with a single gather
+        from the embedding matrix of the vocabulary.
+
+        Args:
+            token_sequences (list of list): A batch of token sequences.
+
+        Returns:
+            (ndarray): Encoded sequences of shape [batch, padding length, dimension].
+        """
+        token_ids = np.full((len(token_sequences), self.sequence_padding_length),
+                            PADDING_TOKEN_ID, dtype=np.int64)
+        for idx, token_sequence in enumerate(token_sequences):
+            token_sequence = token_sequence[:self.sequence_padding_length]
+            token_ids[idx, :len(token_sequence)] = self.vocabulary.get_ids(
+                token_sequence, self._new_embedding)
+        return self.vocabulary.gather(token_ids)
+
     def encode_sequence_of_tokens(self, token_sequence):
         """Encodes a sequence of tokens into real value vectors.
 
@@ -192,20 +425,13 @@ class WordSequenceEmbedding:
             token_sequence (list): A sequence of tokens.
 
         Returns:
-            (list): Encoded sequence of tokens.
+            (ndarray): Encoded sequence of tokens.
         """
-        default_encoding = np.zeros(self.token_embedding_dimension)
-        encoded_query = [default_encoding] * self.sequence_padding_length
-
-        for idx, token in enumerate(token_sequence):
-            if idx >= self.sequence_padding_length:
-                break
-            encoded_query[idx] = self._encode_token(token)
+        return self.encode_sequences_of_tokens([token_sequence])[0]
 
-        return encoded_query
-
-    def _encode_token(self, token):
-        """Encodes a token to its corresponding embedding
+    def _new_embedding(self, token):
+        """Returns the pretrained embedding of a token, or a random embedding if the token
+        is not in the pretrained embeddings
 
         Args:
             token (str): Individual token
@@ -213,10 +439,9 @@ class WordSequenceEmbedding:
         Returns:
             corresponding embedding
         """
-        if token not in self.token_to_embedding_mapping:
-            random_vector = np.random.uniform(-1, 1, size=(self.token_embedding_dimension,))
-            self.token_to_embedding_mapping[token] = random_vector
-        return self.token_to_embedding_mapping[token]
+        if token in self.pretrained_embeddings:
+            return self.pretrained_embeddings[token]
+        return np.random.uniform(-1, 1, size=(self.token_embedding_dimension,))
 
     def _add_historic_embeddings(self):
         historic_word_embeddings = {}
@@ -228,14 +453,23 @@ class WordSequenceEmbedding:
             pkl_file.close()
 
         for word in historic_word_embeddings:
+            # Historic files written before the binary store also contain the pretrained
+            # embeddings, which are looked up lazily instead
+            if word in self.pretrained_embeddings:
+                continue
             if len(historic_word_embeddings[word]) == self.token_embedding_dimension:
-                self.token_to_embedding_mapping[word] = historic_word_embeddings.get(word)
+                self.vocabulary.add(word, historic_word_embeddings.get(word))
 
     def save_embeddings(self):
-        """Save extracted embeddings to historic pickle file.
+        """Save the embeddings of tokens which are not in the pretrained store to the historic
+        pickle file.
         """
+        token_to_embedding_mapping = {
+            token: self.vocabulary.get_embedding(token) for token in self.vocabulary.token_to_id
+            if token not in self.pretrained_embeddings}
+
         output = open(PREVIOUSLY_USED_WORD_EMBEDDINGS_FILE_PATH, 'wb')
-        pickle.dump(self.token_to_embedding_mapping, output)
+        pickle.dump(token_to_embedding_mapping, output)
         output.close()
 
 
@@ -259,50 +493,51 @@ class CharacterSequenceEmbedding:
         self.token_embedding_dimension = token_embedding_dimension
         self.sequence_padding_length = sequence_padding_length
         self.max_char_per_word = max_char_per_word
-        self.token_to_embedding_mapping = {}
+        self.vocabulary = EmbeddingVocabulary(self.token_embedding_dimension)
         self._add_historic_embeddings()
 
-    def encode_sequence_of_tokens(self, token_sequence):
-        """Encodes a sequence of tokens into real value vectors.
+    def encode_sequences_of_tokens(self, token_sequences):
+        """Encodes a batch of token sequences into real value vectors with a single gather
+        from the embedding matrix of the vocabulary.
 
         Args:
-            token_sequence (list): A sequence of tokens.
+            token_sequences (list of list): A batch of token sequences.
 
         Returns:
-            (list): Encoded sequence of tokens.
+            (ndarray): Encoded sequences of shape [batch, padding length, maximum characters \
+                per word, dimension].
         """
-        default_encoding = np.zeros(self.token_embedding_dimension)
-        default_char_word = [default_encoding] * self.max_char_per_word
-        encoded_query = [default_char_word] * self.sequence_padding_length
-
-        for idx, word_token in enumerate(token_sequence):
-            if idx >= self.sequence_padding_length:
-                break
+        char_ids = np.full((len(token_sequences), self.sequence_padding_length,
+                            self.max_char_per_word), PADDING_TOKEN_ID, dtype=np.int64)
+        for idx, token_sequence in enumerate(token_sequences):
+            for idx2, word_token in enumerate(token_sequence[:self.sequence_padding_length]):
+                chars = word_token[:self.max_char_per_word]
+                char_ids[idx, idx2, :len(chars)] = self.vocabulary.get_ids(
+                    chars, self._new_embedding)
+        return self.vocabulary.gather(char_ids)
 
-            encoded_word = [default_encoding] * self.max_char_per_word
-            for idx2, char_token in enumerate(word_token):
-                if idx2 >= self.max_char_per_word:
-                    break
+    def encode_sequence_of_tokens(self, token_sequence):
+        """Encodes a sequence of tokens into real value vectors.
 
-                self._encode_token(char_token)
-                encoded_word[idx2] = self.token_to_embedding_mapping[char_token]
+        Args:
+            token_sequence (list): A sequence of tokens.
 
-            encoded_query[idx] = encoded_word
-        return encoded_query
+        Returns:
+            (ndarray): Encoded sequence of tokens.
+        """
+        return self.encode_sequences_of_tokens([token_sequence])[0]
 
-    def _encode_token(self, token):
-        """Encodes a token to its corresponding embedding
+    def _new_embedding(self, token):
+        """Returns a random embedding for an unseen character
 
         Args:
-            token (str): Individual token
+            token (str): Individual character
 
         Returns:
             corresponding embedding
         """
-        if token not in self.token_to_embedding_mapping:
-            random_vector = np.random.uniform(-1, 1, size=(self.token_embedding_dimension,))
-            self.token_to_embedding_mapping[token] = random_vector
-        return self.token_to_embedding_mapping[token]
+        del token
+        return np.random.uniform(-1, 1, size=(self.token_embedding_dimension,))
 
     def _add_historic_embeddings(self):
         historic_char_embeddings = {}
@@ -314,11 +549,16 @@ class CharacterSequenceEmbedding:
             pkl_file.close()
 
         for char in historic_char_embeddings:
-            self.token_to_embedding_mapping[char] = historic_char_embeddings.get(char)
+            if len(historic_char_embeddings[char]) == self.token_embedding_dimension:
+                self.vocabulary.add(char, historic_char_embeddings.get(char))
 
     def save_embeddings(self):
         """Save extracted embeddings to historic pickle file.
         """
+        token_to_embedding_mapping = {
+            token: self.vocabulary.get_embedding(token)
+            for token in self.vocabulary.token_to_id}
+
         output = open(PREVIOUSLY_USED_CHAR_EMBEDDINGS_FILE_PATH, 'wb')
-        pickle.dump(self.token_to_embedding_mapping, output)
+        pickle.dump(token_to_embedding_mapping, output)
         output.close()
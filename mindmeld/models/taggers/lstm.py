@@ -12,28 +12,27 @@
 # limitations under the License.
 import numpy as np
 import tensorflow as tf
-import re
 import math
 import logging
 import os
 
 from sklearn.externals import joblib
-from .taggers import Tagger, extract_sequence_features
-from .embeddings import WordSequenceEmbedding, CharacterSequenceEmbedding
-from sklearn.preprocessing import LabelBinarizer
+from ...exceptions import MindMeldError
+from .lstm_base import BaseLstmModel
+from .lstm_numpy import NUMPY_EXPORT_FILE_NAME, lstm_forward
 
 DEFAULT_ENTITY_TOKEN_SPAN_INDEX = 2
-GAZ_PATTERN_MATCH = r'in-gaz\|type:(\w+)\|pos:(\w+)\|'
-REGEX_TYPE_POSITIONAL_INDEX = 1
-DEFAULT_LABEL = 'B|UNK'
-DEFAULT_GAZ_LABEL = 'O'
 RANDOM_SEED = 1
 ZERO_INITIALIZER_VALUE = 0
+INFERENCE_KEEP_PROBABILITY = 1.0
+NUMPY_RUNTIME = 'numpy'
+NUMPY_PARITY_TOLERANCE = 1e-4
+NUMPY_PARITY_BATCH_SIZE = 8
 
 logger = logging.getLogger(__name__)
 
 
-class LstmModel(Tagger):
+class LstmModel(BaseLstmModel):
     """This class encapsulates the bi-directional LSTM model and provides
     the correct interface for use by the tagger model"""
 
@@ -43,86 +42,6 @@ class LstmModel(Tagger):
         self._fit(examples_arr, labels_arr)
         return self
 
-    def predict(self, X, dynamic_resource=None):
-        encoded_examples_arr = np.asarray(X, dtype='float32')
-        tags_by_example_arr = self._predict(encoded_examples_arr)
-
-        resized_predicted_tags = []
-        for query, seq_len in zip(tags_by_example_arr, self.sequence_lengths):
-            resized_predicted_tags.append(query[:seq_len])
-
-        return resized_predicted_tags
-
-    def set_params(self, **parameters):
-        """
-        Initialize params for the LSTM. The keys in the parameters dictionary
-        are as follows:
-
-        Args:
-            parameters (dict): The keys in the parameters dictionary are as follows:
-
-            number_of_epochs: The number of epochs to run (int)
-
-            batch_size: The batch size for mini-batch training (int)
-
-            token_lstm_hidden_state_dimension: The hidden state
-                dimension of the LSTM cell (int)
-
-            learning_rate: The learning rate of the optimizer (int)
-
-            optimizer: The optimizer used to train the network
-                is the number of entities in the dataset (str)
-
-            display_epoch: The number of epochs after which the
-                network displays common stats like accuracy (int)
-
-            padding_length: The length of each query, which is
-                fixed, so some queries will be cut short in length
-                representing the word embedding, the row index
-                is the word's index (int)
-
-            token_embedding_dimension: The embedding dimension of the word (int)
-
-            token_pretrained_embedding_filepath: The pretrained embedding file-path (str)
-
-            dense_keep_prob: The dropout rate of the dense layers (float)
-
-            lstm_input_keep_prob: The dropout rate of the inputs to the LSTM cell (float)
-
-            lstm_output_keep_prob: The dropout rate of the outputs of the LSTM cell (float)
-
-            gaz_encoding_dimension: The gazetteer encoding dimension (int)
-        """
-        self.number_of_epochs = parameters.get('number_of_epochs', 20)
-        self.batch_size = parameters.get('batch_size', 20)
-        self.token_lstm_hidden_state_dimension = \
-            parameters.get('token_lstm_hidden_state_dimension', 300)
-
-        self.learning_rate = parameters.get('learning_rate', 0.005)
-        self.optimizer_tf = parameters.get('optimizer', 'adam')
-        self.padding_length = parameters.get('padding_length', 20)
-        self.display_epoch = parameters.get('display_epoch', 20)
-
-        self.token_embedding_dimension = parameters.get('token_embedding_dimension', 300)
-        self.token_pretrained_embedding_filepath = \
-            parameters.get('token_pretrained_embedding_filepath')
-
-        self.dense_keep_probability = parameters.get('dense_keep_prob', 0.5)
-        self.lstm_input_keep_prob = parameters.get('lstm_input_keep_prob', 0.5)
-        self.lstm_output_keep_prob = parameters.get('lstm_output_keep_prob', 0.5)
-        self.gaz_encoding_dimension = parameters.get('gaz_encoding_dimension', 100)
-        self.use_crf_layer = parameters.get('use_crf_layer', True)
-
-        self.use_char_embeddings = parameters.get('use_character_embeddings', False)
-        self.char_window_sizes = parameters.get('char_window_sizes', [5])
-        self.max_char_per_word = parameters.get('maximum_characters_per_word', 20)
-        self.character_embedding_dimension = parameters.get('character_embedding_dimension', 10)
-        self.word_level_character_embedding_size = \
-            parameters.get('word_level_character_embedding_size', 40)
-
-    def get_params(self, deep=True):
-        return self.__dict__
-
     def construct_tf_variables(self):
         """
         Constructs the variables and operations in the TensorFlow session graph
@@ -134,21 +53,23 @@ class LstmModel(Tagger):
             self.lstm_output_keep_prob_tf = \
                 tf.placeholder(tf.float32, name='lstm_output_keep_prob_tf')
 
+            # The time dimension is left unspecified so that inference batches only
+            # need to be padded up to the longest query in their length bucket
             self.query_input_tf = tf.placeholder(tf.float32,
                                                  [None,
-                                                  self.padding_length,
+                                                  None,
                                                   self.token_embedding_dimension],
                                                  name='query_input_tf')
 
             self.gaz_input_tf = tf.placeholder(tf.float32,
                                                [None,
-                                                self.padding_length,
+                                                None,
                                                 self.gaz_dimension],
                                                name='gaz_input_tf')
 
             self.label_tf = tf.placeholder(tf.int32,
                                            [None,
-                                            int(self.padding_length),
+                                            None,
                                             self.output_dimension],
                                            name='label_tf')
 
@@ -161,7 +82,7 @@ class LstmModel(Tagger):
             if self.use_char_embeddings:
                 self.char_input_tf = tf.placeholder(tf.float32,
                                                     [None,
-                                                     self.padding_length,
+                                                     None,
                                                      self.max_char_per_word,
                                                      self.character_embedding_dimension],
                                                     name='char_input_tf')
@@ -177,85 +98,21 @@ class LstmModel(Tagger):
 
             self.saver = tf.train.Saver()
 
-    def extract_features(self, examples, config, resources, y=None, fit=True):
-        """Transforms a list of examples into features that are then used by the
-        deep learning model.
-
-        Args:
-            examples (list of mindmeld.core.Query): a list of queries
-            config (ModelConfig): The ModelConfig which may contain information used for feature
-                                  extraction
-            resources (dict): Resources which may be used for this model's feature extraction
-            y (list): A list of label sequences
-
-        Returns:
-            (sequence_embeddings, encoded_labels, groups): features for the LSTM network
-        """
-        if y:
-            # Train time
-            self.resources = resources
-
-            padded_y = self._pad_labels(y, DEFAULT_LABEL)
-            y_flat = [item for sublist in padded_y for item in sublist]
-            encoded_labels_flat = self.label_encoder.fit_transform(y_flat)
-            encoded_labels = []
-
-            start_index = 0
-            for label_sequence in padded_y:
-                encoded_labels.append(
-                    encoded_labels_flat[start_index: start_index + len(label_sequence)])
-                start_index += len(label_sequence)
-
-            gaz_entities = [k for k in self.resources.get('gazetteers', {}).keys()]
-            gaz_entities.append(DEFAULT_GAZ_LABEL)
-            self.gaz_encoder.fit(gaz_entities)
-
-            # The gaz dimension are the sum total of the gazetteer entities and
-            # the 'other' gaz entity, which is the entity for all non-gazetteer tokens
-            self.gaz_dimension = len(gaz_entities)
-            self.output_dimension = len(self.label_encoder.classes_)
-        else:
-            # Predict time
-            encoded_labels = None
-
-        # Extract features and classes
-        x_sequence_embeddings_arr, self.gaz_features_arr, self.char_features_arr = \
-            self._get_features(examples)
-
-        self.sequence_lengths = self._extract_seq_length(examples)
-
-        # There are no groups in this model
-        groups = None
-        return x_sequence_embeddings_arr, encoded_labels, groups
-
     def setup_model(self, config):
-        self.set_params(**config.params)
-        self.label_encoder = LabelBinarizer()
-        self.gaz_encoder = LabelBinarizer()
-
+        super().setup_model(config)
         self.graph = tf.Graph()
         self.saver = None
 
-        self.example_type = config.example_type
-        self.features = config.features
-
-        self.query_encoder = WordSequenceEmbedding(
-            self.padding_length,
-            self.token_embedding_dimension,
-            self.token_pretrained_embedding_filepath)
-
-        if self.use_char_embeddings:
-            self.char_encoder = CharacterSequenceEmbedding(
-                self.padding_length,
-                self.character_embedding_dimension,
-                self.max_char_per_word)
+        model_settings = config.model_settings or {}
+        self.numpy_export = model_settings.get('lstm_runtime') == NUMPY_RUNTIME
 
     def construct_feed_dictionary(self,
                                   batch_examples,
                                   batch_char,
                                   batch_gaz,
                                   batch_seq_len,
-                                  batch_labels=list()):
+                                  batch_labels=list(),
+                                  inference=False):
         """Constructs the feed dictionary that is used to feed data into the tensors
 
         Args:
@@ -264,18 +121,30 @@ class LstmModel(Tagger):
             batch_gaz (ndarray): A batch of gazetteer features
             batch_seq_len (ndarray): A batch of sequence length of each query
             batch_labels (ndarray): A batch of labels
+            inference (bool): Whether the feed is used for inference, in which case no
+                nodes are dropped out
 
         Returns:
             The feed dictionary
         """
+        if inference:
+            dense_keep_probability = INFERENCE_KEEP_PROBABILITY
+            lstm_input_keep_prob = INFERENCE_KEEP_PROBABILITY
+            lstm_output_keep_prob = INFERENCE_KEEP_PROBABILITY
+        else:
+            dense_keep_probability = self.dense_keep_probability
+            lstm_input_keep_prob = self.lstm_input_keep_prob
+            lstm_output_keep_prob = self.lstm_output_keep_prob
+
         return_dict = {
             self.query_input_tf: batch_examples,
             self.batch_sequence_lengths_tf: batch_seq_len,
             self.gaz_input_tf: batch_gaz,
-            self.dense_keep_prob_tf: self.dense_keep_probability,
-            self.lstm_input_keep_prob_tf: self.lstm_input_keep_prob,
-            self.lstm_output_keep_prob_tf: self.lstm_output_keep_prob,
-            self.batch_sequence_mask_tf: self._generate_boolean_mask(batch_seq_len)
+            self.dense_keep_prob_tf: dense_keep_probability,
+            self.lstm_input_keep_prob_tf: lstm_input_keep_prob,
+            self.lstm_output_keep_prob_tf: lstm_output_keep_prob,
+            self.batch_sequence_mask_tf: self._generate_boolean_mask(
+                batch_seq_len, np.shape(batch_examples)[1])
         }
 
         if len(batch_labels) > 0:
@@ -333,8 +202,9 @@ class LstmModel(Tagger):
         Returns:
             (Tensor): Convolved output tensor
         """
+        sequence_length_dim = tf.shape(input_tensor)[1]
         convolution_reshaped_char_embedding = tf.reshape(input_tensor,
-                                                         [-1, self.padding_length,
+                                                         [-1, sequence_length_dim,
                                                           self.max_char_per_word,
                                                           self.character_embedding_dimension, 1])
 
@@ -362,22 +232,13 @@ class LstmModel(Tagger):
         # the num_filters dimension comes after the query_padding_length, so the last index
         # 4 is brought after the index 1.
         max_pool = tf.transpose(max_pool, [0, 1, 4, 2, 3])
-        max_pool = tf.reshape(max_pool, [batch_size, self.padding_length,
+        max_pool = tf.reshape(max_pool, [batch_size, sequence_length_dim,
                                          self.word_level_character_embedding_size])
 
+        # The bias is broadcast across the batch and sequence dimensions
         char_convolution_bias = tf.Variable(
             tf.random_normal([self.word_level_character_embedding_size, ]))
 
-        char_convolution_bias = tf.tile(char_convolution_bias, [self.padding_length])
-        char_convolution_bias = tf.reshape(char_convolution_bias,
-                                           [self.padding_length,
-                                            self.word_level_character_embedding_size])
-
-        char_convolution_bias = tf.tile(char_convolution_bias, [batch_size, 1])
-        char_convolution_bias = tf.reshape(char_convolution_bias,
-                                           [batch_size, self.padding_length,
-                                            self.word_level_character_embedding_size])
-
         word_level_char_embedding = tf.nn.relu(max_pool + char_convolution_bias)
         return word_level_char_embedding
 
@@ -425,7 +286,7 @@ class LstmModel(Tagger):
             int: The number of queries where all the tags are correct
         """
         reshaped_output_arr = np.reshape(
-            output_arr, [-1, int(self.padding_length), self.output_dimension])
+            output_arr, [-1, np.shape(label_arr)[1], self.output_dimension])
         reshaped_output_arr = np.argmax(reshaped_output_arr, 2)
         reshaped_labels_arr = np.argmax(label_arr, 2)
 
@@ -439,39 +300,22 @@ class LstmModel(Tagger):
 
         return score
 
-    def _pad_labels(self, list_of_sequences, default_token):
-        """
-        Pads the label sequence
-
-        Args:
-            list_of_sequences (list): A list of label sequences
-            default_token (str): The default label token for padding purposes
-
-        Returns:
-            list: padded output
-        """
-        padded_output = []
-        for sequence in list_of_sequences:
-            padded_seq = [default_token] * self.padding_length
-            for idx, token in enumerate(sequence):
-                if idx < self.padding_length:
-                    padded_seq[idx] = sequence[idx]
-            padded_output.append(padded_seq)
-        return padded_output
-
-    def _generate_boolean_mask(self, seq_lengths):
+    def _generate_boolean_mask(self, seq_lengths, padding_length=None):
         """
         Generates boolean masks for each query in a query list
 
         Args:
             seq_lengths (list): A list of sequence lengths
+            padding_length (int, optional): The length the queries are padded to, defaults to
+                the padding length of the model
 
         Return:
             list: A list of boolean masking values
         """
-        mask = [False] * (len(seq_lengths) * self.padding_length)
+        padding_length = padding_length or self.padding_length
+        mask = [False] * (len(seq_lengths) * padding_length)
         for idx, seq_len in enumerate(seq_lengths):
-            start_index = idx * self.padding_length
+            start_index = idx * padding_length
             for i in range(start_index, start_index + seq_len):
                 mask[i] = True
         return mask
@@ -586,121 +430,18 @@ class LstmModel(Tagger):
     def _get_model_constructor(self):
         return self
 
-    def _extract_seq_length(self, examples):
-        """Extract sequence lengths from the input examples
-        Args:
-            examples (list of Query objects): List of input queries
-
-        Returns:
-            (list): List of seq lengths for each query
+    def _inference_padding_length(self, bucket_length):
+        """Returns the length inference inputs are padded to. Graphs trained before the time
+        dimension became dynamic only accept inputs padded to the full padding length.
         """
-        seq_lengths = []
-        for example in examples:
-            if len(example.normalized_tokens) > self.padding_length:
-                seq_lengths.append(self.padding_length)
-            else:
-                seq_lengths.append(len(example.normalized_tokens))
-
-        return seq_lengths
-
-    def _get_features(self, examples):
-        """Extracts the word and gazetteer embeddings from the input examples
-
-        Args:
-            examples (list of mindmeld.core.Query): a list of queries
-
-        Returns:
-            (tuple): Word embeddings and Gazetteer one-hot embeddings
-        """
-        x_feats_array = []
-        gaz_feats_array = []
-        char_feats_array = []
-        for idx, example in enumerate(examples):
-            x_feat, gaz_feat, char_feat = self._extract_features(example)
-            x_feats_array.append(x_feat)
-            gaz_feats_array.append(gaz_feat)
-            char_feats_array.append(char_feat)
-
-        # save all the embeddings used for model saving purposes
-        self.query_encoder.save_embeddings()
-        if self.use_char_embeddings:
-            self.char_encoder.save_embeddings()
-
-        x_feats_array = np.asarray(x_feats_array)
-        gaz_feats_array = np.asarray(gaz_feats_array)
-        char_feats_array = np.asarray(char_feats_array) if self.use_char_embeddings else []
-
-        return x_feats_array, gaz_feats_array, char_feats_array
-
-    def _gaz_transform(self, list_of_tokens_to_transform):
-        """This function is used to handle special logic around SKLearn's LabelBinarizer
-        class which behaves in a non-standard way for 2 classes. In a 2 class system,
-        it encodes the classes as [0] and [1]. However, in a 3 class system, it encodes
-        the classes as [0,0,1], [0,1,0], [1,0,0] and sustains this behavior for num_class > 2.
-
-        We want to encode 2 class systems as [0,1] and [1,0]. This function does that.
+        static_length = self.query_input_tf.get_shape()[1].value
+        return static_length or bucket_length
 
-        Args:
-            list_of_tokens_to_transform (list): A sequence of class labels
-
-        Returns:
-            (array): corrected encoding from the binarizer
-        """
-        output = self.gaz_encoder.transform(list_of_tokens_to_transform)
-        if len(self.gaz_encoder.classes_) == 2:
-            output = np.hstack((1 - output, output))
-        return output
-
-    def _extract_features(self, example):
-        """Extracts feature dicts for each token in an example.
-
-        Args:
-            example (mindmeld.core.Query): an query
-
-        Returns:
-            (list of dict): features
-        """
-        default_gaz_one_hot = self._gaz_transform([DEFAULT_GAZ_LABEL]).tolist()[0]
-        extracted_gaz_tokens = [default_gaz_one_hot] * self.padding_length
-        extracted_sequence_features = extract_sequence_features(
-            example, self.example_type, self.features, self.resources)
-
-        for index, extracted_gaz in enumerate(extracted_sequence_features):
-            if index >= self.padding_length:
-                break
-
-            if extracted_gaz == {}:
-                continue
-
-            combined_gaz_features = set()
-            for key in extracted_gaz.keys():
-                regex_match = re.match(GAZ_PATTERN_MATCH, key)
-                if regex_match:
-                    # Examples of gaz features here are:
-                    # in-gaz|type:city|pos:start|p_fe,
-                    # in-gaz|type:city|pos:end|pct-char-len
-                    # There were many gaz features of the same type that had
-                    # bot start and end position tags for a given token.
-                    # Due to this, we did not implement functionality to
-                    # extract the positional information due to the noise
-                    # associated with it.
-                    combined_gaz_features.add(
-                        regex_match.group(REGEX_TYPE_POSITIONAL_INDEX))
-
-            if len(combined_gaz_features) != 0:
-                total_encoding = np.zeros(self.gaz_dimension, dtype=np.int)
-                for encoding in self._gaz_transform(list(combined_gaz_features)):
-                    total_encoding = np.add(total_encoding, encoding)
-                extracted_gaz_tokens[index] = total_encoding.tolist()
-
-        padded_query = self.query_encoder.encode_sequence_of_tokens(example.normalized_tokens)
-
-        if self.use_char_embeddings:
-            padded_char = self.char_encoder.encode_sequence_of_tokens(example.normalized_tokens)
-        else:
-            padded_char = None
-
-        return padded_query, extracted_gaz_tokens, padded_char
+    def _run_bucket(self, batch_examples, batch_char, batch_gaz, batch_seq_len):
+        return self.session.run(
+            self.lstm_output_softmax_tf,
+            feed_dict=self.construct_feed_dictionary(
+                batch_examples, batch_char, batch_gaz, batch_seq_len, inference=True))
 
     def _fit(self, X, y):
         """Trains a classifier without cross-validation. It iterates through
@@ -771,74 +512,6 @@ class LstmModel(Tagger):
                                          batch_labels))
         return self
 
-    def _predict(self, X):
-        """Predicts tags for query sequence
-
-        Args:
-            X (list of list of list of str): a list of input representations
-
-        Returns:
-            (list): A list of decoded labelled predicted by the model
-        """
-        seq_len_arr = np.array(self.sequence_lengths)
-
-        # During predict time, we make sure no nodes are dropped out
-        self.dense_keep_probability = 1.0
-        self.lstm_input_keep_prob = 1.0
-        self.lstm_output_keep_prob = 1.0
-
-        output = self.session.run(
-            [self.lstm_output_softmax_tf],
-            feed_dict=self.construct_feed_dictionary(
-                X, self.char_features_arr, self.gaz_features_arr, seq_len_arr))
-
-        output = np.reshape(output, [-1, int(self.padding_length), self.output_dimension])
-        output = np.argmax(output, 2)
-
-        decoded_queries = []
-        for idx, encoded_predict in enumerate(output):
-            decoded_query = []
-            for tag in encoded_predict[:self.sequence_lengths[idx]]:
-                decoded_query.append(self.label_encoder.classes_[tag])
-            decoded_queries.append(decoded_query)
-
-        return decoded_queries
-
-    def _predict_proba(self, X):
-        """Predict tags for query sequence with their confidence scores
-
-        Args:
-            X (list of list of list of str): a list of input representations
-
-        Returns:
-            (list): A list of decoded labelled predicted by the model with confidence scores
-        """
-
-        seq_len_arr = np.array(self.sequence_lengths)
-
-        # During predict time, we make sure no nodes are dropped out
-        self.dense_keep_probability = 1.0
-        self.lstm_input_keep_prob = 1.0
-        self.lstm_output_keep_prob = 1.0
-
-        output = self.session.run(
-            [self.lstm_output_softmax_tf],
-            feed_dict=self.construct_feed_dictionary(
-                X, self.char_features_arr, self.gaz_features_arr, seq_len_arr))
-
-        output = np.reshape(output, [-1, int(self.padding_length), self.output_dimension])
-        class_output = np.argmax(output, 2)
-
-        decoded_queries = []
-        for idx, encoded_predict in enumerate(class_output):
-            decoded_query = []
-            for token_idx, tag in enumerate(encoded_predict[:self.sequence_lengths[idx]]):
-                decoded_query.append([self.label_encoder.classes_[tag],
-                                      output[idx][token_idx][tag]])
-            decoded_queries.append(decoded_query)
-
-        return decoded_queries
-
     def dump(self, path, config):
         """
         Saves the Tensorflow model
@@ -866,14 +539,106 @@ class LstmModel(Tagger):
             'resources': self.resources,
             'gaz_dimension': self.gaz_dimension,
             'output_dimension': self.output_dimension,
-            'gaz_features': self.gaz_features_arr,
-            'sequence_lengths': self.sequence_lengths,
             'gaz_encoder': self.gaz_encoder,
             'label_encoder': self.label_encoder
         }
 
         joblib.dump(variables_to_dump, os.path.join(path, '.feature_extraction_vars'))
 
+        if self.numpy_export:
+            self.export_numpy(path)
+
+    def _get_numpy_weights(self):
+        """Extracts the trained weights of the network into a dictionary of numpy arrays
+        in the format expected by the numpy forward pass
+
+        Returns:
+            (dict): The weights of the network
+        """
+        with self.graph.as_default():
+            variables = tf.trainable_variables()
+        values = self.session.run(variables)
+        named_values = {variable.name: value for variable, value in zip(variables, values)}
+
+        weights = {
+            'gaz_weights': named_values['fully_connected/weights:0'],
+            'gaz_biases': named_values['fully_connected/biases:0'],
+            'output_weights': named_values['output_weights_tf:0'],
+            'output_bias': named_values['output_bias_tf:0'],
+        }
+
+        for direction, scope, state_name in [('forward', '/fw/', 'lstm_cell_forward_tf'),
+                                             ('backward', '/bw/', 'lstm_cell_backward_tf')]:
+            weights[direction + '_initial_cell_state'] = \
+                named_values['initial_cell_state_{}:0'.format(state_name)]
+            weights[direction + '_initial_output_state'] = \
+                named_values['initial_output_state_{}:0'.format(state_name)]
+
+            # The coupled input forget gate cell only has a kernel and a bias since the model
+            # does not use peepholes or projections
+            for name, value in named_values.items():
+                if scope in name:
+                    weights[direction + ('_kernel' if value.ndim == 2 else '_bias')] = value
+
+        # The character convolution filters and biases are unnamed variables, created in pairs
+        # for each window size
+        char_variables = [named_values[variable.name] for variable in variables
+                          if variable.name.startswith('Variable')]
+        weights['num_char_windows'] = np.array(len(char_variables) // 2)
+        for idx in range(len(char_variables) // 2):
+            weights['char_filter_{}'.format(idx)] = char_variables[2 * idx]
+            weights['char_bias_{}'.format(idx)] = char_variables[2 * idx + 1]
+
+        return weights
+
+    def _check_numpy_parity(self, weights):
+        """Checks that the numpy forward pass produces the same output as the TensorFlow graph
+        on a random batch of inputs
+
+        Args:
+            weights (dict): The weights of the network
+
+        Returns:
+            (float): The maximum absolute difference between the outputs
+        """
+        random_state = np.random.RandomState(RANDOM_SEED)
+        seq_len = random_state.randint(1, self.padding_length + 1, NUMPY_PARITY_BATCH_SIZE)
+        examples = random_state.uniform(
+            -1, 1, (NUMPY_PARITY_BATCH_SIZE, self.padding_length, self.token_embedding_dimension))
+        gaz = random_state.randint(
+            0, 2, (NUMPY_PARITY_BATCH_SIZE, self.padding_length, self.gaz_dimension))
+        char = random_state.uniform(
+            -1, 1, (NUMPY_PARITY_BATCH_SIZE, self.padding_length, self.max_char_per_word,
+                    self.character_embedding_dimension)) if self.use_char_embeddings else []
+
+        tf_output = self._run_bucket(examples, char, gaz, seq_len)
+        numpy_output = lstm_forward(weights, examples, char, gaz, seq_len)
+
+        return max(np.max(np.abs(tf_output[idx][:length] - numpy_output[idx][:length]))
+                   for idx, length in enumerate(seq_len))
+
+    def export_numpy(self, path):
+        """
+        Exports the weights of the trained network to a compressed numpy file, which can be
+        served by the numpy LSTM runtime without TensorFlow.
+
+        Args:
+            path (str): the folder path for the entity model files
+
+        Raises:
+            MindMeldError: If the numpy forward pass does not match the TensorFlow graph, in \
+                which case the model can only be served by the TensorFlow runtime
+        """
+        weights = self._get_numpy_weights()
+        difference = self._check_numpy_parity(weights)
+        if difference > NUMPY_PARITY_TOLERANCE:
+            raise MindMeldError(
+                "The outputs of the numpy LSTM runtime differ from the TensorFlow model by {} "
+                "(the tolerance is {}). Remove the 'lstm_runtime' model setting to serve the "
+                "model with TensorFlow.".format(difference, NUMPY_PARITY_TOLERANCE))
+
+        np.savez_compressed(os.path.join(path, NUMPY_EXPORT_FILE_NAME), **weights)
+
     def load(self, path):
         """
         Loads the Tensorflow model
@@ -930,7 +695,5 @@ class LstmModel(Tagger):
         self.resources = variables_to_load['resources']
         self.gaz_dimension = variables_to_load['gaz_dimension']
         self.output_dimension = variables_to_load['output_dimension']
-        self.gaz_features = variables_to_load['gaz_features']
-        self.sequence_lengths = variables_to_load['sequence_lengths']
         self.gaz_encoder = variables_to_load['gaz_encoder']
         self.label_encoder = variables_to_load['label_encoder']
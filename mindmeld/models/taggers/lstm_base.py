@@ -0,0 +1,571 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the feature extraction and decoding logic shared by the LSTM entity
+recognizer runtimes. It does not depend on TensorFlow.
+"""
+import logging
+import math
+import queue
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+import numpy as np
+from sklearn.preprocessing import LabelBinarizer
+
+from .taggers import Tagger, extract_sequence_features
+from .embeddings import WordSequenceEmbedding, CharacterSequenceEmbedding
+
+GAZ_PATTERN_MATCH = r'in-gaz\|type:(\w+)\|pos:(\w+)\|'
+REGEX_TYPE_POSITIONAL_INDEX = 1
+DEFAULT_LABEL = 'B|UNK'
+DEFAULT_GAZ_LABEL = 'O'
+
+logger = logging.getLogger(__name__)
+
+
+class _MicroBatcher:
+    """Coalesces inference requests submitted from concurrent threads into a single
+    batch which is run by a background worker thread.
+
+    Requests are collected until either ``max_batch_size`` requests are queued or
+    ``max_wait_ms`` milliseconds have passed since the first request of the batch arrived.
+    """
+
+    def __init__(self, run_batch, max_wait_ms, max_batch_size):
+        """Initializes the micro-batcher
+
+        Args:
+            run_batch (function): A function which takes a list of feature tuples and returns
+                a list of results, one for each feature tuple
+            max_wait_ms (float): The maximum time to wait for a batch to fill up
+            max_batch_size (int): The maximum number of requests in a batch
+        """
+        self._run_batch = run_batch
+        self._max_wait = max_wait_ms / 1000.0
+        self._max_batch_size = max(1, int(max_batch_size))
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._process_queue, daemon=True,
+                                        name='lstm-micro-batcher')
+        self._worker.start()
+
+    def submit(self, features):
+        """Queues a feature tuple for inference
+
+        Args:
+            features (tuple): The features of one request
+
+        Returns:
+            (Future): A future which resolves to the result for the request
+        """
+        future = Future()
+        self._queue.put((features, future))
+        return future
+
+    def _process_queue(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self._max_wait
+            while len(batch) < self._max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            features, futures = zip(*batch)
+            try:
+                results = self._run_batch(list(features))
+            except Exception as exc:  # pylint: disable=broad-except
+                for future in futures:
+                    future.set_exception(exc)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+
+class BaseLstmModel(Tagger):
+    """This class contains the feature extraction and tag decoding of the bi-directional
+    LSTM model. Subclasses implement training and the forward pass of the network."""
+
+    def __init__(self, **parameters):
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+        super().__init__(**parameters)
+
+    def __getstate__(self):
+        attributes = self.__dict__.copy()
+        attributes.pop('_batcher', None)
+        attributes.pop('_batcher_lock', None)
+        return attributes
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+
+    def predict(self, X, dynamic_resource=None):
+        """Predicts the tags of the examples
+
+        Args:
+            X (tuple): The inference features returned by extract_features, which are the word
+                embeddings, gazetteer encodings, character embeddings and sequence lengths
+            dynamic_resource (dict, optional): Not used
+
+        Returns:
+            (list): A list of decoded labels, one list for each example
+        """
+        return self._predict(X)
+
+    def set_params(self, **parameters):
+        """
+        Initialize params for the LSTM. The keys in the parameters dictionary
+        are as follows:
+
+        Args:
+            parameters (dict): The keys in the parameters dictionary are as follows:
+
+            number_of_epochs: The number of epochs to run (int)
+
+            batch_size: The batch size for mini-batch training (int)
+
+            token_lstm_hidden_state_dimension: The hidden state
+                dimension of the LSTM cell (int)
+
+            learning_rate: The learning rate of the optimizer (int)
+
+            optimizer: The optimizer used to train the network
+                is the number of entities in the dataset (str)
+
+            display_epoch: The number of epochs after which the
+                network displays common stats like accuracy (int)
+
+            padding_length: The length of each query, which is
+                fixed, so some queries will be cut short in length
+                representing the word embedding, the row index
+                is the word's index (int)
+
+            token_embedding_dimension: The embedding dimension of the word (int)
+
+            token_pretrained_embedding_filepath: The pretrained embedding file-path (str)
+
+            dense_keep_prob: The dropout rate of the dense layers (float)
+
+            lstm_input_keep_prob: The dropout rate of the inputs to the LSTM cell (float)
+
+            lstm_output_keep_prob: The dropout rate of the outputs of the LSTM cell (float)
+
+            gaz_encoding_dimension: The gazetteer encoding dimension (int)
+
+            inference_bucket_width: The granularity of the sequence length buckets used at
+                inference time. Queries are only padded up to the length of their bucket (int)
+
+            inference_batch_wait_ms: The time in milliseconds to wait for concurrent
+                predictions to be coalesced into a single batch. Micro-batching is disabled
+                when this is 0 (float)
+
+            inference_max_batch_size: The maximum number of predictions coalesced into a
+                single micro-batch (int)
+        """
+        self.number_of_epochs = parameters.get('number_of_epochs', 20)
+        self.batch_size = parameters.get('batch_size', 20)
+        self.token_lstm_hidden_state_dimension = \
+            parameters.get('token_lstm_hidden_state_dimension', 300)
+
+        self.learning_rate = parameters.get('learning_rate', 0.005)
+        self.optimizer_tf = parameters.get('optimizer', 'adam')
+        self.padding_length = parameters.get('padding_length', 20)
+        self.display_epoch = parameters.get('display_epoch', 20)
+
+        self.token_embedding_dimension = parameters.get('token_embedding_dimension', 300)
+        self.token_pretrained_embedding_filepath = \
+            parameters.get('token_pretrained_embedding_filepath')
+
+        self.dense_keep_probability = parameters.get('dense_keep_prob', 0.5)
+        self.lstm_input_keep_prob = parameters.get('lstm_input_keep_prob', 0.5)
+        self.lstm_output_keep_prob = parameters.get('lstm_output_keep_prob', 0.5)
+        self.gaz_encoding_dimension = parameters.get('gaz_encoding_dimension', 100)
+        self.use_crf_layer = parameters.get('use_crf_layer', True)
+
+        self.use_char_embeddings = parameters.get('use_character_embeddings', False)
+        self.char_window_sizes = parameters.get('char_window_sizes', [5])
+        self.max_char_per_word = parameters.get('maximum_characters_per_word', 20)
+        self.character_embedding_dimension = parameters.get('character_embedding_dimension', 10)
+        self.word_level_character_embedding_size = \
+            parameters.get('word_level_character_embedding_size', 40)
+
+        self.inference_bucket_width = parameters.get('inference_bucket_width', 5)
+        self.inference_batch_wait_ms = parameters.get('inference_batch_wait_ms', 0)
+        self.inference_max_batch_size = parameters.get('inference_max_batch_size', 64)
+
+    def get_params(self, deep=True):
+        return self.__dict__
+
+    def extract_features(self, examples, config, resources, y=None, fit=True):
+        """Transforms a list of examples into features that are then used by the
+        deep learning model.
+
+        Args:
+            examples (list of mindmeld.core.Query): a list of queries
+            config (ModelConfig): The ModelConfig which may contain information used for feature
+                                  extraction
+            resources (dict): Resources which may be used for this model's feature extraction
+            y (list): A list of label sequences
+
+        Returns:
+            (sequence_embeddings, encoded_labels, groups): features for the LSTM network. At
+                predict time, sequence_embeddings is a tuple of all the inference features
+                and no state is stored on the model
+        """
+        if not y:
+            # Predict time
+            return self._get_inference_features(examples), None, None
+
+        # Train time
+        self.resources = resources
+
+        padded_y = self._pad_labels(y, DEFAULT_LABEL)
+        y_flat = [item for sublist in padded_y for item in sublist]
+        encoded_labels_flat = self.label_encoder.fit_transform(y_flat)
+        encoded_labels = []
+
+        start_index = 0
+        for label_sequence in padded_y:
+            encoded_labels.append(
+                encoded_labels_flat[start_index: start_index + len(label_sequence)])
+            start_index += len(label_sequence)
+
+        gaz_entities = [k for k in self.resources.get('gazetteers', {}).keys()]
+        gaz_entities.append(DEFAULT_GAZ_LABEL)
+        self.gaz_encoder.fit(gaz_entities)
+
+        # The gaz dimension are the sum total of the gazetteer entities and
+        # the 'other' gaz entity, which is the entity for all non-gazetteer tokens
+        self.gaz_dimension = len(gaz_entities)
+        self.output_dimension = len(self.label_encoder.classes_)
+
+        # Extract features and classes
+        x_sequence_embeddings_arr, self.gaz_features_arr, self.char_features_arr = \
+            self._get_features(examples)
+
+        # save all the embeddings used for model saving purposes
+        self.query_encoder.save_embeddings()
+        if self.use_char_embeddings:
+            self.char_encoder.save_embeddings()
+
+        self.sequence_lengths = self._extract_seq_length(examples)
+
+        # There are no groups in this model
+        groups = None
+        return x_sequence_embeddings_arr, encoded_labels, groups
+
+    def setup_model(self, config):
+        self.set_params(**config.params)
+        self.label_encoder = LabelBinarizer()
+        self.gaz_encoder = LabelBinarizer()
+
+        self.example_type = config.example_type
+        self.features = config.features
+
+        self.query_encoder = WordSequenceEmbedding(
+            self.padding_length,
+            self.token_embedding_dimension,
+            self.token_pretrained_embedding_filepath)
+
+        if self.use_char_embeddings:
+            self.char_encoder = CharacterSequenceEmbedding(
+                self.padding_length,
+                self.character_embedding_dimension,
+                self.max_char_per_word)
+
+    def _pad_labels(self, list_of_sequences, default_token):
+        """
+        Pads the label sequence
+
+        Args:
+            list_of_sequences (list): A list of label sequences
+            default_token (str): The default label token for padding purposes
+
+        Returns:
+            list: padded output
+        """
+        padded_output = []
+        for sequence in list_of_sequences:
+            padded_seq = [default_token] * self.padding_length
+            for idx, token in enumerate(sequence):
+                if idx < self.padding_length:
+                    padded_seq[idx] = sequence[idx]
+            padded_output.append(padded_seq)
+        return padded_output
+
+    def _extract_seq_length(self, examples):
+        """Extract sequence lengths from the input examples
+        Args:
+            examples (list of Query objects): List of input queries
+
+        Returns:
+            (list): List of seq lengths for each query
+        """
+        seq_lengths = []
+        for example in examples:
+            if len(example.normalized_tokens) > self.padding_length:
+                seq_lengths.append(self.padding_length)
+            else:
+                seq_lengths.append(len(example.normalized_tokens))
+
+        return seq_lengths
+
+    def _get_features(self, examples):
+        """Extracts the word and gazetteer embeddings from the input examples
+
+        Args:
+            examples (list of mindmeld.core.Query): a list of queries
+
+        Returns:
+            (tuple): Word embeddings and Gazetteer one-hot embeddings
+        """
+        gaz_feats_array = np.asarray([self._extract_features(example) for example in examples])
+
+        # The embeddings of all the examples are gathered in a single batch
+        token_sequences = [example.normalized_tokens for example in examples]
+        x_feats_array = self.query_encoder.encode_sequences_of_tokens(token_sequences)
+        char_feats_array = self.char_encoder.encode_sequences_of_tokens(token_sequences) \
+            if self.use_char_embeddings else []
+
+        return x_feats_array, gaz_feats_array, char_feats_array
+
+    def _gaz_transform(self, list_of_tokens_to_transform):
+        """This function is used to handle special logic around SKLearn's LabelBinarizer
+        class which behaves in a non-standard way for 2 classes. In a 2 class system,
+        it encodes the classes as [0] and [1]. However, in a 3 class system, it encodes
+        the classes as [0,0,1], [0,1,0], [1,0,0] and sustains this behavior for num_class > 2.
+
+        We want to encode 2 class systems as [0,1] and [1,0]. This function does that.
+
+        Args:
+            list_of_tokens_to_transform (list): A sequence of class labels
+
+        Returns:
+            (array): corrected encoding from the binarizer
+        """
+        output = self.gaz_encoder.transform(list_of_tokens_to_transform)
+        if len(self.gaz_encoder.classes_) == 2:
+            output = np.hstack((1 - output, output))
+        return output
+
+    def _extract_features(self, example):
+        """Extracts the gazetteer encoding of each token in an example.
+
+        Args:
+            example (mindmeld.core.Query): an query
+
+        Returns:
+            (list of list): gazetteer features
+        """
+        default_gaz_one_hot = self._gaz_transform([DEFAULT_GAZ_LABEL]).tolist()[0]
+        extracted_gaz_tokens = [default_gaz_one_hot] * self.padding_length
+        extracted_sequence_features = extract_sequence_features(
+            example, self.example_type, self.features, self.resources)
+
+        for index, extracted_gaz in enumerate(extracted_sequence_features):
+            if index >= self.padding_length:
+                break
+
+            if extracted_gaz == {}:
+                continue
+
+            combined_gaz_features = set()
+            for key in extracted_gaz.keys():
+                regex_match = re.match(GAZ_PATTERN_MATCH, key)
+                if regex_match:
+                    # Examples of gaz features here are:
+                    # in-gaz|type:city|pos:start|p_fe,
+                    # in-gaz|type:city|pos:end|pct-char-len
+                    # There were many gaz features of the same type that had
+                    # bot start and end position tags for a given token.
+                    # Due to this, we did not implement functionality to
+                    # extract the positional information due to the noise
+                    # associated with it.
+                    combined_gaz_features.add(
+                        regex_match.group(REGEX_TYPE_POSITIONAL_INDEX))
+
+            if len(combined_gaz_features) != 0:
+                total_encoding = np.zeros(self.gaz_dimension, dtype=np.int)
+                for encoding in self._gaz_transform(list(combined_gaz_features)):
+                    total_encoding = np.add(total_encoding, encoding)
+                extracted_gaz_tokens[index] = total_encoding.tolist()
+
+        return extracted_gaz_tokens
+
+    def _get_inference_features(self, examples):
+        """Extracts all the features needed to predict the tags of the input examples. Unlike
+        the training features, none of these are stored on the model, so concurrent predictions
+        do not interfere with each other.
+
+        Args:
+            examples (list of mindmeld.core.Query): a list of queries
+
+        Returns:
+            (tuple): Word embeddings, gazetteer one-hot embeddings, character embeddings and \
+                sequence lengths
+        """
+        x_feats_array, gaz_feats_array, char_feats_array = self._get_features(examples)
+        return x_feats_array, gaz_feats_array, char_feats_array, \
+            self._extract_seq_length(examples)
+
+    def _bucket_by_length(self, seq_lengths):
+        """Groups example indices into buckets of similar sequence lengths
+
+        Args:
+            seq_lengths (list): A list of sequence lengths
+
+        Returns:
+            (dict): A mapping from the bucket length to the indices of the examples in it
+        """
+        bucket_width = max(1, int(self.inference_bucket_width))
+        buckets = defaultdict(list)
+        for idx, seq_len in enumerate(seq_lengths):
+            bucket_length = int(math.ceil(max(seq_len, 1) / bucket_width)) * bucket_width
+            buckets[min(bucket_length, self.padding_length)].append(idx)
+        return buckets
+
+    def _inference_padding_length(self, bucket_length):
+        """Returns the length inference inputs of a bucket are padded to"""
+        return bucket_length
+
+    def _run_bucket(self, batch_examples, batch_char, batch_gaz, batch_seq_len):
+        """Runs the forward pass of the network over a batch of padded examples
+
+        Args:
+            batch_examples (ndarray): A batch of examples
+            batch_char (ndarray): A batch of character features
+            batch_gaz (ndarray): A batch of gazetteer features
+            batch_seq_len (ndarray): A batch of sequence length of each query
+
+        Returns:
+            (ndarray): The softmax output for each token of each example
+        """
+        raise NotImplementedError
+
+    def _run_inference(self, features):
+        """Runs the LSTM network over the examples, one forward pass per length bucket
+
+        Args:
+            features (tuple): The inference features of the examples
+
+        Returns:
+            (list of ndarray): The softmax output for each token of each example
+        """
+        x_feats_array, gaz_feats_array, char_feats_array, seq_lengths = features
+        seq_len_arr = np.array(seq_lengths)
+        outputs = [None] * len(seq_lengths)
+
+        for bucket_length, indices in self._bucket_by_length(seq_lengths).items():
+            padding_length = self._inference_padding_length(bucket_length)
+            indices = np.array(indices)
+            batch_char = char_feats_array[indices, :padding_length] \
+                if self.use_char_embeddings else []
+
+            output = self._run_bucket(x_feats_array[indices, :padding_length], batch_char,
+                                      gaz_feats_array[indices, :padding_length],
+                                      seq_len_arr[indices])
+
+            for output_idx, example_idx in enumerate(indices):
+                outputs[example_idx] = output[output_idx][:seq_lengths[example_idx]]
+
+        return outputs
+
+    def _run_batched_inference(self, list_of_features):
+        """Runs inference over features coalesced from several requests
+
+        Args:
+            list_of_features (list of tuple): The inference features of each request
+
+        Returns:
+            (list of list of ndarray): The softmax outputs for each request
+        """
+        word, gaz, char, seq_lengths = zip(*list_of_features)
+        combined_features = (np.concatenate(word),
+                             np.concatenate(gaz),
+                             np.concatenate(char) if self.use_char_embeddings else [],
+                             [seq_len for lengths in seq_lengths for seq_len in lengths])
+        outputs = self._run_inference(combined_features)
+
+        results = []
+        start_index = 0
+        for lengths in seq_lengths:
+            results.append(outputs[start_index:start_index + len(lengths)])
+            start_index += len(lengths)
+        return results
+
+    def _get_batcher(self):
+        """Returns the micro-batcher, creating it on first use"""
+        if not self._batcher:
+            with self._batcher_lock:
+                if not self._batcher:
+                    self._batcher = _MicroBatcher(self._run_batched_inference,
+                                                  self.inference_batch_wait_ms,
+                                                  self.inference_max_batch_size)
+        return self._batcher
+
+    def _infer(self, features):
+        """Returns the softmax outputs for the features, through the micro-batcher if it is
+        enabled
+        """
+        if len(features[3]) == 0:
+            return []
+        if self.inference_batch_wait_ms:
+            return self._get_batcher().submit(features).result()
+        return self._run_inference(features)
+
+    def _predict(self, X):
+        """Predicts tags for query sequence
+
+        Args:
+            X (tuple): The inference features returned by extract_features
+
+        Returns:
+            (list): A list of decoded labelled predicted by the model
+        """
+        decoded_queries = []
+        for output in self._infer(X):
+            decoded_queries.append(
+                [self.label_encoder.classes_[tag] for tag in np.argmax(output, 1)])
+
+        return decoded_queries
+
+    def _predict_proba(self, X):
+        """Predict tags for query sequence with their confidence scores
+
+        Args:
+            X (tuple): The inference features returned by extract_features
+
+        Returns:
+            (list): A list of decoded labelled predicted by the model with confidence scores
+        """
+        decoded_queries = []
+        for output in self._infer(X):
+            decoded_query = []
+            for token_idx, tag in enumerate(np.argmax(output, 1)):
+                decoded_query.append([self.label_encoder.classes_[tag],
+                                      output[token_idx][tag]])
+            decoded_queries.append(decoded_query)
+
+        return decoded_queries
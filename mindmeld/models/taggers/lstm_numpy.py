@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2015 Cisco Systems, Inc. and others.  All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#     http://www.apache.org/licenses/LICENSE-2.0
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains a pure numpy implementation of the forward pass of the bi-directional
+LSTM entity recognizer, which is used to serve LSTM models without TensorFlow.
+"""
+import logging
+import os
+
+import numpy as np
+from sklearn.externals import joblib
+
+from .lstm_base import BaseLstmModel
+from ...exceptions import MindMeldError
+
+logger = logging.getLogger(__name__)
+
+NUMPY_EXPORT_FILE_NAME = 'lstm_model.npz'
+FORGET_BIAS = 1.0
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _softmax(x):
+    exp = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return exp / np.sum(exp, axis=-1, keepdims=True)
+
+
+def _reverse_sequences(inputs, seq_lengths):
+    """Reverses each sequence in a batch up to its length, leaving the padding in place
+
+    Args:
+        inputs (ndarray): A batch of sequences of shape [batch, time, ...]
+        seq_lengths (ndarray): The sequence length of each example
+
+    Returns:
+        (ndarray): The reversed sequences
+    """
+    reversed_inputs = inputs.copy()
+    for idx, seq_len in enumerate(seq_lengths):
+        reversed_inputs[idx, :seq_len] = inputs[idx, :seq_len][::-1]
+    return reversed_inputs
+
+
+def _coupled_lstm(inputs, seq_lengths, kernel, bias, initial_cell_state,
+                  initial_output_state):
+    """Runs a coupled input and forget gate LSTM cell over a batch of sequences. Like
+    TensorFlow's dynamic RNN, the state is carried through and the outputs are zero past the
+    end of each sequence.
+
+    Args:
+        inputs (ndarray): The inputs of shape [batch, time, input dimension]
+        seq_lengths (ndarray): The sequence length of each example
+        kernel (ndarray): The cell weights of shape [input dimension + hidden, 3 * hidden]
+        bias (ndarray): The cell bias of shape [3 * hidden]
+        initial_cell_state (ndarray): The initial cell state of shape [1, hidden]
+        initial_output_state (ndarray): The initial output state of shape [1, hidden]
+
+    Returns:
+        (ndarray): The outputs of shape [batch, time, hidden]
+    """
+    batch_size, time_steps, _ = inputs.shape
+    hidden_dimension = initial_cell_state.shape[-1]
+
+    cell_state = np.tile(initial_cell_state, (batch_size, 1))
+    output_state = np.tile(initial_output_state, (batch_size, 1))
+    outputs = np.zeros((batch_size, time_steps, hidden_dimension), dtype=inputs.dtype)
+
+    for step in range(time_steps):
+        active = (step < seq_lengths)[:, np.newaxis]
+        if not active.any():
+            break
+
+        lstm_matrix = np.dot(np.concatenate([inputs[:, step], output_state], axis=1),
+                             kernel) + bias
+        new_input, forget_gate, output_gate = np.split(lstm_matrix, 3, axis=1)
+
+        forget_gate = _sigmoid(forget_gate + FORGET_BIAS)
+        new_cell_state = forget_gate * cell_state + (1 - forget_gate) * np.tanh(new_input)
+        new_output_state = _sigmoid(output_gate) * np.tanh(new_cell_state)
+
+        cell_state = np.where(active, new_cell_state, cell_state)
+        output_state = np.where(active, new_output_state, output_state)
+        outputs[:, step] = np.where(active, new_output_state, 0)
+
+    return outputs
+
+
+def _char_convolution(char_inputs, char_filter, char_bias):
+    """Applies the word level character convolution of a single window size.
+
+    The TensorFlow model convolves over both the character and the character embedding
+    dimensions with 'SAME' padding, and then max pools over the entire word.
+
+    Args:
+        char_inputs (ndarray): The inputs of shape [batch, time, characters, embedding]
+        char_filter (ndarray): The filter of shape [1, window, embedding, 1, output]
+        char_bias (ndarray): The bias of shape [output]
+
+    Returns:
+        (ndarray): The word level character embeddings of shape [batch, time, output]
+    """
+    _, window_size, embedding_dimension, _, output_dimension = char_filter.shape
+    batch_size, time_steps, num_chars, _ = char_inputs.shape
+
+    char_padding = window_size - 1
+    embedding_padding = embedding_dimension - 1
+    padded_inputs = np.pad(char_inputs, [(0, 0), (0, 0),
+                                         (char_padding // 2, char_padding - char_padding // 2),
+                                         (embedding_padding // 2,
+                                          embedding_padding - embedding_padding // 2)],
+                           mode='constant')
+
+    conv_output = np.zeros((batch_size, time_steps, num_chars, embedding_dimension,
+                            output_dimension), dtype=char_inputs.dtype)
+    for char_offset in range(window_size):
+        for embedding_offset in range(embedding_dimension):
+            window = padded_inputs[:, :, char_offset:char_offset + num_chars,
+                                   embedding_offset:embedding_offset + embedding_dimension]
+            conv_output += window[..., np.newaxis] * \
+                char_filter[0, char_offset, embedding_offset, 0]
+
+    max_pool = conv_output.max(axis=(2, 3))
+    return np.maximum(max_pool + char_bias, 0)
+
+
+def lstm_forward(weights, batch_examples, batch_char, batch_gaz, batch_seq_len):
+    """Runs the forward pass of the bi-directional LSTM network at inference time
+
+    Args:
+        weights (dict): The exported weights of the network
+        batch_examples (ndarray): A batch of word embeddings
+        batch_char (ndarray): A batch of character embeddings
+        batch_gaz (ndarray): A batch of gazetteer encodings
+        batch_seq_len (ndarray): A batch of sequence length of each query
+
+    Returns:
+        (ndarray): The softmax output for each token of each example
+    """
+    batch_seq_len = np.asarray(batch_seq_len)
+    embeddings = [np.asarray(batch_examples, dtype=np.float32)]
+
+    num_char_windows = int(weights['num_char_windows'])
+    for idx in range(num_char_windows):
+        embeddings.append(_char_convolution(np.asarray(batch_char, dtype=np.float32),
+                                            weights['char_filter_{}'.format(idx)],
+                                            weights['char_bias_{}'.format(idx)]))
+
+    gaz_embedding = np.dot(np.asarray(batch_gaz, dtype=np.float32),
+                           weights['gaz_weights']) + weights['gaz_biases']
+    embeddings.append(np.maximum(gaz_embedding, 0))
+    combined_embedding = np.concatenate(embeddings, axis=2)
+
+    output_forward = _coupled_lstm(
+        combined_embedding, batch_seq_len, weights['forward_kernel'], weights['forward_bias'],
+        weights['forward_initial_cell_state'], weights['forward_initial_output_state'])
+
+    output_backward = _coupled_lstm(
+        _reverse_sequences(combined_embedding, batch_seq_len), batch_seq_len,
+        weights['backward_kernel'], weights['backward_bias'],
+        weights['backward_initial_cell_state'], weights['backward_initial_output_state'])
+    output_backward = _reverse_sequences(output_backward, batch_seq_len)
+
+    output = np.dot(np.concatenate([output_forward, output_backward], axis=-1),
+                    weights['output_weights']) + weights['output_bias']
+    return _softmax(output)
+
+
+class NumpyLstmModel(BaseLstmModel):
+    """An inference only runtime for the bi-directional LSTM model which runs the forward pass
+    of the network in numpy from the weights exported by ``LstmModel``, so TensorFlow does not
+    need to be imported to serve the model. Models configured with this runtime are trained
+    with ``LstmModel``, which exports the weights when it is dumped.
+    """
+
+    def _run_bucket(self, batch_examples, batch_char, batch_gaz, batch_seq_len):
+        return lstm_forward(self.weights, batch_examples, batch_char, batch_gaz, batch_seq_len)
+
+    def dump(self, path, config):
+        raise MindMeldError('The numpy LSTM runtime cannot be dumped, models are exported '
+                            'when the TensorFlow LSTM model is dumped')
+
+    def load(self, path):
+        """
+        Loads the exported weights of the LSTM model
+
+        Args:
+            path (str): the folder path for the entity model folder
+        """
+        path = path.split('.pkl')[0] + '_model_files'
+        export_path = os.path.join(path, NUMPY_EXPORT_FILE_NAME)
+
+        if not os.path.exists(export_path):
+            if os.path.exists(os.path.join(path, 'lstm_model.meta')):
+                raise MindMeldError('No numpy export was found in {!r}. Please rebuild the '
+                                    'model to export it.'.format(path))
+            # This conditional is for models with no labels where no TF graph was built
+            # for this.
+            return
+
+        with np.load(export_path) as exported_weights:
+            self.weights = {name: exported_weights[name] for name in exported_weights.files}
+
+        # Load feature extraction variables
+        variables_to_load = joblib.load(os.path.join(path, '.feature_extraction_vars'))
+        self.resources = variables_to_load['resources']
+        self.gaz_dimension = variables_to_load['gaz_dimension']
+        self.output_dimension = variables_to_load['output_dimension']
+        self.gaz_encoder = variables_to_load['gaz_encoder']
+        self.label_encoder = variables_to_load['label_encoder']
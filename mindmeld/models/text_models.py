@@ -74,6 +74,7 @@ class TextModel(Model):
         attributes['_resources'] = {rname: self._resources.get(rname, {})
                                     for rname in [WORD_FREQ_RSC, QUERY_FREQ_RSC,
                                                   WORD_NGRAM_FREQ_RSC, CHAR_NGRAM_FREQ_RSC]}
+        attributes['_feature_cache_path'] = None
         return attributes
 
     def _get_model_constructor(self):
@@ -139,19 +140,19 @@ class TextModel(Model):
         params = params or self.config.params
         skip_param_selection = params is not None or self.config.param_selection is None
 
-        # Shuffle to prevent order effects
-        indices = list(range(len(labels)))
-        random.shuffle(indices)
-        examples = [examples[i] for i in indices]
-        labels = [labels[i] for i in indices]
-
         distinct_labels = set(labels)
         if len(set(distinct_labels)) <= 1:
             return self
 
         # Extract features and classes
-        y = self._label_encoder.encode(labels)
-        X, y, groups = self.get_feature_matrix(examples, y, fit=True)
+        X, y = self._get_training_feature_matrix(examples, labels)
+
+        # Shuffle to prevent order effects
+        indices = list(range(len(labels)))
+        random.shuffle(indices)
+        X = X[indices]
+        y = y[indices]
+        groups = list(range(len(labels)))
 
         if skip_param_selection:
             self._clf = self._fit(X, y, params)
@@ -165,8 +166,8 @@ class TextModel(Model):
         return self
 
     def select_params(self, examples, labels, selection_settings=None):
-        y = self._label_encoder.encode(labels)
-        X, y, groups = self.get_feature_matrix(examples, y, fit=True)
+        X, y = self._get_training_feature_matrix(examples, labels)
+        groups = list(range(len(labels)))
         clf, params = self._fit_cv(X, y, groups, selection_settings)
         self._clf = clf
         return params
@@ -341,6 +342,43 @@ class TextModel(Model):
         X, y = self._preprocess_data(feats, y, fit=fit)
         return X, y, groups
 
+    def _get_training_feature_matrix(self, examples, labels):
+        """Gets the feature matrix and the encoded classes of the training examples, fitting
+        the feature transformers on them. When a feature cache is registered, the matrix and the
+        fitted transformers are loaded from it if they were cached by a previous fit, and
+        cached otherwise.
+
+        Args:
+            examples (list): The training examples.
+            labels (list): A parallel list to examples. The gold labels for each example.
+
+        Returns:
+            (tuple): tuple containing:
+
+                * (scipy.sparse.csr_matrix): The feature matrix.
+                * (numpy.array): The encoded classes.
+        """
+        cached = self._load_feature_cache()
+        if cached is not None:
+            logger.info('Loaded cached feature matrix of shape %s', cached['X'].shape)
+            self._class_encoder = cached['class_encoder']
+            self._feat_vectorizer = cached['feat_vectorizer']
+            self._feat_scaler = cached['feat_scaler']
+            self._feat_selector = cached['feat_selector']
+            return cached['X'], cached['y']
+
+        y = self._label_encoder.encode(labels)
+        X, y, _ = self.get_feature_matrix(examples, y, fit=True)
+        self._dump_feature_cache({
+            'X': X,
+            'y': y,
+            'class_encoder': self._class_encoder,
+            'feat_vectorizer': self._feat_vectorizer,
+            'feat_scaler': self._feat_scaler,
+            'feat_selector': self._feat_selector
+        })
+        return X, y
+
     def _preprocess_data(self, X, y=None, fit=False):
 
         if fit:
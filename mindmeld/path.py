@@ -48,6 +48,9 @@ ENTITY_MODEL_CHECKPOINT_PATH = os.path.join(GEN_INTENT_CHECKPOINT_FOLDER, 'entit
 ROLE_MODEL_PATH = os.path.join(GEN_INTENT_FOLDER, '{entity}-role.pkl')
 ROLE_MODEL_CHECKPOINT_PATH = os.path.join(GEN_INTENT_CHECKPOINT_FOLDER, '{entity}-role.pkl')
 GAZETTEER_PATH = os.path.join(GEN_FOLDER, 'gaz-{entity}.pkl')
+ENTITY_RESOLVER_INDEX_PATH = os.path.join(GEN_FOLDER, 'resolver-{entity}.pkl')
+FEATURE_CACHE_FOLDER = os.path.join(GEN_FOLDER, 'feature_cache')
+FEATURE_CACHE_PATH = os.path.join(FEATURE_CACHE_FOLDER, '{feature_hash}.pkl')
 GEN_INDEXES_FOLDER = os.path.join(GEN_FOLDER, 'indexes')
 GEN_INDEX_FOLDER = os.path.join(GEN_INDEXES_FOLDER, '{index}')
 RANKING_MODEL_PATH = os.path.join(GEN_INDEX_FOLDER, 'ranking.pkl')
@@ -102,6 +105,8 @@ PREVIOUSLY_USED_CHAR_EMBEDDINGS_FILE_PATH = \
     os.path.join(EMBEDDINGS_FOLDER_PATH, 'previously_used_char_embeddings.pkl')
 PREVIOUSLY_USED_WORD_EMBEDDINGS_FILE_PATH = \
     os.path.join(EMBEDDINGS_FOLDER_PATH, 'previously_used_word_embeddings.pkl')
+EMBEDDINGS_STORE_VOCAB_PATH = os.path.join(EMBEDDINGS_FOLDER_PATH, '{name}.vocab.pkl')
+EMBEDDINGS_STORE_MATRIX_PATH = os.path.join(EMBEDDINGS_FOLDER_PATH, '{name}.f32')
 
 # User specific directories
 USER_CONFIG_DIR = os.path.join(os.path.expanduser('~'), '.mindmeld')
@@ -399,6 +404,34 @@ def get_gazetteer_data_path(app_path, gaz_name, model_name=None):
     return _resolve_model_name(path, model_name)
 
 
+@safe_path
+def get_entity_resolver_index_path(app_path, entity):
+    """Gets path to the saved in-process entity resolver index.
+
+    Args:
+        app_path (str): The path to the app data.
+        entity (str): The entity type.
+
+    Returns:
+        (str) The path for the entity resolver index.
+    """
+    return ENTITY_RESOLVER_INDEX_PATH.format(app_path=app_path, entity=entity)
+
+
+@safe_path
+def get_feature_cache_path(app_path, feature_hash):
+    """Gets path to the cached feature matrix extracted for a model.
+
+    Args:
+        app_path (str): The path to the app data.
+        feature_hash (str): The hash of the inputs to feature extraction.
+
+    Returns:
+        (str) The path for the cached feature matrix.
+    """
+    return FEATURE_CACHE_PATH.format(app_path=app_path, feature_hash=feature_hash)
+
+
 @safe_path
 def get_labeled_query_file_path(app_path, domain, intent, filename):
     """Gets path to a labeled query file corresponding to a specific domain and intent.
@@ -14,6 +14,7 @@
 """
     This module contains the class which serves the MindMeld API.
 """
+import gc
 import logging
 import json
 import os
@@ -21,15 +22,22 @@ import sys
 import time
 import uuid
 
-from flask import Flask, Request, request, jsonify, g
+from flask import Flask, Request, Response, request, g
 from flask_cors import CORS
 
+from ._json import dump_json
+from ._request_log import RequestLog
 from ._version import current as __version__
-from .exceptions import BadMindMeldRequestError
+from .exceptions import BadMindMeldRequestError, MindMeldImportError
 from .components.dialogue import DialogueResponder
+from .system_entity_recognizer import SystemEntityRecognizer
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_WORKER_TIMEOUT = 60
+
+API_VERSION = '2.0'
+
 
 class MindMeldRequest(Request):  # pylint: disable=too-many-ancestors
     """This class represents requests to the MindMeldServer. It extends
@@ -50,9 +58,17 @@ class MindMeldRequest(Request):  # pylint: disable=too-many-ancestors
 class MindMeldServer:
     """This class sets up a Flask web server."""
 
-    def __init__(self, app_manager):
+    def __init__(self, app_manager, request_log_config=None):
+        """Initializes the server
+
+        Args:
+            app_manager (ApplicationManager): The application manager which handles requests
+            request_log_config (dict, optional): The request log configuration. See
+                ``DEFAULT_REQUEST_LOG_CONFIG`` for the settings and their defaults.
+        """
         self._app_manager = app_manager
         self._request_logger = logger.getChild('requests')
+        self.request_log = RequestLog(request_log_config or {}, self._request_logger, dump_json)
 
         server = Flask('mindmeld')
         CORS(server)
@@ -85,7 +101,8 @@ class MindMeldServer:
                 raise BadMindMeldRequestError(msg, status_code=415)
 
             safe_request = {}
-            for key in ['text', 'params', 'context', 'frame', 'history', 'verbose']:
+            for key in ['text', 'params', 'context', 'frame', 'history', 'verbose',
+                        'session_id']:
                 if key in request_json:
                     safe_request[key] = request_json[key]
             response = self._app_manager.parse(**safe_request)
@@ -93,7 +110,22 @@ class MindMeldServer:
             # use the passed in id if any
             request_id = request_json.get('request_id', str(uuid.uuid4()))
             response.request_id = request_id
-            return jsonify(DialogueResponder.to_json(response))
+            response_data = DialogueResponder.to_json(response)
+            if request_json.get('session_id') is not None and \
+                    self._app_manager.session_store is not None:
+                # the history is kept by the session store, so it is not sent back
+                del response_data['history']
+                response_data['request'] = {key: value for key, value
+                                            in response_data['request'].items()
+                                            if key != 'history'}
+            return _json_response(response_data)
+
+        def _json_response(data, status_code=200):
+            """Serializes the data of a response once, after adding the response time"""
+            data['response_time'] = time.time() - g.get('start_time', time.time())
+            data['version'] = API_VERSION
+            g.response_data = data
+            return Response(dump_json(data), status=status_code, mimetype='application/json')
 
         @server.before_request
         def _before_request():
@@ -103,47 +135,40 @@ class MindMeldServer:
         def _after_request(response):
             g.response_time = time.time() - g.start_time
             g.response = response
-
-            # add response time to response
-            try:
-                data = json.loads(response.get_data(as_text=True))
-                data['response_time'] = g.response_time
-                data['version'] = '2.0'
-                response.set_data(json.dumps(data))
-            except json.JSONDecodeError:
-                pass
-
             return response
 
         @server.teardown_request
         def _teardown_request(error):
             del error
-            if hasattr(g, 'log_this_request') and g.log_this_request:
+            if hasattr(g, 'log_this_request') and g.log_this_request and \
+                    self.request_log.sample():
                 response = g.get('response', None)
                 self._log_request(request, response)
 
         # handle exceptions
         @server.errorhandler(BadMindMeldRequestError)
         def handle_bad_request(error):
-            response = jsonify(error.to_dict())
-            response.status_code = error.status_code
             logger.error(json.dumps(error.to_dict()))
-            return response
+            return _json_response(error.to_dict(), error.status_code)
 
         @server.errorhandler(500)
         def handle_server_error(error):
             response_data = {'error': error.message}
-            response = jsonify(response_data)
-            response.status_code = 500
             logger.error(json.dumps(response_data))
-            return response
+            return _json_response(response_data, 500)
 
         @server.route('/_status', methods=['GET'])
         def status_check():
             body = {'status': 'OK', 'package_version': self._package_version}
             if self._app_version:
                 body['app_version'] = self._app_version
-            return jsonify(body)
+            return _json_response(body)
+
+        @server.route('/_ready', methods=['GET'])
+        def readiness_check():
+            ready = self._app_manager.ready
+            return _json_response({'status': 'ready' if ready else 'loading'},
+                                  200 if ready else 503)
 
         self._server = server
 
@@ -151,9 +176,79 @@ class MindMeldServer:
         """Starts the flask server."""
         self._server.run(**kwargs)
 
+    def run_workers(self, host='0.0.0.0', port=7150, workers=2, timeout=DEFAULT_WORKER_TIMEOUT,
+                    **options):
+        """Serves the app with a pre-fork server of several worker processes, which requires the
+        gunicorn package.
+
+        The app's models should be loaded before calling this method. The worker processes are
+        forked from this process, so they share the loaded models copy-on-write instead of each
+        loading them. Sending SIGHUP to this process restarts the workers gracefully, and
+        sending SIGUSR2 starts a new server which loads the app from disk again, after which
+        this one can be stopped with SIGTERM.
+
+        Args:
+            host (str): The host to listen on
+            port (int): The port to listen on
+            workers (int): The number of worker processes
+            timeout (int): The number of seconds after which a worker serving a request is
+                restarted
+            **options: Other gunicorn settings
+        """
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            raise MindMeldImportError("Serving with several workers requires the gunicorn "
+                                      "package. Please install it with "
+                                      "'pip install mindmeld[server]'.")
+
+        nlp = self._app_manager.nlp
+
+        def _when_ready(arbiter):
+            del arbiter
+            # keep the objects loaded so far out of the garbage collector's reference count
+            # updates, which would copy their memory pages into every worker
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+
+        def _pre_fork(arbiter, worker):
+            del arbiter, worker
+            # the workers of an n-best worker pool of this process are unusable after a fork
+            nlp.stop_worker_pool()
+
+        def _post_fork(arbiter, worker):
+            del arbiter, worker
+            SystemEntityRecognizer.get_instance().exit_on_error = False
+            if nlp.ready:
+                nlp.start_worker_pool()
+
+        settings = {
+            'bind': '{}:{}'.format(host, port),
+            'workers': workers,
+            'timeout': timeout,
+            'preload_app': True,
+            'when_ready': _when_ready,
+            'pre_fork': _pre_fork,
+            'post_fork': _post_fork
+        }
+        settings.update(options)
+        wsgi_app = self._server
+
+        class _PreforkServer(BaseApplication):  # pylint: disable=abstract-method
+            def load_config(self):
+                for key, value in settings.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                return wsgi_app
+
+        logger.info('Serving on %s with %d workers', settings['bind'], workers)
+        _PreforkServer().run()
+
     def _log_request(self, req, response):
         try:
-            response_data = json.loads(response.data)
+            # the data of the response, before it was serialized
+            response_data = g.response_data
 
             if req.headers.getlist("X-Forwarded-For"):
                 ip_address = req.headers.getlist("X-Forwarded-For")[0]
@@ -165,8 +260,6 @@ class MindMeldServer:
             else:
                 request_data = req.get_json()
 
-            # TODO add hook for app to modify logged info
-
         except (KeyError, ValueError, AttributeError) as exc:
             logger.warning('Error occured while logging request')
             logger.debug('Response: %s\nerror: %s', response, exc)
@@ -191,4 +284,5 @@ class MindMeldServer:
         if self._app_version:
             log_request_data['source']['app_version'] = self._app_version
 
-        self._request_logger.info(json.dumps(log_request_data))
+        # the record is redacted, filtered and serialized by the request log's writer thread
+        self.request_log.log(log_request_data)
@@ -51,6 +51,9 @@ class SystemEntityRecognizer:
                 self.is_service_alive = True
             else:
                 self.is_service_alive = get_system_entity_recognizer_config(app_path)
+            # Whether to exit the process when the service fails. Server worker processes
+            # turn this off so a service outage fails requests instead of killing the worker.
+            self.exit_on_error = True
             SystemEntityRecognizer._instance = self
 
     @staticmethod
@@ -85,11 +88,16 @@ class SystemEntityRecognizer:
 
             return response_json, response.status_code
         except requests.ConnectionError:
+            if not self.exit_on_error:
+                logger.error('Unable to connect to the system entity recognizer at %r', url)
+                return [], NO_RESPONSE_CODE
             sys.exit("Unable to connect to the system entity recognizer. Make sure it's "
                      "running by typing 'mindmeld num-parse' at the command line.")
         except Exception as ex:  # pylint: disable=broad-except
             logger.error('Numerical Entity Recognizer Error %s\nURL: %r\nData: %s', ex, url,
                          json.dumps(data))
+            if not self.exit_on_error:
+                return [], NO_RESPONSE_CODE
             sys.exit('\nThe system entity recognizer encountered the following ' +
                      'error:\n' + str(ex) + '\nURL: ' + url + '\nRaw data: ' + str(data) +
                      "\nPlease check your data and ensure Numerical parsing service is running. "
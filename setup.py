@@ -34,6 +34,13 @@ requirements = [
     'immutables~=0.9'
 ]
 
+# optional dependencies, installed with e.g. 'pip install mindmeld[server]'
+extras_requirements = {
+    'server': ['gunicorn>=19.9', 'orjson>=3.0;python_version>="3.6"'],
+    'redis': ['redis>=3.5'],
+    'bayes': ['scikit-optimize>=0.5'],
+}
+
 setup_requirements = [
     'pytest-runner~=2.11',
     'setuptools>=36'
@@ -65,6 +72,7 @@ setup(
     },
     include_package_data=True,
     install_requires=requirements,
+    extras_require=extras_requirements,
     zip_safe=False,
     keywords=['mindmeld', 'nlp', 'ai', 'conversational'],
     classifiers=[
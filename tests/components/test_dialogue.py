@@ -239,6 +239,32 @@ class TestDialogueManager:
         result = dm.apply_handler(request, response)
         assert result.dialogue_state == 'middleware_test'
 
+    def test_middleware_added_after_dispatch(self, dm):
+        """Middleware added after a dialogue state was handled applies to later requests"""
+        def _middle(request, responder, handler):
+            responder.flag = True
+            handler(request, responder)
+
+        dm.add_dialogue_rule('middleware_test', lambda x, y: None, intent='middle')
+        request = create_request('domain', 'middle')
+        dm.apply_handler(request, create_responder(request))
+        assert dm._get_dialogue_handler('middleware_test') is \
+            dm._get_dialogue_handler('middleware_test')
+
+        dm.add_middleware(_middle)
+        result = dm.apply_handler(request, create_responder(request))
+        assert result.flag
+
+    def test_rule_added_after_dispatch(self, dm):
+        """Rules added after a request was handled apply to later requests"""
+        request = create_request('domain', 'other', [{'type': 'entity_1'}])
+        assert dm.apply_handler(request, create_responder(request)).dialogue_state == 'domain'
+
+        dm.add_dialogue_rule('domain_entity', lambda x, y: None, domain='domain',
+                             has_entity='entity_1')
+        result = dm.apply_handler(request, create_responder(request))
+        assert result.dialogue_state == 'domain_entity'
+
 
 def test_convo_params_are_cleared(kwik_e_mart_nlp, kwik_e_mart_app_path):
     """Tests that the params are cleared in one trip from app to mm."""
@@ -49,6 +49,15 @@ def resolver_text_rel(resource_loader, es_client):
         return resolver
 
 
+@pytest.fixture
+def resolver_local(resource_loader):
+    """An entity resolver for 'location' on the Kwik-E-Mart app with the local backend"""
+    resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE)
+    resolver._er_config = {'model_type': 'text_relevance', 'backend': 'local'}
+    resolver.fit()
+    return resolver
+
+
 def test_canonical(resolver):
     """Tests that entity resolution works for a canonical entity in the map"""
     expected = {'id': '2', 'cname': 'Pine and Market'}
@@ -79,3 +88,52 @@ def test_synonym_text_rel(resolver_text_rel):
     predicted = resolver_text_rel.predict(Entity('Pine St', ENTITY_TYPE))[0]
     assert predicted['id'] == expected['id']
     assert predicted['cname'] == expected['cname']
+
+
+@pytest.mark.parametrize('text', ['Pine and Market', 'Pine St', 'pine and markt'])
+def test_local_backend(resolver_local, text):
+    """Tests that entity resolution works with the in-process synonym index"""
+    expected = {'id': '2', 'cname': 'Pine and Market'}
+    predicted = resolver_local.predict(Entity(text, ENTITY_TYPE))[0]
+    assert predicted['id'] == expected['id']
+    assert predicted['cname'] == expected['cname']
+
+
+def test_local_backend_load(resolver_local, resource_loader):
+    """Tests that a saved in-process synonym index is loaded"""
+    resolver = EntityResolver(APP_PATH, resource_loader, ENTITY_TYPE)
+    resolver._er_config = resolver_local._er_config
+    resolver.load()
+    assert resolver._local_index.entity_map_hash == resolver_local._local_index.entity_map_hash
+    assert resolver.predict(Entity('Pine St', ENTITY_TYPE))[0]['cname'] == 'Pine and Market'
+
+
+def test_resolution_cache(resolver_local):
+    """Tests that resolved entities are cached until the resolver is fit again"""
+    first = resolver_local.predict(Entity('Pine St', ENTITY_TYPE))
+    second = resolver_local.predict(Entity('pine st', ENTITY_TYPE))
+    assert first == second
+    assert resolver_local.cache_stats['hits'] == 1
+    assert resolver_local.cache_stats['misses'] == 1
+
+    second[0]['cname'] = 'modified'
+    assert resolver_local.predict(Entity('Pine St', ENTITY_TYPE))[0]['cname'] == 'Pine and Market'
+
+    resolver_local.fit()
+    assert resolver_local.cache_stats['size'] == 0
+
+
+def test_predict_batch(resolver, es_client):
+    """Tests that entities resolved together are resolved as they are separately, with a single
+    Elasticsearch request"""
+    entities = [Entity('Pine and Market', ENTITY_TYPE), Entity('Pine St', ENTITY_TYPE),
+                Entity('Pine and Market', ENTITY_TYPE)]
+    expected = [resolver.predict(entity) for entity in entities]
+    resolver._resolution_cache.clear()
+
+    with mock.patch.object(es_client, 'msearch', wraps=es_client.msearch) as msearch:
+        predicted = EntityResolver.predict_batch([(resolver, entity) for entity in entities])
+    assert msearch.call_count == 1
+    # the repeated entity is only searched once
+    assert len(msearch.call_args[1]['body']) == 4
+    assert predicted == expected
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_history
+----------------------------------
+
+Tests for the history of a conversation.
+"""
+import json
+import pickle
+
+import pytest
+
+from mindmeld.components import DialogueResponder
+from mindmeld.components._history import History, Turn
+from mindmeld.components.request import Request
+
+
+def create_turn(text):
+    request = Request(domain='domain', intent='intent', text=text)
+    responder = DialogueResponder(request=request)
+    responder.dialogue_state = text
+    responder.reply(text)
+    return Turn.from_responder(responder)
+
+
+def test_turn():
+    turn = create_turn('hello')
+    assert isinstance(turn, dict)
+    assert turn['request']['text'] == 'hello'
+    assert 'history' not in turn
+    assert 'history' not in turn['request']
+    assert turn['directives'] == [{'name': 'reply', 'payload': {'text': 'hello'},
+                                   'type': 'view'}]
+    assert pickle.loads(pickle.dumps(turn)) == turn
+
+    with pytest.raises(TypeError):
+        turn['dialogue_state'] = 'bye'
+    with pytest.raises(TypeError):
+        turn.update(dialogue_state='bye')
+
+
+def test_turn_copies_responder():
+    request = Request(domain='domain', intent='intent', text='hello',
+                      entities=[{'type': 'name', 'value': [{'cname': 'Bob'}]}])
+    responder = DialogueResponder(request=request)
+    responder.slots['name'] = {'first': 'Bob'}
+    responder.reply('hello')
+    turn = Turn.from_responder(responder)
+
+    # later changes to the responder do not change the turn
+    responder.slots['name']['first'] = 'Alice'
+    responder.directives[0]['payload']['text'] = 'bye'
+    request.entities[0]['value'][0]['cname'] = 'Alice'
+    assert turn['slots'] == {'name': {'first': 'Bob'}}
+    assert turn['directives'][0]['payload'] == {'text': 'hello'}
+    assert turn['request']['entities'][0]['value'][0]['cname'] == 'Bob'
+
+
+def test_history():
+    turns = [create_turn(str(index)) for index in range(5)]
+    history = History(reversed(turns))
+
+    assert isinstance(history, tuple)
+    assert history == tuple(reversed(turns))
+    assert history[-1] is turns[0]
+    assert history + (turns[0],) == tuple(reversed(turns)) + (turns[0],)
+    assert History(history, max_length=3) == (turns[4], turns[3], turns[2])
+    assert pickle.loads(pickle.dumps(history)) == history
+    assert [turn['request']['text'] for turn in json.loads(json.dumps(history))] == \
+        ['4', '3', '2', '1', '0']
+
+
+def test_history_from_client():
+    """Histories sent by clients have the same types as the histories of responses"""
+    history = Request(history=[{'text': 'hello'}]).history
+    assert isinstance(history, History)
+    assert isinstance(history[0], Turn)
+    assert history == ({'text': 'hello'},)
@@ -1,3 +1,5 @@
+import pytest
+
 from mindmeld.components.nlp import NaturalLanguageProcessor
 from unittest.mock import patch
 
@@ -70,3 +72,37 @@ def test_intent_classifier_random_forest(kwik_e_mart_app_path, caplog):
                features=features)
         mock.assert_any_call('Unexpected param `C`, dropping it from model config.')
         mock.assert_any_call('Unexpected param `fit_intercept`, dropping it from model config.')
+
+
+def test_intent_classifier_feature_cache(kwik_e_mart_app_path):
+    nlp = NaturalLanguageProcessor(app_path=kwik_e_mart_app_path)
+    ic = nlp.domains['store_info'].intent_classifier
+    ic.fit(model_settings={'classifier_type': 'logreg'}, params={'C': 10})
+
+    # A params only change reuses the feature matrix of the previous fit
+    with patch('mindmeld.models.text_models.TextModel.get_feature_matrix') as mock:
+        ic.fit(model_settings={'classifier_type': 'logreg'}, params={'C': 100})
+        mock.assert_not_called()
+
+    assert ic.predict('hello') == 'greet'
+
+
+@pytest.mark.parametrize('search', ['halving', 'random'])
+def test_intent_classifier_param_search(kwik_e_mart_app_path, search):
+    nlp = NaturalLanguageProcessor(app_path=kwik_e_mart_app_path)
+    param_selection_settings = {
+        'grid': {
+            'fit_intercept': [True, False],
+            'C': [0.01, 1, 100, 10000, 1000000]
+        },
+        'type': 'k-fold',
+        'k': 5,
+        'search': search,
+        'n_iter': 4,
+        'random_state': 0
+    }
+    ic = nlp.domains['store_info'].intent_classifier
+    ic.fit(model_settings={'classifier_type': 'logreg'}, param_selection=param_selection_settings)
+
+    assert ic.predict('hello') == 'greet'
+    assert ic._model._current_params['C'] in param_selection_settings['grid']['C']
@@ -37,6 +37,25 @@ def test_build(empty_nlp):
     nlp.build()
 
 
+def test_parallel_build(kwik_e_mart_app_path, kwik_e_mart_nlp):
+    """Tests that building a processor with worker processes fits the same models as a serial
+    build"""
+    nlp = NaturalLanguageProcessor(app_path=kwik_e_mart_app_path, config={'build_workers': 2})
+    nlp.build()
+
+    assert nlp.ready
+    for domain, domain_processor in nlp.domains.items():
+        for intent, intent_processor in domain_processor.intents.items():
+            serial_processor = kwik_e_mart_nlp.domains[domain].intents[intent]
+            assert intent_processor.ready
+            assert set(intent_processor.entities) == set(serial_processor.entities)
+            assert intent_processor.entity_recognizer.hash == \
+                serial_processor.entity_recognizer.hash
+
+    for query in ['Hello', 'Is the Elm Street store open?', 'When does 23rd street close?']:
+        assert nlp.process(query) == kwik_e_mart_nlp.process(query)
+
+
 def test_dump(kwik_e_mart_nlp):
     """Test dump method of nlp"""
     kwik_e_mart_nlp.dump()
@@ -422,37 +441,37 @@ def test_process_empty_nbest_unspecified_intent(kwik_e_mart_nlp, queries):
 
 def test_parallel_processing(kwik_e_mart_nlp):
     nlp = kwik_e_mart_nlp
-    import mindmeld.components.nlp as nlp_module
+    from mindmeld.components._worker_pool import WorkerPool, DEFAULT_TASK_TIMEOUT
     import os
     import time
-    if nlp_module.executor:
-        input_list = ['A', 'B', 'C']
-        parent = os.getpid()
-
-        # test adding a new function to an instance
-        def test_function(self, item):
-            item = item.lower()
-            if os.getpid() == parent:
-                item = item + '-parent'
-            else:
-                item = item + '-child'
-            return item
-        prev_executor = nlp_module.executor
-        nlp._test_function = test_function.__get__(nlp)
-        processed = nlp._process_list(input_list, '_test_function')
-        # verify the process pool was restarted
-        # (the function doesn't exist yet in the subprocesses)
-        assert nlp_module.executor != prev_executor
-        # verify the list was processed by main process
-        assert processed == ('a-parent', 'b-parent', 'c-parent')
-
-        prev_executor = nlp_module.executor
+    input_list = ['A', 'B', 'C']
+    parent = os.getpid()
+
+    def test_function(self, item):
+        item = item.lower()
+        if os.getpid() == parent:
+            item = item + '-parent'
+        else:
+            item = item + '-child'
+        return item
+
+    # the workers only know the functions which exist when they are started
+    nlp._test_function = test_function.__get__(nlp)
+    worker_pool = WorkerPool.start(nlp, 2)
+    try:
+        assert nlp.worker_pool is worker_pool
+        assert worker_pool.check_health()['healthy']
+
+        # verify the list was processed by the workers, dispatched by processor path
         processed = nlp._process_list(input_list, '_test_function')
-        # verify the process pool was not restarted
-        assert prev_executor == nlp_module.executor
-        # verify the list was processed by subprocesses
         assert processed == ('a-child', 'b-child', 'c-child')
 
+        # test that a function the workers don't have is processed by the main process
+        nlp._other_function = test_function.__get__(nlp)
+        processed = nlp._process_list(input_list, '_other_function')
+        assert processed == ('a-parent', 'b-parent', 'c-parent')
+        assert worker_pool.stats['errors'] == 1
+
         # test that the timeout works properly
         def slow_function(self, item):
             item = item.lower()
@@ -460,17 +479,21 @@ def test_parallel_processing(kwik_e_mart_nlp):
                 item = item + '-parent'
             else:
                 # sleep enough to trigger a timeout in the child process
-                time.sleep(nlp_module.SUBPROCESS_WAIT_TIME + 0.1)
+                time.sleep(DEFAULT_TASK_TIMEOUT + 0.1)
                 item = item + '-child'
             return item
+        worker_pool.stop()
         nlp._test_function = slow_function.__get__(nlp)
-        nlp_module.restart_subprocesses()
-        prev_executor = nlp_module.executor
+        worker_pool = WorkerPool.start(nlp, 2)
         processed = nlp._process_list(input_list, '_test_function')
-        # verify the process pool was restarted due to timeout
-        assert prev_executor != nlp_module.executor
         # verify the list was processed by main process
         assert processed == ('a-parent', 'b-parent', 'c-parent')
+        # verify the timeout was counted and the pool was not torn down
+        assert worker_pool.stats['timeouts'] == 1
+        assert nlp.worker_pool is worker_pool
+    finally:
+        worker_pool.stop()
+    assert nlp.worker_pool is None
 
 
 def test_custom_data(kwik_e_mart_nlp):
@@ -533,3 +556,53 @@ def test_sys_entity_feature(kwik_e_mart_nlp):
     }
 
     assert expected_features == sys_candidate_features
+
+
+def test_thread_parallel_processing(kwik_e_mart_nlp):
+    nlp = kwik_e_mart_nlp
+    from mindmeld.components._worker_pool import ThreadWorkerPool
+    import threading
+    caller = threading.get_ident()
+    nlp._test_function = (lambda self, item: (item.lower(), threading.get_ident())).__get__(nlp)
+
+    worker_pool = ThreadWorkerPool.start(nlp, 2)
+    try:
+        assert nlp.worker_pool is worker_pool
+        assert worker_pool.check_health()['healthy']
+        processed = nlp._process_list(['A', 'B', 'C'], '_test_function')
+        assert [item for item, _ in processed] == ['a', 'b', 'c']
+        # the calling thread processes the first item, the workers the others
+        assert processed[0][1] == caller
+
+        # n-best transcripts are processed with the same in-memory models
+        queries = nlp.create_query(['store hours', 'store ours'])
+        assert [query.text for query in queries] == ['store hours', 'store ours']
+    finally:
+        worker_pool.stop()
+
+
+def test_worker_pools_per_processor(kwik_e_mart_app_path, kwik_e_mart_nlp):
+    from mindmeld.components._worker_pool import ThreadWorkerPool, _find_processor
+    nlp = kwik_e_mart_nlp
+    other_nlp = NaturalLanguageProcessor(kwik_e_mart_app_path)
+
+    worker_pool = ThreadWorkerPool.start(nlp, 2)
+    other_pool = ThreadWorkerPool.start(other_nlp, 2)
+    try:
+        # a processor of the same app does not replace the pool of another processor
+        assert nlp.worker_pool is worker_pool
+        assert other_nlp.worker_pool is other_pool
+        assert worker_pool.check_health()['workers'] == 2
+
+        # child processors dispatch to the pool of their own root
+        domain = nlp.domains['store_info']
+        assert domain._root is nlp
+
+        # processors are never created while dispatching
+        with pytest.raises(ProcessorError):
+            _find_processor(nlp, ('store_info', 'missing_intent'))
+        assert 'missing_intent' not in domain.intents
+    finally:
+        other_pool.stop()
+        worker_pool.stop()
+    assert nlp.worker_pool is None
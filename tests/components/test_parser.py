@@ -239,10 +239,8 @@ class TestParserLinkWords:
         assert entities[2].children == (entities[1],)
 
 
-def test_parser_timeout():
-    """Tests that the parser throws a ParserTimeout exception on very ambiguous queries
-    which take long to entities.
-    """
+def test_parser_ambiguous():
+    """Tests that the parser groups very ambiguous queries without timing out"""
     config = {
         'name': {
             'form': {'max_instances': 1},
@@ -259,6 +257,23 @@ def test_parser_timeout():
             '{lemonade|option} {4|number} {honeys|option}')
 
     query = markup.load_query(text)
+    entities = parser.parse_entities(query.query, query.entities, handle_timeout=False)
+
+    names = [e for e in entities if e.entity.type == 'name']
+    assert names[0].children == (entities[0],)
+    assert names[1].children == (entities[2],)
+    assert names[2].children == (entities[4],) + tuple(entities[6:10])
+    assert entities[10].parent is None
+    assert entities[11].parent is None
+
+
+def test_parser_timeout():
+    """Tests that the parser throws a ParserTimeout exception when parsing takes too long"""
+    config = {'head': ['dependent']}
+    parser = Parser(config=config)
+    query = markup.load_query('{Hello|head} {there|dependent}')
 
     with pytest.raises(ParserTimeout):
-        parser.parse_entities(query.query, query.entities, handle_timeout=False)
+        parser.parse_entities(query.query, query.entities, handle_timeout=False, timeout=0)
+
+    assert parser.parse_entities(query.query, query.entities, timeout=0) == query.entities
@@ -8,11 +8,16 @@ test_question_answerer
 Tests for `question_answerer` module.
 """
 # pylint: disable=locally-disabled,redefined-outer-name
+import json
 import pytest
 import os
+from unittest.mock import MagicMock, patch
 
-from mindmeld.components.question_answerer import QuestionAnswerer
-from mindmeld.components._elasticsearch_helpers import create_es_client
+from mindmeld.components.question_answerer import (QuestionAnswerer, _iter_json_array,
+                                                   _iter_json_docs)
+from mindmeld.components import _elasticsearch_helpers
+from mindmeld.components._elasticsearch_helpers import (create_es_client, resolve_index_alias,
+                                                        _bulk_load_chunk, _get_index_versions)
 
 ENTITY_TYPE = 'store_name'
 STORE_DATA_FILE_PATH = os.path.dirname(__file__) + "/../kwik_e_mart/data/stores.json"
@@ -184,3 +189,168 @@ def test_advanced_search_validation(answerer):
     with pytest.raises(ValueError):
         s = answerer.build_search(index='store_name')
         s.sort(field='location', sort_type='distance')
+
+
+@pytest.mark.parametrize('read_size', [1, 100, 65536])
+def test_iter_json_docs(tmpdir, read_size):
+    """Tests that json and jsonl knowledge base files are streamed one document at a time"""
+    with open(STORE_DATA_FILE_PATH) as data_fp:
+        expected = json.load(data_fp)
+
+    jsonl_file = tmpdir.join('stores.jsonl')
+    jsonl_file.write('\n'.join(json.dumps(doc) for doc in expected) + '\n')
+
+    with open(STORE_DATA_FILE_PATH) as data_fp:
+        assert list(_iter_json_array(data_fp, read_size=read_size)) == expected
+    assert list(_iter_json_docs(STORE_DATA_FILE_PATH)) == expected
+    assert list(_iter_json_docs(str(jsonl_file))) == expected
+
+
+@pytest.mark.parametrize('read_size', [1, 2, 3, 4, 5])
+def test_iter_json_array_split_numbers(tmpdir, read_size):
+    """Tests that numbers split across reads are parsed whole"""
+    expected = [12345, -6.5e-10, 1.25, {'price': 789}, 42]
+    data_file = tmpdir.join('numbers.json')
+    data_file.write('[12345, -6.5e-10,1.25,{"price": 789} , 42]')
+
+    with open(str(data_file)) as data_fp:
+        assert list(_iter_json_array(data_fp, read_size=read_size)) == expected
+
+
+def test_load_kb_clean(answerer, es_client):
+    """Tests that rebuilding an index swaps its alias to a single new version"""
+    scoped_index_name = 'kwik_e_mart$store_name'
+    old_versions = resolve_index_alias(es_client, scoped_index_name)
+
+    QuestionAnswerer.load_kb(app_namespace='kwik_e_mart', index_name='store_name',
+                             data_file=STORE_DATA_FILE_PATH, clean=True)
+    new_versions = resolve_index_alias(es_client, scoped_index_name)
+
+    assert len(new_versions) == 1
+    assert new_versions != old_versions
+    assert not any(es_client.indices.exists(index=index) for index in old_versions
+                   if index != scoped_index_name)
+    assert len(answerer.get(index='store_name', id='20')) > 0
+
+
+def test_index_versions_with_shared_prefix():
+    """Tests that the versions of an index exclude indexes whose names share its prefix"""
+    es_client = MagicMock()
+    es_client.indices.get_settings.return_value = {
+        'app$stores-v1600000000002': {}, 'app$stores-v999999999999': {},
+        'app$stores-v1600000000001': {}, 'app$stores-vegan-v1600000000000': {},
+        'app$stores-v2': {}, 'app$stores-vip': {}, 'app$stores-vip-v1600000000000': {}
+    }
+    assert _get_index_versions(es_client, 'app$stores') == [
+        'app$stores-v1600000000001', 'app$stores-v1600000000002']
+    assert _get_index_versions(es_client, 'app$stores-vip') == ['app$stores-vip-v1600000000000']
+
+
+@pytest.mark.parametrize('max_retries', [1, 2])
+def test_bulk_load_retries_rejected_documents(monkeypatch, max_retries):
+    """Tests that documents rejected by an overloaded cluster are sent again"""
+    from elasticsearch5.serializer import JSONSerializer
+    monkeypatch.setattr(_elasticsearch_helpers.time, 'sleep', lambda seconds: None)
+
+    def item(doc_id, status):
+        return {'index': {'_id': doc_id, 'status': status}}
+
+    es_client = MagicMock()
+    es_client.transport.serializer = JSONSerializer()
+    es_client.bulk.side_effect = [
+        {'errors': True, 'items': [item('1', 201), item('2', 429), item('3', 400)]},
+        {'errors': True, 'items': [item('2', 429)]},
+        {'errors': False, 'items': [item('2', 201)]},
+    ]
+    docs = [{'_id': doc_id, 'name': doc_id} for doc_id in ('1', '2', '3')]
+    count, errors = _bulk_load_chunk(es_client, docs, 'index', 'document', max_retries)
+
+    failed = [item['index']['_id'] for item in errors]
+    if max_retries == 2:
+        assert (count, failed) == (2, ['3'])
+    else:
+        # the document is still rejected when the retries are exhausted
+        assert (count, sorted(failed)) == (1, ['2', '3'])
+    assert es_client.bulk.call_count == max_retries + 1
+
+
+def test_sort_uses_cached_field_stats(food_ordering_answerer):
+    """Tests that sorting on a number field doesn't query the knowledge base for its stats"""
+    food_ordering_answerer.build_search(index='menu_items')
+
+    with patch.object(food_ordering_answerer._es_client, 'search') as search:
+        s = food_ordering_answerer.build_search(index='menu_items').sort(field='price',
+                                                                         sort_type='asc')
+    assert not search.called
+    assert s._build_es_query()
+
+
+def test_search_is_immutable(answerer):
+    """Tests that adding a clause returns a new search which shares the unchanged state"""
+    s = answerer.build_search(index='store_name')
+    query_search = s.query(store_name='peanut')
+    filter_search = query_search.filter(id='20')
+
+    assert not s._clauses['query']
+    assert not query_search._clauses['filter']
+    assert len(filter_search._clauses['filter']) == 1
+    assert filter_search._clauses['query'] is query_search._clauses['query']
+    assert filter_search._kb_field_info is s._kb_field_info
+    assert filter_search._ranking_config is s._ranking_config
+
+
+@pytest.fixture
+def local_answerer(kwik_e_mart_app_path):
+    config = {'backend': 'local', 'data_files': {'store_name': STORE_DATA_FILE_PATH}}
+    return QuestionAnswerer(kwik_e_mart_app_path, config=config)
+
+
+def test_local_backend(local_answerer):
+    """Tests that the local backend searches the knowledge base without Elasticsearch"""
+    res = local_answerer.get(index='store_name', id='20')
+    assert [doc['id'] for doc in res] == ['20']
+
+    res = local_answerer.get(index='store_name', store_name='peanut', address='peanut st')
+    assert res[0]['id'] == '20'
+
+    res = local_answerer.get(index='store_name', store_name='Garden')
+    assert res[0]['store_name'] == 'Duff Gardens Store'
+
+    res = local_answerer.get(index='store_name', _sort='location', _sort_type='distance',
+                             _sort_location='44.24,-123.12')
+    assert res[0]['id'] == '19'
+
+    s = local_answerer.build_search(index='store_name')
+    assert s.query(store_name='peanut').filter(id='6').execute()[0]['id'] == '6'
+    assert not s.client
+
+
+def test_local_backend_sort_without_values(kwik_e_mart_app_path, tmpdir):
+    """Tests that sorting on a number field without any values keeps the documents"""
+    data_file = tmpdir.join('items.json')
+    data_file.write('[{"id": "1", "name": "a", "price": NaN}, '
+                    '{"id": "2", "name": "b", "price": NaN}]')
+    config = {'backend': 'local', 'data_files': {'items': str(data_file)}}
+    qa = QuestionAnswerer(kwik_e_mart_app_path, config=config)
+
+    res = qa.get(index='items', _sort='price', _sort_type='asc')
+    assert sorted(doc['id'] for doc in res) == ['1', '2']
+
+
+def test_local_backend_checks_changes_periodically(kwik_e_mart_app_path, tmpdir, monkeypatch):
+    """Tests that searches don't check the data file for changes on every query"""
+    from mindmeld.components import question_answerer
+    data_file = tmpdir.join('items.json')
+    data_file.write('[{"id": "1", "name": "a"}]')
+    config = {'backend': 'local', 'data_files': {'items': str(data_file)}}
+    qa = QuestionAnswerer(kwik_e_mart_app_path, config=config)
+    assert [doc['id'] for doc in qa.get(index='items')] == ['1']
+
+    data_file.write('[{"id": "1", "name": "a"}, {"id": "2", "name": "b"}]')
+    os.utime(str(data_file), (0, 0))
+    with patch.object(question_answerer.os.path, 'getmtime') as getmtime:
+        assert [doc['id'] for doc in qa.get(index='items')] == ['1']
+    assert not getmtime.called
+
+    monkeypatch.setattr(question_answerer, 'LOCAL_KB_CHECK_INTERVAL', 0)
+    assert sorted(doc['id'] for doc in qa.get(index='items')) == ['1', '2']
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_session_store
+----------------------------------
+
+Tests for the session stores.
+"""
+# pylint: disable=locally-disabled,redefined-outer-name
+import time
+
+import attr
+import pytest
+
+from mindmeld.components import DialogueResponder
+from mindmeld.components._history import History, Turn
+from mindmeld.components.request import FrozenParams, Request
+from mindmeld.components.session_store import (
+    MemorySessionStore, Session, SqliteSessionStore, create_session_store
+)
+from mindmeld.exceptions import SessionConflictError
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def create_store(request, tmpdir):
+    def _create_store(ttl=None):
+        if request.param == 'memory':
+            return MemorySessionStore(ttl=ttl)
+        return SqliteSessionStore(str(tmpdir.join('sessions.db')), ttl=ttl)
+    return _create_store
+
+
+def create_session():
+    responder = DialogueResponder(request=Request(domain='domain', intent='intent', text='hi'))
+    responder.reply('hello')
+    return Session(frame={'name': 'value'}, params=FrozenParams(target_dialogue_state='state'),
+                   history=History([Turn.from_responder(responder)], max_length=10))
+
+
+def test_set_and_get(create_store):
+    store = create_store()
+    assert store.get('session') is None
+
+    session = store.set('session', create_session())
+    assert session.version == 1
+
+    stored = store.get('session')
+    assert stored.version == 1
+    assert stored.frame == {'name': 'value'}
+    assert isinstance(stored.params, FrozenParams)
+    assert stored.params.target_dialogue_state == 'state'
+    assert isinstance(stored.history, History)
+    assert isinstance(stored.history[0], Turn)
+    assert stored.history[0]['directives'] == session.history[0]['directives']
+
+    assert store.set('session', stored).version == 2
+    store.delete('session')
+    assert store.get('session') is None
+
+
+def test_conflict(create_store):
+    store = create_store()
+    session = store.set('session', create_session())
+    store.set('session', session)
+
+    # the session was loaded before the previous update
+    with pytest.raises(SessionConflictError):
+        store.set('session', attr.evolve(session, frame={}))
+    with pytest.raises(SessionConflictError):
+        store.set('session', Session())
+    assert store.get('session').version == 2
+
+
+def test_ttl(create_store):
+    store = create_store(ttl=0.05)
+    store.set('session', create_session())
+    time.sleep(0.1)
+    assert store.get('session') is None
+    assert store.set('session', Session()).version == 1
+
+
+def test_ttl_mid_turn(create_store):
+    """Tests that a session which expires while a turn is processed is stored again"""
+    store = create_store(ttl=0.05)
+    store.set('session', create_session())
+    session = store.get('session')
+    time.sleep(0.1)
+    assert store.set('session', session).version == 2
+    assert store.get('session').version == 2
+
+
+def test_create_session_store(tmpdir):
+    assert create_session_store({'store': None}) is None
+    assert isinstance(create_session_store({'store': 'memory'}), MemorySessionStore)
+    store = create_session_store({'store': 'sqlite', 'path': str(tmpdir.join('sessions.db'))})
+    assert isinstance(store, SqliteSessionStore)
+    with pytest.raises(ValueError):
+        create_session_store({'store': 'other'})
@@ -1,4 +1,5 @@
-from mindmeld.models.taggers.embeddings import GloVeEmbeddingsContainer
+from mindmeld.models.taggers.embeddings import (GloVeEmbeddingsContainer, WordSequenceEmbedding,
+                                                CharacterSequenceEmbedding)
 from numpy import ndarray
 
 
@@ -8,3 +9,25 @@ def test_embedding_size_is_correct():
         GloVeEmbeddingsContainer(50, None).get_pretrained_word_to_embeddings_dict()
     assert len(token_to_embedding_mapping[b'sandberger']) == 50
     assert type(token_to_embedding_mapping[b'sandberger']) == ndarray
+
+
+def test_word_sequence_embedding_uses_store():
+    """Tests that pretrained embeddings are gathered from the binary store"""
+    encoder = WordSequenceEmbedding(5, 50)
+    token_to_embedding_mapping = encoder.pretrained_embeddings
+    encoded = encoder.encode_sequence_of_tokens([b'sandberger', 'unseen-token'])
+    assert encoded.shape == (5, 50)
+    assert (encoded[0] == token_to_embedding_mapping[b'sandberger']).all()
+    assert (encoded[2:] == 0).all()
+
+
+def test_batched_encoding_matches_single_encoding():
+    """Tests that batched encoding gives the same embeddings as encoding each sequence"""
+    encoder = CharacterSequenceEmbedding(4, 10, 5)
+    sequences = [['hello', 'world'], ['a', 'much', 'longer', 'query', 'than', 'padding']]
+    encoded = encoder.encode_sequences_of_tokens(sequences)
+    assert encoded.shape == (2, 4, 5, 10)
+    for idx, sequence in enumerate(sequences):
+        assert (encoded[idx] == encoder.encode_sequence_of_tokens(sequence)).all()
+    assert (encoded[0, 0, 2] == encoded[0, 0, 3]).all()
+    assert (encoded[0, 0, 2] == encoded[0, 1, 3]).all()
@@ -8,8 +8,12 @@ test_tagger
 Tests for `tagger` module.
 """
 # pylint: disable=locally-disabled,redefined-outer-name
+import pickle
+import threading
+
 import pytest
 
+from mindmeld.exceptions import MindMeldError
 from mindmeld.models.taggers import taggers
 
 # This index is the start index of when the time section of the full time format. For example:
@@ -247,3 +251,92 @@ def test_lstm_er_model(kwik_e_mart_nlp):
     er.fit(**config)
     response = kwik_e_mart_nlp.process('Does the 156th location open on Saturday?')
     assert response['entities'][0]['value'][0]['cname'] == '156th Street'
+
+
+def test_lstm_er_model_micro_batching(kwik_e_mart_nlp):
+    config = {
+        'model_type': 'tagger',
+        'model_settings': {
+            'classifier_type': 'lstm',
+            'tag_scheme': 'IOB',
+            'feature_scaler': 'max-abs'
+        },
+        'params': {'number_of_epochs': 3, 'token_embedding_dimension': 50,
+                   'gaz_encoding_dimension': 50, 'token_lstm_hidden_state_dimension': 200,
+                   'inference_batch_wait_ms': 5, 'inference_bucket_width': 2},
+        'features': {
+            'bag-of-words-seq': {
+                'ngram_lengths_to_start_positions': {
+                    1: [0],
+                }
+            },
+        }
+    }
+    er = kwik_e_mart_nlp.domains["store_info"].intents["get_store_hours"].entity_recognizer
+    er.fit(**config)
+    response = kwik_e_mart_nlp.process('Does the 156th location open on Saturday?')
+    assert response['entities'][0]['value'][0]['cname'] == '156th Street'
+
+
+def test_lstm_micro_batcher_created_once():
+    from mindmeld.models.taggers.lstm_numpy import NumpyLstmModel
+    # the batcher lock is not pickled, so it is restored when the model is loaded
+    model = pickle.loads(pickle.dumps(NumpyLstmModel()))
+
+    start = threading.Barrier(8)
+    batchers = []
+
+    def get_batcher():
+        start.wait()
+        batchers.append(model._get_batcher())
+
+    threads = [threading.Thread(target=get_batcher) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(batcher) for batcher in batchers}) == 1
+
+
+def test_lstm_numpy_export_parity(kwik_e_mart_nlp):
+    config = {
+        'model_type': 'tagger',
+        'model_settings': {
+            'classifier_type': 'lstm',
+            'tag_scheme': 'IOB',
+            'lstm_runtime': 'numpy'
+        },
+        'params': {'number_of_epochs': 1, 'token_embedding_dimension': 50,
+                   'gaz_encoding_dimension': 50, 'token_lstm_hidden_state_dimension': 50,
+                   'use_character_embeddings': True},
+        'features': {
+            'in-gaz-span-seq': {},
+        }
+    }
+    er = kwik_e_mart_nlp.domains["store_info"].intents["get_store_hours"].entity_recognizer
+    er.fit(**config)
+    lstm_model = er._model._clf
+    weights = lstm_model._get_numpy_weights()
+    assert lstm_model._check_numpy_parity(weights) < 1e-4
+
+
+def test_lstm_numpy_export_parity_failure(kwik_e_mart_nlp, tmpdir, monkeypatch):
+    config = {
+        'model_type': 'tagger',
+        'model_settings': {
+            'classifier_type': 'lstm',
+            'tag_scheme': 'IOB',
+            'lstm_runtime': 'numpy'
+        },
+        'params': {'number_of_epochs': 1},
+        'features': {
+            'in-gaz-span-seq': {},
+        }
+    }
+    er = kwik_e_mart_nlp.domains["store_info"].intents["get_store_hours"].entity_recognizer
+    er.fit(**config)
+    lstm_model = er._model._clf
+    monkeypatch.setattr(lstm_model, '_check_numpy_parity', lambda weights: 1.0)
+    with pytest.raises(MindMeldError):
+        lstm_model.export_numpy(str(tmpdir))
+    assert not tmpdir.listdir()
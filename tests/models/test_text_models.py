@@ -9,11 +9,15 @@ Tests for `standard_models` module.
 """
 # pylint: disable=locally-disabled,redefined-outer-name
 import os
+import time
 
 import pytest
+from sklearn.linear_model import LogisticRegression
 
 from mindmeld import markup
 from mindmeld.models import ModelConfig, CLASS_LABEL_TYPE, QUERY_EXAMPLE_TYPE
+from mindmeld.models.model import FEATURE_CACHE_MAX_AGE
+from mindmeld.models.param_search import _get_warm_start_paths
 from mindmeld.models.text_models import TextModel
 from mindmeld.tokenizer import Tokenizer
 from mindmeld.query_factory import QueryFactory
@@ -109,6 +113,32 @@ class TestTextModel:
 
         assert model._current_params == {'fit_intercept': True, 'C': 100}
 
+    def test_feature_cache_pruning(self, resource_loader, tmpdir):
+        """Tests that cached feature matrices which were not used for long are deleted"""
+        config = ModelConfig(**{
+            'model_type': 'text',
+            'example_type': QUERY_EXAMPLE_TYPE,
+            'label_type': CLASS_LABEL_TYPE,
+            'model_settings': {
+                'classifier_type': 'logreg'
+            },
+            'params': {'C': 100},
+            'features': {'bag-of-words': {'lengths': [1]}}
+        })
+        stale_path = tmpdir.join('stale.pkl')
+        stale_path.write('stale')
+        stale_path.setmtime(time.time() - FEATURE_CACHE_MAX_AGE - 1)
+
+        model = TextModel(config)
+        examples = [q.query for q in self.labeled_data]
+        labels = [q.intent for q in self.labeled_data]
+        model.initialize_resources(resource_loader, examples, labels)
+        model.register_feature_cache(str(tmpdir.join('current.pkl')))
+        model.fit(examples, labels)
+
+        assert not stale_path.exists()
+        assert tmpdir.join('current.pkl').exists()
+
     def test_fit_cv(self, resource_loader):
         """Tests fitting with param selection"""
         config = ModelConfig(**{
@@ -201,3 +231,15 @@ class TestTextModel:
                              'bag_of_words|length:1|ngram:there': 1}
         extracted_features = model.view_extracted_features(markup.load_query('hi there').query)
         assert extracted_features == expected_features
+
+
+@pytest.mark.parametrize('solver,num_paths', [('liblinear', 4), ('lbfgs', 2)])
+def test_warm_start_paths(solver, num_paths):
+    """Tests that the C path is only warm started with solvers which support it"""
+    candidates = [{'C': C, 'fit_intercept': fit_intercept}
+                  for C in [100, 1] for fit_intercept in [True, False]]
+    paths = _get_warm_start_paths(LogisticRegression(solver=solver), candidates)
+    assert len(paths) == num_paths
+    for path in paths:
+        assert [candidates[idx]['C'] for idx in path] == sorted(
+            candidates[idx]['C'] for idx in path)
@@ -10,10 +10,13 @@ Tests for app_manager module.
 These tests apply only when async/await are supported.
 """
 # pylint: disable=locally-disabled,redefined-outer-name
+import json
+
 import pytest
 
 from mindmeld.app_manager import ApplicationManager, freeze_params
 from mindmeld.components.request import Params, FrozenParams
+from mindmeld.components.session_store import MemorySessionStore
 
 
 @pytest.fixture
@@ -43,3 +46,21 @@ def test_parse(app_manager):
     fields = {'params', 'request', 'dialogue_state', 'directives', 'history'}
     for field in fields:
         assert field in vars(response).keys()
+
+
+def test_parse_session(kwik_e_mart_app_path, kwik_e_mart_nlp):
+    """The history of a session is kept by the session store"""
+    app_manager = ApplicationManager(kwik_e_mart_app_path, nlp=kwik_e_mart_nlp,
+                                     session_store=MemorySessionStore())
+    first = app_manager.parse('hello', session_id='session')
+    second = app_manager.parse('bye', session_id='session')
+
+    assert len(second.history) == 2
+    assert second.history[1] is first.history[0]
+    assert second.history[0]['request']['text'] == 'bye'
+    assert 'history' not in second.history[0]['request']
+    assert len(app_manager.parse('hello', session_id='other').history) == 1
+    assert json.loads(json.dumps(second.history))[0]['request']['text'] == 'bye'
+
+    # an empty history or frame which is passed replaces the stored one
+    assert len(app_manager.parse('hello', session_id='session', history=[]).history) == 1
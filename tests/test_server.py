@@ -1,8 +1,18 @@
+import gc
+import logging
+import threading
+import time
+import weakref
+
+import immutables
 import pytest
 import json
 
-from mindmeld.server import MindMeldServer
+from mindmeld import _json
+from mindmeld.server import MindMeldServer, dump_json
+from mindmeld._request_log import RequestLog
 from mindmeld.app_manager import ApplicationManager
+from mindmeld.components.session_store import MemorySessionStore
 
 
 @pytest.fixture
@@ -31,6 +41,21 @@ def test_parse_endpoint(client):
         'request_id', 'response_time', 'request', 'directives', 'slots'}
 
 
+def test_parse_endpoint_session(client, app_manager, monkeypatch):
+    monkeypatch.setattr(app_manager, 'session_store', MemorySessionStore())
+    for text in ['hello', 'bye']:
+        response = client.post('/parse', data=json.dumps({'text': text, 'session_id': 'a'}),
+                               content_type='application/json')
+        assert response.status == '200 OK'
+        response_data = json.loads(response.data.decode('utf8'))
+        assert 'history' not in response_data
+        assert 'history' not in response_data['request']
+
+    session = app_manager.session_store.get('a')
+    assert session.version == 2
+    assert [turn['request']['text'] for turn in session.history] == ['bye', 'hello']
+
+
 def test_parse_endpoint_fail(client):
     response = client.post('/parse')
     assert response.status == '415 UNSUPPORTED MEDIA TYPE'
@@ -41,3 +66,115 @@ def test_status_endpoint(client):
     assert response.status == '200 OK'
     assert set(json.loads(response.data.decode('utf8')).keys()) == {
         'package_version', 'status', 'response_time', 'version'}
+
+
+def test_ready_endpoint(client, app_manager, monkeypatch):
+    response = client.get('/_ready')
+    assert response.status == '200 OK'
+    assert json.loads(response.data.decode('utf8'))['status'] == 'ready'
+
+    monkeypatch.setattr(app_manager.nlp, 'ready', False)
+    response = client.get('/_ready')
+    assert response.status == '503 SERVICE UNAVAILABLE'
+    assert json.loads(response.data.decode('utf8'))['status'] == 'loading'
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dump_json(use_orjson, monkeypatch):
+    if use_orjson:
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(_json, 'orjson', None)
+
+    data = {
+        'params': immutables.Map({'target_dialogue_state': 'welcome'}),
+        'history': ({'text': 'hello'},),
+        'indexes': range(3),
+        'big': 2 ** 70,
+    }
+    assert json.loads(dump_json(data)) == {
+        'params': {'target_dialogue_state': 'welcome'},
+        'history': [{'text': 'hello'}],
+        'indexes': [0, 1, 2],
+        'big': 2 ** 70,
+    }
+
+    with pytest.raises(TypeError):
+        dump_json({'value': object()})
+
+
+def test_request_log(tmpdir):
+    def _redact(record):
+        if record.get('skip'):
+            return None
+        return dict(record, ip='redacted')
+
+    log_path = str(tmpdir.join('requests.log'))
+    config = {'destination': log_path, 'fields': ['ip', 'request'], 'redact': _redact}
+    request_log = RequestLog(config, logging.getLogger(__name__), dump_json)
+    request_log.log({'ip': '10.0.0.1', 'request': {'text': 'hi'}, 'response': {}})
+    request_log.log({'ip': '10.0.0.2', 'request': {'text': 'bye'}, 'skip': True})
+    request_log.close()
+
+    with open(log_path) as log_file:
+        records = [json.loads(line) for line in log_file]
+    assert records == [{'ip': 'redacted', 'request': {'text': 'hi'}}]
+    assert request_log.stats['written'] == 1
+    assert request_log.stats['redacted'] == 1
+
+
+def test_request_log_full_queue():
+    writing = threading.Event()
+    resume = threading.Event()
+
+    def _block(record):
+        writing.set()
+        resume.wait(5)
+        return record
+
+    config = {'queue_size': 1, 'batch_size': 1, 'redact': _block}
+    request_log = RequestLog(config, logging.getLogger(__name__), dump_json)
+    request_log.log({'n': 0})
+    assert writing.wait(5)
+    # the writer is busy with the first record, so the second fills the queue
+    request_log.log({'n': 1})
+    request_log.log({'n': 2})
+    resume.set()
+    request_log.close()
+    assert request_log.stats['dropped'] == 1
+    assert request_log.stats['written'] == 2
+
+
+def test_request_log_close_stalled_writer():
+    resume = threading.Event()
+
+    def _block(record):
+        resume.wait(5)
+        return record
+
+    config = {'queue_size': 1, 'batch_size': 1, 'redact': _block}
+    request_log = RequestLog(config, logging.getLogger(__name__), dump_json)
+    for index in range(3):
+        request_log.log({'n': index})
+
+    # the writer is stalled and the queue is full, so closing gives up after the timeout
+    start = time.monotonic()
+    request_log.close(timeout=0.1)
+    assert time.monotonic() - start < 1
+    resume.set()
+
+
+def test_request_log_garbage_collected():
+    request_log = RequestLog({}, logging.getLogger(__name__), dump_json)
+    request_log.log({'n': 0})
+    request_log.close()
+    reference = weakref.ref(request_log)
+    del request_log
+    gc.collect()
+    assert reference() is None
+
+
+def test_request_log_sampling():
+    request_log = RequestLog({'sample_rate': 0}, logging.getLogger(__name__), dump_json)
+    assert not request_log.sample()
+    assert request_log.stats['sampled_out'] == 1